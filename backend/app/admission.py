@@ -0,0 +1,290 @@
+"""
+Adaptive admission control.
+
+A concurrency limit is learned from observed latency (gradient or AIMD
+style). Requests beyond the limit are rejected immediately with 503 and
+Retry-After instead of queueing on the event loop. Each priority class may
+only use a fraction of the limit, so low-priority work is shed first. Only
+latency-sensitive requests feed the limiter, so slow background routes do
+not shrink the limit for everyone.
+"""
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .metrics import REGISTRY, Counter, Gauge, Histogram
+
+CRITICAL = "critical"
+NORMAL = "normal"
+LOW = "low"
+EXEMPT = "exempt"
+
+# Share of the concurrency limit each priority class may occupy
+PRIORITY_SHARES = {CRITICAL: 1.0, NORMAL: 0.85, LOW: 0.5}
+
+# Longest matching path prefix wins; anything unmatched is NORMAL
+DEFAULT_PRIORITIES: Dict[str, str] = {
+    "/optimize": CRITICAL,
+    "/simulate": LOW,
+    "/transactions/train": LOW,
+    "/transactions/recompute": LOW,
+    "/users": LOW,
+    "/debug/": LOW,
+    "/metrics": EXEMPT,
+    "/docs": EXEMPT,
+    "/openapi.json": EXEMPT,
+}
+
+# Priorities whose RTTs are fed to the limit algorithm
+SAMPLED_PRIORITIES = (CRITICAL,)
+
+# Routes that are slow by design; never sampled whatever their priority
+UNSAMPLED_PATHS = ("/simulate", "/transactions/train", "/transactions/recompute", "/debug/")
+
+ADMISSION_LIMIT = REGISTRY.register(Gauge(
+    "cardmax_admission_limit",
+    "Current adaptive concurrency limit"
+))
+ADMISSION_IN_FLIGHT = REGISTRY.register(Gauge(
+    "cardmax_admission_in_flight",
+    "Admitted requests in flight by priority",
+    labelnames=("priority",)
+))
+ADMISSION_DECISIONS = REGISTRY.register(Counter(
+    "cardmax_admission_decisions_total",
+    "Admission decisions by priority and outcome",
+    labelnames=("priority", "decision")
+))
+ADMISSION_RTT = REGISTRY.register(Histogram(
+    "cardmax_admission_rtt_seconds",
+    "Request latency by priority",
+    labelnames=("priority",)
+))
+
+
+class GradientLimit:
+    """
+    Gradient limiter: once per window of samples, compares the window's mean
+    RTT against the no-load RTT (the lowest window mean seen, drifting slowly
+    upward so it can follow real changes). Queueing shows up as
+    short > no-load and shrinks the limit; otherwise it grows by a small
+    queue allowance.
+    """
+
+    def __init__(
+        self,
+        initial: int = 20,
+        min_limit: int = 4,
+        max_limit: int = 200,
+        tolerance: float = 1.5,
+        smoothing: float = 0.2,
+        queue_size: int = 4,
+        window: int = 25,
+        drift: float = 0.002
+    ):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.queue_size = queue_size
+        self.window = window
+        self.drift = drift
+        self.noload_rtt: Optional[float] = None
+        self._rtt_sum = 0.0
+        self._samples = 0
+        self._max_in_flight = 0
+        self._dropped = False
+
+    def update(self, rtt: float, in_flight: int, dropped: bool) -> float:
+        self._rtt_sum += rtt
+        self._samples += 1
+        self._max_in_flight = max(self._max_in_flight, in_flight)
+        self._dropped = self._dropped or dropped
+        if self._samples < self.window:
+            return self.limit
+
+        short_rtt = self._rtt_sum / self._samples
+        max_in_flight, window_dropped = self._max_in_flight, self._dropped
+        self._rtt_sum, self._samples, self._max_in_flight, self._dropped = 0.0, 0, 0, False
+
+        if self.noload_rtt is None:
+            self.noload_rtt = short_rtt
+        else:
+            self.noload_rtt = min(short_rtt, self.noload_rtt * (1 + self.drift))
+
+        # Don't grow the limit while we aren't using it
+        if max_in_flight < self.limit / 2 and not window_dropped:
+            return self.limit
+
+        gradient = max(0.5, min(1.0, self.tolerance * self.noload_rtt / short_rtt))
+        if window_dropped:
+            gradient = 0.5
+        new_limit = self.limit * gradient + self.queue_size
+        if new_limit < self.limit:
+            new_limit = self.limit * (1 - self.smoothing) + new_limit * self.smoothing
+        self.limit = max(self.min_limit, min(self.max_limit, new_limit))
+        return self.limit
+
+
+class AIMDLimit:
+    """Additive increase while latency is under target, multiplicative decrease above it"""
+
+    def __init__(
+        self,
+        initial: int = 20,
+        min_limit: int = 4,
+        max_limit: int = 200,
+        latency_target: float = 0.25,
+        backoff: float = 0.9
+    ):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.backoff = backoff
+
+    def update(self, rtt: float, in_flight: int, dropped: bool) -> float:
+        if dropped or rtt > self.latency_target:
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+        elif in_flight * 2 >= self.limit:
+            self.limit = min(self.max_limit, self.limit + 1)
+        return self.limit
+
+
+class AdmissionController:
+    """Tracks in-flight requests per priority and decides admission"""
+
+    def __init__(
+        self,
+        limit_algorithm,
+        priorities: Optional[Dict[str, str]] = None,
+        retry_after: int = 1,
+        sampled_priorities: Tuple[str, ...] = SAMPLED_PRIORITIES,
+        unsampled_paths: Tuple[str, ...] = UNSAMPLED_PATHS
+    ):
+        self.algorithm = limit_algorithm
+        self.retry_after = retry_after
+        self.sampled_priorities = set(sampled_priorities)
+        self.unsampled_paths = tuple(unsampled_paths)
+        self.enabled = True
+        self._rules: List[Tuple[str, str]] = sorted(
+            (priorities or DEFAULT_PRIORITIES).items(), key=lambda rule: len(rule[0]), reverse=True
+        )
+        self.in_flight = 0
+        self._in_flight_by_priority: Dict[str, int] = {}
+        ADMISSION_LIMIT.set(self.limit)
+
+    @property
+    def limit(self) -> float:
+        return self.algorithm.limit
+
+    def priority_for(self, path: str) -> str:
+        for prefix, priority in self._rules:
+            if path == prefix or path.startswith(prefix):
+                return priority
+        return NORMAL
+
+    def tracks(self, priority: str) -> bool:
+        return self.enabled and priority != EXEMPT
+
+    def samples(self, path: str, priority: str) -> bool:
+        """Whether the request's latency should move the limit"""
+        return priority in self.sampled_priorities and not path.startswith(self.unsampled_paths)
+
+    def try_acquire(self, priority: str) -> bool:
+        allowed = max(1, int(self.limit * PRIORITY_SHARES.get(priority, PRIORITY_SHARES[NORMAL])))
+        if self.in_flight >= allowed:
+            ADMISSION_DECISIONS.inc(priority=priority, decision="rejected")
+            return False
+        self.in_flight += 1
+        self._in_flight_by_priority[priority] = self._in_flight_by_priority.get(priority, 0) + 1
+        ADMISSION_IN_FLIGHT.set(self._in_flight_by_priority[priority], priority=priority)
+        ADMISSION_DECISIONS.inc(priority=priority, decision="admitted")
+        return True
+
+    def release(self, priority: str, rtt: float, dropped: bool = False, sample: bool = True):
+        if sample:
+            # Sample with the concurrency the request actually saw
+            self.algorithm.update(rtt, self.in_flight, dropped)
+        self.in_flight -= 1
+        self._in_flight_by_priority[priority] -= 1
+        ADMISSION_IN_FLIGHT.set(self._in_flight_by_priority[priority], priority=priority)
+        ADMISSION_LIMIT.set(self.limit)
+        ADMISSION_RTT.observe(rtt, priority=priority)
+
+
+def create_controller(settings) -> AdmissionController:
+    """Build an AdmissionController from ``config.Settings``"""
+    if settings.admission_algorithm == "aimd":
+        algorithm = AIMDLimit(
+            initial=settings.admission_initial_limit,
+            min_limit=settings.admission_min_limit,
+            max_limit=settings.admission_max_limit,
+            latency_target=settings.admission_latency_target_ms / 1000
+        )
+    elif settings.admission_algorithm == "gradient":
+        algorithm = GradientLimit(
+            initial=settings.admission_initial_limit,
+            min_limit=settings.admission_min_limit,
+            max_limit=settings.admission_max_limit
+        )
+    else:
+        raise ValueError(f"Unknown admission algorithm: {settings.admission_algorithm}")
+
+    priorities = {**DEFAULT_PRIORITIES, **settings.admission_priorities}
+    controller = AdmissionController(algorithm, priorities, retry_after=settings.admission_retry_after)
+    controller.enabled = settings.admission_enabled
+    return controller
+
+
+class AdmissionMiddleware:
+    """ASGI middleware that sheds load with a fast 503 once the limit is hit"""
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def _reject(self, send):
+        body = json.dumps({"detail": "Server is overloaded, please retry"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(self.controller.retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        priority = self.controller.priority_for(scope["path"])
+        tracked = self.controller.tracks(priority)
+        if tracked and not self.controller.try_acquire(priority):
+            await self._reject(send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if tracked:
+                self.controller.release(
+                    priority,
+                    time.perf_counter() - start,
+                    dropped=status_code >= 500,
+                    sample=self.controller.samples(scope["path"], priority)
+                )
@@ -1,5 +1,5 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
@@ -7,6 +7,7 @@ from passlib.context import CryptContext
 from .config import get_settings
 from .db.database import get_database
 from .db.models import UserDB
+from .metrics import timed
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
@@ -33,36 +34,54 @@ async def authenticate_user(email: str, password: str, db=Depends(get_database))
     if not user_doc:
         return False
     user = UserDB(**user_doc)
-    if not verify_password(password, user.hashed_password):
+    with timed("password_verify"):
+        verified = verify_password(password, user.hashed_password)
+    if not verified:
         return False
     return user
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db=Depends(get_database)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    
+def decode_token(token: str) -> Optional[Dict]:
+    """Verified claims of a bearer token, or None if it is invalid or expired"""
     settings = get_settings()
     try:
-        payload = jwt.decode(
-            token,
-            settings.jwt_secret_key,
-            algorithms=[settings.jwt_algorithm]
-        )
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
+        with timed("jwt_decode"):
+            return jwt.decode(
+                token,
+                settings.jwt_secret_key,
+                algorithms=[settings.jwt_algorithm]
+            )
     except JWTError:
-        raise credentials_exception
+        return None
+
+async def user_from_claims(claims: Dict, db) -> Optional[UserDB]:
+    """The user a decoded token names, or None if there is no such user"""
+    email: str = claims.get("sub")
+    if email is None:
+        return None
         
-    user_doc = await db.users.find_one({"email": email})
+    with timed("user_lookup"):
+        user_doc = await db.users.find_one({"email": email})
     if user_doc is None:
-        raise credentials_exception
-        
+        return None
     return UserDB(**user_doc)
 
+async def user_from_token(token: str, db) -> Optional[UserDB]:
+    """Resolve a bearer token to its user, or None if the token is invalid"""
+    claims = decode_token(token)
+    if claims is None:
+        return None
+    return await user_from_claims(claims, db)
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db=Depends(get_database)):
+    user = await user_from_token(token, db)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user
+
 async def get_current_active_user(current_user: UserDB = Depends(get_current_user)):
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
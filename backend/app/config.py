@@ -1,6 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
-from typing import Optional
+from typing import Dict, Optional
 
 class Settings(BaseSettings):
     # API Settings
@@ -10,6 +10,17 @@ class Settings(BaseSettings):
     # Database Settings
     mongodb_url: str = "mongodb://localhost:27017"
     database_name: str = "cardmax"
+    mongo_max_pool_size: int = 100  # Connections per server
+    mongo_min_pool_size: int = 0
+    mongo_max_idle_time_ms: Optional[int] = None
+    mongo_wait_queue_timeout_ms: Optional[int] = None  # Fail instead of waiting forever for a free connection
+    mongo_connect_timeout_ms: int = 20000
+    mongo_server_selection_timeout_ms: int = 30000
+    mongo_socket_timeout_ms: Optional[int] = None
+    mongo_compressors: str = ""  # e.g. "zstd,snappy,zlib"; zstd and snappy need their Python packages
+    mongo_zlib_compression_level: int = -1
+    mongo_read_preferences: Dict[str, str] = {}  # Workload -> read preference mode, over the defaults
+    mongo_max_staleness_seconds: int = -1  # Skip secondaries lagging more than this (90 or more; -1 for no limit)
     
     # Redis Settings
     redis_url: str = "redis://localhost:6379"
@@ -23,9 +34,50 @@ class Settings(BaseSettings):
     model_path: str = "models"
     min_training_samples: int = 100
     personalization_weight: float = 0.2
+    personalization_store: str = "memory"  # "memory" (per process) or "redis" (shared)
+    personalization_cache_ttl: float = 30.0  # Seconds a locally cached vector is trusted
+    personalization_cache_size: int = 100_000  # Locally cached vectors
+    personalization_flush_interval: float = 1.0  # Seconds between batched writes
+    personalization_write_batch: int = 500  # Vectors per read-modify-write transaction
+    category_engine: str = "tfidf_nb"  # "tfidf_nb" or "hashing"
+    hashing_n_features: int = 2 ** 16  # Hash buckets for the "hashing" engine; a power of two
+    hashing_quantize: bool = False  # Store "hashing" weights as int8 instead of float32
+    
+    # Model Evaluation Settings
+    evaluation_test_size: float = 0.2  # Stratified holdout share when not using k-fold
+    evaluation_folds: int = 0  # 2 or more runs stratified k-fold in parallel workers instead
+    evaluation_n_jobs: int = -1
+    evaluation_latency_samples: int = 200
+    evaluation_batch_size: int = 100
+    evaluation_latency_rounds: int = 5  # Candidate and live model timed alternately; medians compared
+    promotion_max_accuracy_drop: float = 0.01  # Absolute
+    promotion_max_f1_drop: float = 0.02  # Absolute, macro-F1
+    promotion_max_latency_increase: float = 0.5  # Relative, p99 single and batched prediction
+    promotion_min_latency_increase_ms: float = 1.0  # Smaller p99 increases never count as regressions
+    recompute_chunk_size: int = 1000  # Transactions rescored per bulk write and checkpoint
     
     # Cache Settings
     cache_ttl: int = 3600  # 1 hour
+    wallet_cache_ttl: int = 86400  # Write-through; snapshots from an older catalog generation are rebuilt on read
+    
+    # WebSocket Sessions
+    ws_auth_timeout: float = 10.0  # Seconds to wait for the auth message
+    ws_transaction_batch_size: int = 50  # Described transactions per insert_many
+    
+    # Observability Settings
+    metrics_enabled: bool = True
+    profiler_enabled: bool = False  # Enables POST /debug/profile for superusers
+    profiler_max_seconds: float = 30.0
+    
+    # Admission Control Settings
+    admission_enabled: bool = True
+    admission_algorithm: str = "gradient"  # "gradient" or "aimd"
+    admission_initial_limit: int = 20
+    admission_min_limit: int = 4
+    admission_max_limit: int = 200
+    admission_latency_target_ms: float = 250.0  # Used by "aimd"
+    admission_retry_after: int = 1  # Seconds, sent with 503 responses
+    admission_priorities: Dict[str, str] = {}  # Path prefix -> critical/normal/low/exempt
     
     class Config:
         env_file = ".env"
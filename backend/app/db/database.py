@@ -1,23 +1,123 @@
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
-from ..config import get_settings
-from typing import Optional
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+from ..config import Settings, get_settings
+from ..metrics import MongoCommandListener, MongoPoolListener
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+READ_PREFERENCE_MODES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+# Workloads that tolerate replication lag read away from the primary, which
+# keeps inserts and user lookups off the same connections as large scans.
+# Anything not listed reads from the primary. Overridden by
+# Settings.mongo_read_preferences.
+DEFAULT_READ_PREFERENCES = {
+    "catalog": "secondaryPreferred",  # GET /cards
+    "wallet": "primaryPreferred",  # Wallet reads that miss the cache
+    "training": "secondaryPreferred",  # Full transaction scan in /transactions/train
+    "bulk": "secondaryPreferred",  # Recompute chunk scans
+    "analytics": "secondaryPreferred",  # History loads for POST /simulate
+}
+
+# (collection, keys, options)
+INDEXES = [
+    ("users", [("email", 1)], {"unique": True}),
+    ("cards", [("name", 1)], {}),
+    ("transactions", [("user_id", 1)], {}),
+    # POST /simulate loads one user's recent history
+    ("transactions", [("user_id", 1), ("created_at", 1)], {}),
+    # Recompute jobs scan one (category, is_foreign) cell at a time in _id order
+    ("transactions", [("category", 1), ("is_foreign", 1), ("_id", 1)], {}),
+    # ...and finish by sweeping transactions that have no best card yet
+    ("transactions", [("best_card_id", 1), ("_id", 1)], {}),
+    ("ml_model_metadata", [("model_name", 1)], {"unique": True}),
+]
+
+
+def read_preference(mode: str, max_staleness: int = -1):
+    """Build a PyMongo read preference from its mode name"""
+    if mode not in READ_PREFERENCE_MODES:
+        raise ValueError(f"Unknown read preference {mode!r}; expected one of {', '.join(READ_PREFERENCE_MODES)}")
+    if mode == "primary":
+        return Primary()
+    return READ_PREFERENCE_MODES[mode](max_staleness=max_staleness)
+
+
+def client_options(settings: Settings) -> Dict[str, Any]:
+    """Keyword arguments for AsyncIOMotorClient from settings"""
+    options = {
+        "maxPoolSize": settings.mongo_max_pool_size,
+        "minPoolSize": settings.mongo_min_pool_size,
+        "connectTimeoutMS": settings.mongo_connect_timeout_ms,
+        "serverSelectionTimeoutMS": settings.mongo_server_selection_timeout_ms,
+        "event_listeners": [MongoPoolListener(), MongoCommandListener()],
+        "appname": "cardmax",
+    }
+    # None means "no limit"; leave those to the driver (and the URL)
+    for option, value in (
+        ("maxIdleTimeMS", settings.mongo_max_idle_time_ms),
+        ("waitQueueTimeoutMS", settings.mongo_wait_queue_timeout_ms),
+        ("socketTimeoutMS", settings.mongo_socket_timeout_ms),
+    ):
+        if value is not None:
+            options[option] = value
+    if settings.mongo_compressors:
+        options["compressors"] = settings.mongo_compressors
+        options["zlibCompressionLevel"] = settings.mongo_zlib_compression_level
+    return options
+
+
+def _same_key(spec: Dict[str, Any], keys: List) -> bool:
+    # The server may report directions as floats; special indexes use strings
+    key = [(field, direction if isinstance(direction, str) else int(direction)) for field, direction in spec["key"]]
+    return key == keys
+
 
 class Database:
     client: Optional[AsyncIOMotorClient] = None
     db: Optional[AsyncIOMotorDatabase] = None
+    read_preferences: Dict[str, Any] = {}  # Workload -> read preference
+    _routed: Dict[str, Tuple[AsyncIOMotorDatabase, AsyncIOMotorDatabase]] = {}
 
     @classmethod
-    async def connect_db(cls):
+    async def connect_db(cls, client=None, settings: Optional[Settings] = None):
         """Create database connection."""
-        settings = get_settings()
-        cls.client = AsyncIOMotorClient(settings.mongodb_url)
+        settings = settings or get_settings()
+        cls.client = client or AsyncIOMotorClient(settings.mongodb_url, **client_options(settings))
         cls.db = cls.client[settings.database_name]
-        
-        # Create indexes
-        await cls.db.users.create_index("email", unique=True)
-        await cls.db.cards.create_index("name")
-        await cls.db.transactions.create_index("user_id")
-        await cls.db.ml_model_metadata.create_index("model_name", unique=True)
+        modes = {**DEFAULT_READ_PREFERENCES, **settings.mongo_read_preferences}
+        cls.read_preferences = {
+            workload: read_preference(mode, settings.mongo_max_staleness_seconds)
+            for workload, mode in modes.items()
+        }
+        await cls.create_indexes()
+
+    @classmethod
+    async def create_indexes(cls) -> List[str]:
+        """
+        Create the indexes the API relies on, skipping those that already
+        exist. Returns the names of the indexes created.
+        """
+        created = []
+        existing: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for collection, keys, options in INDEXES:
+            if collection not in existing:
+                existing[collection] = await cls.db[collection].index_information()
+            match = next((spec for spec in existing[collection].values() if _same_key(spec, keys)), None)
+            if match is not None:
+                if bool(match.get("unique")) != bool(options.get("unique")):
+                    logger.warning("Index %s on %s exists with different options; leaving it", keys, collection)
+                continue
+            created.append(await cls.db[collection].create_index(keys, **options))
+        return created
 
     @classmethod
     async def close_db(cls):
@@ -26,12 +126,24 @@ class Database:
             cls.client.close()
 
     @classmethod
-    def get_db(cls) -> AsyncIOMotorDatabase:
-        """Get database instance."""
+    def get_db(cls, workload: Optional[str] = None) -> AsyncIOMotorDatabase:
+        """Get database instance, routed for ``workload`` when one is configured."""
         if cls.db is None:
             raise ConnectionError("Database not initialized")
-        return cls.db
+        preference = cls.read_preferences.get(workload)
+        if preference is None:
+            return cls.db
+        routed = cls._routed.get(workload)
+        if routed is None or routed[0] is not cls.db:
+            routed = cls._routed[workload] = (cls.db, cls.db.with_options(read_preference=preference))
+        return routed[1]
 
 # Database dependency
 async def get_database() -> AsyncIOMotorDatabase:
-    return Database.get_db() 
\ No newline at end of file
+    return Database.get_db()
+
+def database_for(workload: str):
+    """Dependency returning the database handle for a read workload"""
+    async def dependency() -> AsyncIOMotorDatabase:
+        return Database.get_db(workload)
+    return dependency
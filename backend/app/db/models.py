@@ -1,13 +1,19 @@
 from datetime import datetime
 from typing import Optional, List, Dict
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
+from pydantic_core import core_schema
 from bson import ObjectId
 from ..models import Category, RewardType
 
 class PyObjectId(ObjectId):
     @classmethod
-    def __get_validators__(cls):
-        yield cls.validate
+    def __get_pydantic_core_schema__(cls, source_type, handler):
+        return core_schema.no_info_plain_validator_function(
+            cls.validate,
+            serialization=core_schema.plain_serializer_function_ser_schema(
+                str, when_used="json"
+            ),
+        )
 
     @classmethod
     def validate(cls, v):
@@ -16,8 +22,8 @@ class PyObjectId(ObjectId):
         return ObjectId(v)
 
     @classmethod
-    def __modify_schema__(cls, field_schema):
-        field_schema.update(type="string")
+    def __get_pydantic_json_schema__(cls, schema, handler):
+        return {"type": "string"}
 
 class DBModelBase(BaseModel):
     id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
@@ -46,16 +52,26 @@ class CardDB(DBModelBase):
 
 class WalletDB(DBModelBase):
     user_id: PyObjectId
-    cards: List[PyObjectId]  # References to CardDB ids
+    cards: List[str]  # Catalog card ids or CardDB ids
+    version: int = 1  # Bumped on every change; guards the wallet cache
     is_active: bool = True
 
+    @field_validator("cards", mode="before")
+    @classmethod
+    def stringify_card_ids(cls, v):
+        # Older wallets stored CardDB ObjectIds
+        return [str(card_id) for card_id in v]
+
 class TransactionDB(DBModelBase):
     user_id: PyObjectId
     description: str
     amount: float
     category: Category
-    card_id: Optional[PyObjectId] = None
+    card_id: Optional[str] = None  # Catalog card id (see data/card_rewards.json)
     reward_value: Optional[float] = None
+    # Best card in the whole catalog, maintained by app/recompute.py
+    best_card_id: Optional[str] = None
+    best_reward_value: Optional[float] = None
     is_foreign: bool = False
     merchant: Optional[str] = None
     location: Optional[str] = None
@@ -0,0 +1,239 @@
+"""
+Offline evaluation of category predictor candidates and promotion gating.
+
+Quality comes from a stratified holdout, or from stratified k-fold with the
+folds trained in parallel worker processes. The model that would be
+promoted is then fit on all the data. Its training time, artifact size and
+prediction latency are measured directly. The metrics are stored in
+``MLModelMetadataDB.performance_metrics``, and a candidate that regresses
+past the configured thresholds is not promoted.
+
+Quality is compared with the stored metrics of the promoted model. Latency
+is not: a p99 from an earlier run on a busier or quieter machine says
+little, so the live model is timed again, back to back with the candidate
+on the same held-out descriptions, taking the median over several rounds.
+"""
+import os
+import tempfile
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.model_selection import StratifiedKFold, train_test_split
+
+from .ml_models import CategoryPredictor, create_category_predictor
+from .models import Category
+
+# Compared against the live model, timed in the same run, as a relative increase
+LATENCY_METRICS = ("predict_p99_ms", "batch_p99_ms")
+
+
+def _can_stratify(labels: Sequence[str], n_splits: int) -> bool:
+    _, counts = np.unique(labels, return_counts=True)
+    return len(counts) > 1 and counts.min() >= n_splits
+
+
+def quality_metrics(predictor: CategoryPredictor, descriptions: List[str], labels: List[str]) -> Dict[str, float]:
+    """Accuracy, macro-F1 and per-category F1 on labelled descriptions"""
+    predicted = [c.value for c in predictor.predict_batch(descriptions)]
+    present = [c.value for c in Category if c.value in set(labels) | set(predicted)]
+    per_class = f1_score(labels, predicted, labels=present, average=None, zero_division=0)
+    metrics = {
+        "accuracy": float(accuracy_score(labels, predicted)),
+        "macro_f1": float(np.mean(per_class)) if len(per_class) else 0.0,
+    }
+    metrics.update({f"f1_{label}": float(score) for label, score in zip(present, per_class)})
+    return metrics
+
+
+def _fit_and_score(engine: str, options: Dict, train: Tuple[List[str], List[str]], test: Tuple[List[str], List[str]]):
+    predictor = CategoryPredictor(engine, **options)
+    predictor.train(*train)
+    return quality_metrics(predictor, *test)
+
+
+def _mean_metrics(results: List[Dict[str, float]]) -> Dict[str, float]:
+    # A category missing from a fold counts as absent there, not as F1 = 0
+    keys = {key for result in results for key in result}
+    return {key: float(np.mean([r[key] for r in results if key in r])) for key in sorted(keys)}
+
+
+def cross_validate(
+    descriptions: List[str],
+    labels: List[str],
+    engine: str,
+    options: Optional[Dict] = None,
+    test_size: float = 0.2,
+    folds: int = 0,
+    n_jobs: int = -1,
+    seed: int = 0
+) -> Tuple[Dict[str, float], List[str]]:
+    """
+    Quality metrics from a stratified holdout (``folds`` < 2) or stratified
+    k-fold run in parallel. Also returns held-out descriptions for latency
+    measurement.
+    """
+    options = options or {}
+    if folds >= 2:
+        if not _can_stratify(labels, folds):
+            raise ValueError(f"Every category needs at least {folds} samples for {folds}-fold evaluation")
+        splitter = StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed)
+        X, y = np.array(descriptions, dtype=object), np.array(labels, dtype=object)
+        splits = list(splitter.split(X, y))
+        results = Parallel(n_jobs=n_jobs)(
+            delayed(_fit_and_score)(
+                engine, options,
+                (list(X[train]), list(y[train])),
+                (list(X[test]), list(y[test]))
+            )
+            for train, test in splits
+        )
+        metrics = _mean_metrics(results)
+        metrics["folds"] = float(folds)
+        return metrics, list(X[splits[0][1]])
+
+    stratify = labels if _can_stratify(labels, 2) else None
+    train_d, test_d, train_l, test_l = train_test_split(
+        descriptions, labels, test_size=test_size, random_state=seed, stratify=stratify
+    )
+    metrics = _fit_and_score(engine, options, (train_d, train_l), (test_d, test_l))
+    metrics["folds"] = 1.0
+    return metrics, test_d
+
+
+def latency_metrics(
+    predictor: CategoryPredictor,
+    descriptions: List[str],
+    samples: int = 200,
+    batch_size: int = 100
+) -> Dict[str, float]:
+    """p50/p99 of single-description and batched prediction, in milliseconds"""
+    single = []
+    for i in range(samples):
+        start = time.perf_counter()
+        predictor.predict(descriptions[i % len(descriptions)])
+        single.append((time.perf_counter() - start) * 1000)
+
+    batch = [descriptions[i % len(descriptions)] for i in range(batch_size)]
+    batched = []
+    for _ in range(max(5, samples // 10)):
+        start = time.perf_counter()
+        predictor.predict_batch(batch)
+        batched.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "predict_p50_ms": float(np.percentile(single, 50)),
+        "predict_p99_ms": float(np.percentile(single, 99)),
+        "batch_p50_ms": float(np.percentile(batched, 50)),
+        "batch_p99_ms": float(np.percentile(batched, 99)),
+        "batch_size": float(batch_size),
+    }
+
+
+def compare_latency(
+    candidate: CategoryPredictor,
+    live: CategoryPredictor,
+    descriptions: List[str],
+    samples: int = 200,
+    batch_size: int = 100,
+    rounds: int = 5
+) -> Tuple[Dict[str, float], Dict[str, float]]:
+    """
+    Latency of the candidate and the live model measured back to back,
+    alternating which goes first, as the per-metric median over ``rounds``
+    """
+    measured: Tuple[List[Dict[str, float]], List[Dict[str, float]]] = ([], [])
+    for i in range(max(1, rounds)):
+        order = (0, 1) if i % 2 == 0 else (1, 0)
+        for which in order:
+            predictor = (candidate, live)[which]
+            measured[which].append(latency_metrics(predictor, descriptions, samples=samples, batch_size=batch_size))
+    return tuple(
+        {key: float(np.median([r[key] for r in results])) for key in results[0]}
+        for results in measured
+    )
+
+
+def train_and_evaluate(
+    descriptions: List[str],
+    categories: List,
+    settings,
+    live: Optional[CategoryPredictor] = None
+) -> Tuple[CategoryPredictor, Dict[str, float], Optional[Dict[str, float]]]:
+    """
+    Evaluate the configured engine, then fit the candidate on all rows.
+    Returns the candidate, its performance metrics and, when a trained
+    ``live`` model is given, the live model's latency from the same run.
+    """
+    labels = [Category(c).value for c in categories]
+    candidate = create_category_predictor(settings)
+
+    metrics, held_out = cross_validate(
+        descriptions, labels,
+        candidate.engine_name, candidate.engine_options,
+        test_size=settings.evaluation_test_size,
+        folds=settings.evaluation_folds,
+        n_jobs=settings.evaluation_n_jobs
+    )
+
+    start = time.perf_counter()
+    candidate.train(descriptions, labels)
+    metrics["train_s"] = time.perf_counter() - start
+    metrics["training_samples"] = float(len(descriptions))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "candidate.joblib")
+        candidate.save(path)
+        metrics["artifact_bytes"] = float(os.path.getsize(path))
+
+    if live is None or not live.is_trained:
+        metrics.update(latency_metrics(
+            candidate, held_out,
+            samples=settings.evaluation_latency_samples,
+            batch_size=settings.evaluation_batch_size
+        ))
+        return candidate, metrics, None
+
+    candidate_latency, live_latency = compare_latency(
+        candidate, live, held_out,
+        samples=settings.evaluation_latency_samples,
+        batch_size=settings.evaluation_batch_size,
+        rounds=settings.evaluation_latency_rounds
+    )
+    metrics.update(candidate_latency)
+    return candidate, metrics, live_latency
+
+
+def check_promotion(
+    candidate: Dict[str, float],
+    baseline: Optional[Dict[str, float]],
+    settings,
+    live_latency: Optional[Dict[str, float]] = None
+) -> List[str]:
+    """
+    Reasons the candidate may not replace the baseline (empty if it may).
+    Latency is only checked against ``live_latency``, measured in the same
+    run as the candidate's.
+    """
+    regressions = []
+    baseline = baseline or {}
+    for metric, allowed in (
+        ("accuracy", settings.promotion_max_accuracy_drop),
+        ("macro_f1", settings.promotion_max_f1_drop),
+    ):
+        if metric in baseline and metric in candidate and baseline[metric] - candidate[metric] > allowed:
+            regressions.append(
+                f"{metric} dropped from {baseline[metric]:.4f} to {candidate[metric]:.4f} (max drop {allowed})"
+            )
+    for metric in LATENCY_METRICS:
+        old, new = (live_latency or {}).get(metric), candidate.get(metric)
+        if not old or new is None or new - old <= settings.promotion_min_latency_increase_ms:
+            continue
+        if (new - old) / old > settings.promotion_max_latency_increase:
+            regressions.append(
+                f"{metric} rose from {old:.3f} to {new:.3f} "
+                f"(max increase {settings.promotion_max_latency_increase:.0%})"
+            )
+    return regressions
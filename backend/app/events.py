@@ -0,0 +1,43 @@
+"""
+In-process fan-out of version changes to long-lived sessions.
+
+Publishers (model training, catalog recompute, wallet edits) call
+``version_hub.publish``. Each subscriber gets its own bounded queue; a slow
+subscriber loses its oldest events rather than blocking publishers. The hub
+is per worker process, so a change only reaches sessions held by the worker
+that made it.
+"""
+import asyncio
+from typing import Dict, Optional, Set
+
+# Topics whose latest version is remembered for new subscribers
+GLOBAL_TOPICS = ("catalog", "model")
+
+
+class VersionHub:
+    def __init__(self):
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._versions: Dict[str, str] = {}
+
+    def current(self, topic: str) -> Optional[str]:
+        return self._versions.get(topic)
+
+    def subscribe(self, maxsize: int = 16) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def publish(self, topic: str, version, **fields):
+        event = {"type": topic, "version": str(version), **fields}
+        if topic in GLOBAL_TOPICS:
+            self._versions[topic] = event["version"]
+        for queue in list(self._subscribers):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+
+version_hub = VersionHub()
@@ -1,5 +1,7 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, WebSocket, status
+from fastapi.responses import PlainTextResponse, Response
 from fastapi.security import OAuth2PasswordRequestForm
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from typing import List, Optional
 from motor.motor_asyncio import AsyncIOMotorDatabase
@@ -7,13 +9,45 @@ from fastapi_cache import FastAPICache
 from fastapi_cache.backends.redis import RedisBackend
 from redis import asyncio as aioredis
 from datetime import datetime
+import asyncio
+import os
+from bson import ObjectId
 
-from .models import Card, UserWallet, InputQuery, CardRecommendation, Category
-from .rewards import get_best_card, predict_category
-from .ml_models import category_predictor
+from .models import (
+    Card,
+    UserWallet,
+    InputQuery,
+    CardRecommendation,
+    Category,
+    WalletCardRequest,
+    WalletSnapshot,
+    SimulationRequest,
+    SimulationResult
+)
+from .rewards import get_best_card, load_card_data, predict_category
+from .ml_models import category_predictor, recommender
 from .config import get_settings
-from .db.database import Database, get_database
-from .db.models import UserDB, CardDB, WalletDB, TransactionDB
+from .metrics import (
+    CONTENT_TYPE,
+    MODEL_INFO,
+    REGISTRY,
+    MetricsMiddleware,
+    timed,
+    watch_models,
+    watch_redis_pool
+)
+from .profiling import profile_event_loop
+from .evaluation import check_promotion, train_and_evaluate
+from .personalization import RedisEmbeddingStore, run_flush_loop
+from .admission import AdmissionMiddleware, create_controller
+from . import recompute
+from .events import version_hub
+from .sessions import run_session
+from .simulation import load_history, simulate
+from . import wallets
+from .wallets import UnknownCardError, card_from_db, get_wallet_snapshot, wallet_cache
+from .db.database import Database, database_for, get_database
+from .db.models import UserDB, CardDB, TransactionDB
 from .auth import (
     authenticate_user,
     create_access_token,
@@ -30,13 +64,23 @@ app = FastAPI(
     version=settings.api_version
 )
 
-# CORS middleware
+# Shed load before any work is done; metrics wrap it so rejections are counted
+admission_controller = create_controller(settings)
+app.add_middleware(AdmissionMiddleware, controller=admission_controller)
+
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+
+# CORS middleware; added last so it is outermost. Preflights are answered
+# before admission, and 503s still carry the CORS headers browsers need to
+# read Retry-After.
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Update this in production
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"],
 )
 
 @app.on_event("startup")
@@ -47,9 +91,40 @@ async def startup():
     # Initialize Redis cache
     redis = aioredis.from_url(settings.redis_url, encoding="utf8", decode_responses=True)
     FastAPICache.init(RedisBackend(redis), prefix="fastapi-cache")
+    wallet_cache.init(redis, ttl=settings.wallet_cache_ttl)
+    
+    # Scrape-time gauges
+    watch_redis_pool(redis.connection_pool)
+    watch_models(category_predictor, recommender)
+    metadata = await Database.get_db().ml_model_metadata.find_one({"model_name": "category_predictor"})
+    if metadata:
+        MODEL_INFO.set(1, model="category_predictor", version=metadata["version"])
+        version_hub.publish("model", metadata["version"])
+    version_hub.publish("catalog", await recompute.applied_generation(Database.get_db()))
+    
+    # Share personalization vectors across nodes
+    if settings.personalization_store == "redis":
+        vector_redis = aioredis.from_url(settings.redis_url)  # Packed floats; no decoding
+        recommender.attach_store(
+            RedisEmbeddingStore(vector_redis, batch_size=settings.personalization_write_batch),
+            cache_ttl=settings.personalization_cache_ttl,
+            cache_size=settings.personalization_cache_size
+        )
+        app.state.personalization_flush = asyncio.create_task(
+            run_flush_loop(recommender, settings.personalization_flush_interval)
+        )
 
 @app.on_event("shutdown")
 async def shutdown():
+    flush_task = getattr(app.state, "personalization_flush", None)
+    if flush_task is not None:
+        # Let a flush in progress put back what it didn't write before the final one
+        flush_task.cancel()
+        try:
+            await flush_task
+        except asyncio.CancelledError:
+            pass
+        await recommender.flush()
     await Database.close_db()
 
 @app.get("/")
@@ -102,9 +177,15 @@ async def optimize_card_choice(
     try:
         # If description is provided, predict category
         if description and not query.category:
-            query.category = predict_category(description)
+            with timed("predict_category"):
+                query.category = predict_category(description)
             
-        recommendation = get_best_card(query, current_user.id)
+        # Score the user's own cards when they have a wallet
+        wallet = await get_wallet_snapshot(db, str(current_user.id))
+        wallet_cards = wallet.cards if wallet and wallet.cards else None
+        with timed("personalization_fetch"):
+            await recommender.prefetch(current_user.id, wallet_cards or load_card_data())
+        recommendation = get_best_card(query, current_user.id, cards=wallet_cards)
         
         # Store the transaction for future training
         if description:
@@ -113,31 +194,64 @@ async def optimize_card_choice(
                 description=description,
                 category=query.category,
                 amount=query.amount,
+                is_foreign=query.foreign_transaction,
                 card_id=recommendation.card.id,
                 reward_value=recommendation.reward_value
             )
-            await db.transactions.insert_one(transaction.dict(by_alias=True))
+            with timed("transaction_insert"):
+                await db.transactions.insert_one(transaction.dict(by_alias=True))
             
         return recommendation
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.websocket("/ws/optimize")
+async def optimize_session(
+    websocket: WebSocket,
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Streaming /optimize: authenticate once, then send InputQuery messages"""
+    await run_session(
+        websocket,
+        db,
+        auth_timeout=settings.ws_auth_timeout,
+        flush_size=settings.ws_transaction_batch_size
+    )
+
+@app.post("/simulate", response_model=SimulationResult)
+async def simulate_cards(
+    request: SimulationRequest,
+    current_user: UserDB = Depends(get_current_active_user),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+    history_db: AsyncIOMotorDatabase = Depends(database_for("analytics"))
+):
+    """What the user would have earned with the candidate cards added to their wallet"""
+    try:
+        candidates = await wallets.resolve_cards(db, request.card_ids)
+    except UnknownCardError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+        
+    wallet = await get_wallet_snapshot(db, str(current_user.id))
+    with timed("simulate_load"):
+        history = await load_history(history_db, current_user.id, request.months)
+    return simulate(history, wallet.cards if wallet else [], candidates, request.months)
+
 @app.get("/cards", response_model=List[Card])
 async def get_cards(
-    db: AsyncIOMotorDatabase = Depends(get_database),
+    db: AsyncIOMotorDatabase = Depends(database_for("catalog")),
     current_user: UserDB = Depends(get_current_active_user)
 ):
     cards = await db.cards.find({"is_active": True}).to_list(length=100)
-    return [Card(**card) for card in cards]
+    return [card_from_db(card) for card in cards]
 
-@app.post("/wallet", response_model=WalletDB)
+@app.post("/wallet", response_model=WalletSnapshot)
 async def create_wallet(
     wallet: UserWallet,
     current_user: UserDB = Depends(get_current_active_user),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     # Check if wallet exists
-    existing_wallet = await db.wallets.find_one({"user_id": current_user.id})
+    existing_wallet = await get_wallet_snapshot(db, str(current_user.id))
     if existing_wallet:
         raise HTTPException(
             status_code=400,
@@ -145,38 +259,69 @@ async def create_wallet(
         )
     
     # Create new wallet
-    wallet_db = WalletDB(
-        user_id=current_user.id,
-        cards=[card.id for card in wallet.cards]
-    )
-    await db.wallets.insert_one(wallet_db.dict(by_alias=True))
-    return wallet_db
+    try:
+        return await wallets.create_wallet(db, current_user.id, [card.id for card in wallet.cards])
+    except UnknownCardError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-@app.get("/wallet/{user_id}", response_model=WalletDB)
+@app.get("/wallet/{user_id}", response_model=WalletSnapshot)
 async def get_wallet(
     user_id: str,
     current_user: UserDB = Depends(get_current_active_user),
-    db: AsyncIOMotorDatabase = Depends(get_database)
+    db: AsyncIOMotorDatabase = Depends(database_for("wallet"))
 ):
     # Only allow users to access their own wallet
     if str(current_user.id) != user_id and not current_user.is_superuser:
         raise HTTPException(status_code=403, detail="Not authorized to access this wallet")
         
-    wallet = await db.wallets.find_one({"user_id": user_id})
+    wallet = await get_wallet_snapshot(db, user_id)
     if not wallet:
         raise HTTPException(status_code=404, detail="Wallet not found")
-    return WalletDB(**wallet)
+    return wallet
+
+@app.post("/wallet/cards", response_model=WalletSnapshot)
+async def add_wallet_card(
+    request: WalletCardRequest,
+    current_user: UserDB = Depends(get_current_active_user),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    wallet = await get_wallet_snapshot(db, str(current_user.id))
+    if not wallet:
+        raise HTTPException(status_code=404, detail="Wallet not found")
+    if any(card.id == request.card_id for card in wallet.cards):
+        raise HTTPException(status_code=400, detail="Card already in wallet")
+        
+    try:
+        updated = await wallets.add_card(db, current_user.id, request.card_id)
+    except UnknownCardError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return updated or await get_wallet_snapshot(db, str(current_user.id))
+
+@app.delete("/wallet/cards/{card_id}", response_model=WalletSnapshot)
+async def remove_wallet_card(
+    card_id: str,
+    current_user: UserDB = Depends(get_current_active_user),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    updated = await wallets.remove_card(db, current_user.id, card_id)
+    if not updated:
+        raise HTTPException(status_code=404, detail="Card not found in wallet")
+    return updated
 
 @app.post("/transactions/train")
 async def train_models(
+    force: bool = False,
     current_user: UserDB = Depends(get_current_active_user),
-    db: AsyncIOMotorDatabase = Depends(get_database)
+    db: AsyncIOMotorDatabase = Depends(get_database),
+    training_db: AsyncIOMotorDatabase = Depends(database_for("training"))
 ):
-    """Train ML models using stored transaction data"""
+    """Train and evaluate a candidate model; promote it unless it regresses"""
     if not current_user.is_superuser:
         raise HTTPException(status_code=403, detail="Not authorized to train models")
         
-    transactions = await db.transactions.find().to_list(length=None)
+    transactions = await training_db.transactions.find(
+        {}, {"_id": 0, "description": 1, "category": 1}
+    ).to_list(length=None)
     
     if not transactions or len(transactions) < settings.min_training_samples:
         raise HTTPException(
@@ -188,26 +333,107 @@ async def train_models(
     categories = [t["category"] for t in transactions]
     
     try:
-        category_predictor.train(descriptions, categories)
-        category_predictor.save()
-        
-        # Store model metadata
-        await db.ml_model_metadata.update_one(
-            {"model_name": "category_predictor"},
-            {
-                "$set": {
-                    "version": settings.api_version,
-                    "last_trained": datetime.utcnow(),
-                    "training_samples": len(transactions),
-                    "is_active": True
-                }
-            },
-            upsert=True
+        # CPU-bound; keep the event loop serving requests meanwhile
+        candidate, metrics, live_latency = await run_in_threadpool(
+            train_and_evaluate, descriptions, categories, settings, category_predictor
         )
-        
-        return {"message": "Models trained successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Training failed: {str(e)}")
+    
+    current = await db.ml_model_metadata.find_one({"model_name": "category_predictor"})
+    regressions = check_promotion(
+        metrics, (current or {}).get("performance_metrics"), settings, live_latency=live_latency
+    )
+    promoted = force or not regressions
+    await db.model_evaluations.insert_one({
+        "model_name": "category_predictor",
+        "engine": candidate.engine.name,
+        "evaluated_at": datetime.utcnow(),
+        "performance_metrics": metrics,
+        "live_latency": live_latency,
+        "regressions": regressions,
+        "promoted": promoted
+    })
+    if not promoted:
+        raise HTTPException(
+            status_code=409,
+            detail={
+                "message": "Candidate model regressed and was not promoted",
+                "regressions": regressions,
+                "performance_metrics": metrics
+            }
+        )
+    
+    category_predictor.adopt(candidate)
+    category_predictor.save(os.path.join(settings.model_path, "category_predictor.joblib"))
+    
+    # Store model metadata
+    await db.ml_model_metadata.update_one(
+        {"model_name": "category_predictor"},
+        {
+            "$set": {
+                "version": settings.api_version,
+                "engine": candidate.engine.name,
+                "last_trained": datetime.utcnow(),
+                "training_samples": len(transactions),
+                "performance_metrics": metrics,
+                "is_active": True
+            }
+        },
+        upsert=True
+    )
+    MODEL_INFO.set(1, model="category_predictor", version=settings.api_version)
+    version_hub.publish("model", settings.api_version, trained_at=datetime.utcnow().isoformat())
+    
+    return {
+        "message": "Models trained successfully",
+        "performance_metrics": metrics,
+        "regressions": regressions
+    }
+
+@app.post("/transactions/recompute")
+async def recompute_rewards(
+    background_tasks: BackgroundTasks,
+    current_user: UserDB = Depends(get_current_active_user),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+    scan_db: AsyncIOMotorDatabase = Depends(database_for("bulk"))
+):
+    """Rescore stored transactions affected by catalog changes since the last run"""
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=403, detail="Not authorized to recompute rewards")
+        
+    job = await recompute.start_job(db)
+    if job is None:
+        return {"message": "Catalog unchanged, nothing to recompute"}
+    
+    # Resumes from the last checkpoint if this job was interrupted
+    if not recompute.is_active(job["_id"]):
+        background_tasks.add_task(recompute.run_job, db, job, settings.recompute_chunk_size, scan_db)
+    return {
+        "job_id": str(job["_id"]),
+        "status": job["status"],
+        "cells": job["cells"],
+        "processed": job["processed"]
+    }
+
+@app.get("/transactions/recompute/{job_id}")
+async def get_recompute_job(
+    job_id: str,
+    current_user: UserDB = Depends(get_current_active_user),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Progress of a recompute job"""
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=403, detail="Not authorized to view recompute jobs")
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+        
+    job = await db.recompute_jobs.find_one({"_id": ObjectId(job_id)}, {"cards": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    job["_id"] = str(job["_id"])
+    job["last_id"] = str(job["last_id"]) if job["last_id"] is not None else None
+    return job
 
 @app.get("/predict-category")
 async def get_category_prediction(
@@ -216,7 +442,37 @@ async def get_category_prediction(
 ):
     """Predict spending category from transaction description"""
     try:
-        category = predict_category(description)
+        with timed("predict_category"):
+            category = predict_category(description)
         return {"category": category}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}") 
+
+if settings.metrics_enabled:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        """Prometheus scrape endpoint"""
+        return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@app.post("/debug/profile", include_in_schema=False)
+async def debug_profile(
+    seconds: float = 5.0,
+    interval_ms: float = 5.0,
+    current_user: UserDB = Depends(get_current_active_user)
+):
+    """Sample the event loop for a few seconds and return collapsed stacks"""
+    if not settings.profiler_enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=403, detail="Not authorized to profile")
+    if not 0 < seconds <= settings.profiler_max_seconds:
+        raise HTTPException(
+            status_code=400,
+            detail=f"seconds must be between 0 and {settings.profiler_max_seconds}"
+        )
+        
+    profiler = await profile_event_loop(seconds, interval=max(interval_ms, 1.0) / 1000)
+    return PlainTextResponse(
+        profiler.collapsed(),
+        headers={"X-Profile-Samples": str(profiler.samples)}
+    )
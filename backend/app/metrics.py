@@ -0,0 +1,387 @@
+"""
+Lightweight in-process metrics exposed in Prometheus text format.
+
+Recording a sample costs a ``perf_counter`` call, a bisect and a lock, so
+the hot-path spans can stay enabled in production.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from pymongo import monitoring
+
+# Seconds; tuned for sub-millisecond stages up to multi-second requests
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4"  # Starlette appends the charset
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base class: a named family of samples keyed by label values"""
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> Iterable[str]:
+        for key, value in list(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge(Metric):
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._function: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def set_function(self, function: Callable[[], Dict[Tuple[str, ...], float]]):
+        """Compute samples at scrape time; ``function`` maps label tuples to values"""
+        self._function = function
+
+    def samples(self) -> Iterable[str]:
+        values = dict(self._values)
+        if self._function is not None:
+            try:
+                values.update(self._function())
+            except Exception:
+                pass  # A broken collector must not break the scrape
+        for key, value in values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts..., +Inf count], sum
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+                self._sums[key] = 0.0
+            counts[index] += 1
+            self._sums[key] += value
+
+    def count(self, **labels) -> int:
+        return sum(self._counts.get(self._key(labels), ()))
+
+    def sum(self, **labels) -> float:
+        return self._sums.get(self._key(labels), 0.0)
+
+    def quantile(self, q: float, **labels) -> float:
+        """Estimate a quantile from bucket counts (upper bound of the bucket)"""
+        counts = self._counts.get(self._key(labels))
+        if not counts:
+            return 0.0
+        target = q * sum(counts)
+        running = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            running += count
+            if running >= target:
+                return bound
+        return float("inf")
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            snapshot = [(k, list(c), self._sums[k]) for k, c in self._counts.items()]
+        for key, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="%s"' % _format_value(bound)
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        return "\n".join(m.render() for m in self._metrics.values()) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_LATENCY = REGISTRY.register(Histogram(
+    "cardmax_stage_duration_seconds",
+    "Time spent in each hot-path stage",
+    labelnames=("stage",)
+))
+REQUEST_LATENCY = REGISTRY.register(Histogram(
+    "cardmax_http_request_duration_seconds",
+    "HTTP request latency by route",
+    labelnames=("method", "route", "status")
+))
+REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "cardmax_http_requests_in_flight",
+    "Requests currently being served"
+))
+MODEL_INFO = REGISTRY.register(Gauge(
+    "cardmax_model_info",
+    "Version of each loaded model (value is always 1)",
+    labelnames=("model", "version")
+))
+MODEL_STATE = REGISTRY.register(Gauge(
+    "cardmax_model_state",
+    "Model size indicators (trained flag, feature, parameter and embedding counts)",
+    labelnames=("model", "field")
+))
+MONGO_POOL = REGISTRY.register(Gauge(
+    "cardmax_mongo_pool_connections",
+    "MongoDB connection pool state per server",
+    labelnames=("address", "state")
+))
+MONGO_POOL_EVENTS = REGISTRY.register(Counter(
+    "cardmax_mongo_pool_events_total",
+    "MongoDB connection pool events",
+    labelnames=("event",)
+))
+MONGO_COMMAND_LATENCY = REGISTRY.register(Histogram(
+    "cardmax_mongo_command_duration_seconds",
+    "MongoDB command latency by collection",
+    labelnames=("collection", "command", "status")
+))
+REDIS_POOL = REGISTRY.register(Gauge(
+    "cardmax_redis_pool_connections",
+    "Redis connection pool state",
+    labelnames=("state",)
+))
+
+
+@contextmanager
+def timed(stage: str):
+    """Record the duration of the enclosed block as a stage span"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - start, stage=stage)
+
+
+class MongoPoolListener(monitoring.ConnectionPoolListener):
+    """Tracks open and checked-out connections for each server's pool"""
+
+    def _address(self, event) -> str:
+        host, port = event.address
+        return f"{host}:{port}"
+
+    def pool_created(self, event):
+        MONGO_POOL_EVENTS.inc(event="pool_created")
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        MONGO_POOL_EVENTS.inc(event="pool_cleared")
+
+    def pool_closed(self, event):
+        MONGO_POOL_EVENTS.inc(event="pool_closed")
+
+    def connection_created(self, event):
+        MONGO_POOL.inc(address=self._address(event), state="open")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        MONGO_POOL.dec(address=self._address(event), state="open")
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        MONGO_POOL_EVENTS.inc(event="checkout_failed")
+
+    def connection_checked_out(self, event):
+        MONGO_POOL.inc(address=self._address(event), state="checked_out")
+
+    def connection_checked_in(self, event):
+        MONGO_POOL.dec(address=self._address(event), state="checked_out")
+
+
+def watch_redis_pool(pool):
+    """Report a redis-py connection pool's size at scrape time"""
+    def collect():
+        available = len(getattr(pool, "_available_connections", ()))
+        in_use = len(getattr(pool, "_in_use_connections", ()))
+        return {
+            ("created",): getattr(pool, "_created_connections", available + in_use),
+            ("available",): available,
+            ("in_use",): in_use,
+            ("max",): getattr(pool, "max_connections", 0),
+        }
+    REDIS_POOL.set_function(collect)
+
+
+def watch_models(category_predictor, recommender):
+    """Report model size indicators at scrape time"""
+    def collect():
+        engine = category_predictor.engine
+        return {
+            ("category_predictor", "trained"): int(category_predictor.is_trained),
+            ("category_predictor", "features"): engine.num_features(),
+            ("category_predictor", "parameter_bytes"): engine.nbytes() if category_predictor.is_trained else 0,
+            ("recommender", "user_embeddings"): len(recommender.user_embeddings),
+            ("recommender", "card_embeddings"): len(recommender.card_embeddings),
+        }
+    MODEL_STATE.set_function(collect)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency and in-flight requests"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            route = scope.get("route")
+            # Use the route template, never the raw path, to bound label cardinality
+            path = getattr(route, "path", None) or "unmatched"
+            REQUEST_LATENCY.observe(
+                time.perf_counter() - start,
+                method=scope["method"],
+                route=path,
+                status=str(status_code)
+            )
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Records the latency of every command against its collection"""
+
+    def __init__(self):
+        # Completion events don't carry the command, so remember its collection
+        self._pending: Dict[Tuple[Any, int], str] = {}
+
+    def started(self, event):
+        name = event.command_name
+        target = event.command.get("collection" if name == "getMore" else name)
+        collection = target if isinstance(target, str) else ""
+        self._pending[(event.connection_id, event.request_id)] = collection
+
+    def _record(self, event, status: str):
+        collection = self._pending.pop((event.connection_id, event.request_id), None)
+        if collection is None:
+            return
+        MONGO_COMMAND_LATENCY.observe(
+            event.duration_micros / 1e6,
+            collection=collection,
+            command=event.command_name,
+            status=status
+        )
+
+    def succeeded(self, event):
+        self._record(event, "ok")
+
+    def failed(self, event):
+        self._record(event, "error")
@@ -1,14 +1,55 @@
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Set, Tuple
+import itertools
+import logging
+import pickle
+import time
 import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import SGDClassifier
 from sklearn.naive_bayes import MultinomialNB
 from sklearn.preprocessing import LabelEncoder
+from scipy.sparse import csr_matrix
 import joblib
 from pathlib import Path
 import pandas as pd
+from .config import get_settings
 from .models import Category, Card, UserWallet
+from .personalization import PERSONALIZATION_STORE_OPS
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+class PredictorEngine:
+    """
+    Text classifier behind CategoryPredictor. Engines work on plain
+    category values; CategoryPredictor maps them to and from Category.
+    """
+    name = ""
+
+    def fit(self, descriptions: List[str], labels: List[str]):
+        raise NotImplementedError
+
+    def predict(self, descriptions: List[str]) -> List[str]:
+        raise NotImplementedError
+
+    def get_state(self) -> Dict:
+        """Everything needed to rebuild the trained engine"""
+        raise NotImplementedError
+
+    def set_state(self, state: Dict):
+        raise NotImplementedError
+
+    def num_features(self) -> int:
+        raise NotImplementedError
+
+    def nbytes(self) -> int:
+        """Approximate in-memory size of the trained parameters"""
+        return len(pickle.dumps(self.get_state(), protocol=pickle.HIGHEST_PROTOCOL))
+
+class TfidfNBEngine(PredictorEngine):
+    """Word uni/bigram TF-IDF with multinomial naive Bayes"""
+    name = "tfidf_nb"
 
-class CategoryPredictor:
     def __init__(self):
         self.vectorizer = TfidfVectorizer(
             max_features=1000,
@@ -17,33 +58,214 @@ class CategoryPredictor:
         )
         self.classifier = MultinomialNB()
         self.label_encoder = LabelEncoder()
+
+    def fit(self, descriptions: List[str], labels: List[str]):
+        X = self.vectorizer.fit_transform(descriptions)
+        y = self.label_encoder.fit_transform(labels)
+        self.classifier.fit(X, y)
+
+    def predict(self, descriptions: List[str]) -> List[str]:
+        X = self.vectorizer.transform(descriptions)
+        return list(self.label_encoder.inverse_transform(self.classifier.predict(X)))
+
+    def get_state(self) -> Dict:
+        return {
+            'vectorizer': self.vectorizer,
+            'classifier': self.classifier,
+            'label_encoder': self.label_encoder
+        }
+
+    def set_state(self, state: Dict):
+        self.vectorizer = state['vectorizer']
+        self.classifier = state['classifier']
+        self.label_encoder = state['label_encoder']
+
+    def num_features(self) -> int:
+        return len(getattr(self.vectorizer, "vocabulary_", None) or {})
+
+_FNV_OFFSET = np.uint32(2166136261)
+_FNV_PRIME = np.uint32(16777619)
+
+def hash_ngrams(
+    descriptions: List[str],
+    n_features: int,
+    ngram_range: Tuple[int, int] = (2, 4)
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Hash the character n-grams of a batch of descriptions.
+
+    All descriptions are lowercased, space-padded and concatenated into one
+    byte buffer, and FNV-1a is computed for every n-gram position at once.
+    Returns (document index, bucket, value) per n-gram, where value carries
+    a hash-derived sign and 1/sqrt(n-grams in the document) scaling.
+    """
+    encoded = [f" {d.lower()} ".encode("utf-8") for d in descriptions]
+    lengths = np.fromiter((len(e) for e in encoded), dtype=np.int64, count=len(encoded))
+    # A zero byte between documents marks n-grams that would span two of them
+    buffer = np.frombuffer(b"\0".join(encoded), dtype=np.uint8).astype(np.uint32)
+    doc_of_byte = np.repeat(np.arange(len(encoded)), lengths + 1)[:len(buffer)]
+    separators = np.concatenate(([0], np.cumsum(buffer == 0)))
+
+    docs, buckets, signs = [], [], []
+    with np.errstate(over="ignore"):
+        for n in range(ngram_range[0], ngram_range[1] + 1):
+            positions = len(buffer) - n + 1
+            if positions <= 0:
+                continue
+            h = np.full(positions, _FNV_OFFSET ^ np.uint32(n), dtype=np.uint32)
+            for k in range(n):
+                h ^= buffer[k:k + positions]
+                h *= _FNV_PRIME
+            valid = separators[n:n + positions] == separators[:positions]
+            h = h[valid]
+            docs.append(doc_of_byte[:positions][valid])
+            buckets.append((h & np.uint32(n_features - 1)).astype(np.int64))
+            signs.append(np.where(h >> np.uint32(31), -1.0, 1.0).astype(np.float32))
+
+    if not docs:
+        return np.zeros(0, np.int64), np.zeros(0, np.int64), np.zeros(0, np.float32)
+    doc = np.concatenate(docs)
+    counts = np.bincount(doc, minlength=len(encoded))
+    values = np.concatenate(signs) / np.sqrt(np.maximum(counts, 1))[doc].astype(np.float32)
+    return doc, np.concatenate(buckets), values
+
+class HashingLinearEngine(PredictorEngine):
+    """
+    Character n-gram feature hashing with a linear (logistic, one-vs-rest) model.
+
+    Weights are kept as one flat (n_classes * n_features) array, float32 or
+    int8 with a per-class scale, so there is no vocabulary to hold or
+    unpickle. sklearn is only used to fit; prediction is plain NumPy.
+    """
+    name = "hashing"
+
+    def __init__(self, n_features: int = 2 ** 16, ngram_range: Tuple[int, int] = (2, 4), quantize: bool = False, alpha: float = 1e-5):
+        if n_features & (n_features - 1):
+            raise ValueError("n_features must be a power of two")
+        self.n_features = n_features
+        self.ngram_range = tuple(ngram_range)
+        self.quantize = quantize
+        self.alpha = alpha
+        self.classes: List[str] = []
+        self.weights = np.zeros(0, dtype=np.float32)
+        self.scales: Optional[np.ndarray] = None
+        self.intercept = np.zeros(0, dtype=np.float32)
+
+    def _features(self, descriptions: List[str]) -> csr_matrix:
+        doc, bucket, value = hash_ngrams(descriptions, self.n_features, self.ngram_range)
+        return csr_matrix((value, (doc, bucket)), shape=(len(descriptions), self.n_features))
+
+    def fit(self, descriptions: List[str], labels: List[str]):
+        self.classes = sorted(set(labels))
+        if len(self.classes) < 2:
+            raise ValueError("Need at least two categories to train")
+        y = np.searchsorted(self.classes, labels)
+        model = SGDClassifier(loss="log_loss", alpha=self.alpha, max_iter=20, tol=None, random_state=0)
+        model.fit(self._features(descriptions), y)
+
+        # Binary problems get a single row; expand so every class has its own
+        coef = model.coef_ if len(self.classes) > 2 else np.vstack([-model.coef_[0], model.coef_[0]]) / 2
+        intercept = model.intercept_ if len(self.classes) > 2 else np.array([-model.intercept_[0], model.intercept_[0]]) / 2
+        # Class-major, so each class's weights are one contiguous row to gather from
+        weights = np.ascontiguousarray(coef, dtype=np.float32)  # (n_classes, n_features)
+        self.intercept = intercept.astype(np.float32)
+        if self.quantize:
+            self.scales = (np.abs(weights).max(axis=1) / 127).astype(np.float32)
+            self.scales[self.scales == 0] = 1.0
+            self.weights = np.round(weights / self.scales[:, None]).astype(np.int8).ravel()
+        else:
+            self.scales = None
+            self.weights = weights.ravel()
+
+    def decision_function(self, descriptions: List[str]) -> np.ndarray:
+        doc, bucket, value = hash_ngrams(descriptions, self.n_features, self.ngram_range)
+        weights = self.weights.reshape(len(self.classes), self.n_features)
+        if len(descriptions) == 1:
+            scores = (weights[:, bucket] * value).sum(axis=1, keepdims=True).T
+        else:
+            # Per class: gather each n-gram's weight and sum it into its document
+            scores = np.stack([
+                np.bincount(doc, weights=row[bucket] * value, minlength=len(descriptions))
+                for row in weights
+            ], axis=1)
+        if self.scales is not None:
+            scores *= self.scales
+        return scores + self.intercept
+
+    def predict(self, descriptions: List[str]) -> List[str]:
+        best = self.decision_function(descriptions).argmax(axis=1)
+        return [self.classes[i] for i in best]
+
+    def get_state(self) -> Dict:
+        return {
+            'n_features': self.n_features,
+            'ngram_range': self.ngram_range,
+            'quantize': self.quantize,
+            'alpha': self.alpha,
+            'classes': self.classes,
+            'weights': self.weights,
+            'scales': self.scales,
+            'intercept': self.intercept
+        }
+
+    def set_state(self, state: Dict):
+        for key, value in state.items():
+            setattr(self, key, value)
+
+    def num_features(self) -> int:
+        return self.n_features
+
+    def nbytes(self) -> int:
+        scales = self.scales.nbytes if self.scales is not None else 0
+        return self.weights.nbytes + self.intercept.nbytes + scales
+
+ENGINES = {
+    TfidfNBEngine.name: TfidfNBEngine,
+    HashingLinearEngine.name: HashingLinearEngine,
+}
+
+def create_engine(name: str, **options) -> PredictorEngine:
+    if name not in ENGINES:
+        raise ValueError(f"Unknown category engine: {name}")
+    return ENGINES[name](**options)
+
+class CategoryPredictor:
+    def __init__(self, engine: str = TfidfNBEngine.name, **engine_options):
+        self.engine_name = engine
+        self.engine_options = engine_options
+        self.engine = create_engine(engine, **engine_options)
         self.is_trained = False
         
     def train(self, descriptions: List[str], categories: List[Category]):
         """Train the category predictor model"""
-        X = self.vectorizer.fit_transform(descriptions)
-        y = self.label_encoder.fit_transform(categories)
-        self.classifier.fit(X, y)
+        # A loaded artifact may use another engine; retraining uses the configured one
+        self.engine = create_engine(self.engine_name, **self.engine_options)
+        # Train on plain values: numpy stringifies str-Enum members as "Category.X"
+        self.engine.fit(descriptions, [Category(c).value for c in categories])
         self.is_trained = True
         
+    def adopt(self, other: "CategoryPredictor"):
+        """Take over another predictor's trained engine, e.g. a promoted candidate"""
+        self.engine = other.engine
+        self.is_trained = other.is_trained
+
     def predict(self, description: str) -> Category:
         """Predict category from transaction description"""
+        return self.predict_batch([description])[0]
+
+    def predict_batch(self, descriptions: List[str]) -> List[Category]:
+        """Predict categories for many descriptions in one pass"""
         if not self.is_trained:
-            return Category.OTHER
-            
-        X = self.vectorizer.transform([description])
-        y_pred = self.classifier.predict(X)
-        category = self.label_encoder.inverse_transform(y_pred)[0]
-        return Category(category)
+            return [Category.OTHER] * len(descriptions)
+        return [Category(c) for c in self.engine.predict(descriptions)]
         
     def save(self, path: str = "models/category_predictor.joblib"):
         """Save the model to disk"""
         model_path = Path(path)
         model_path.parent.mkdir(parents=True, exist_ok=True)
         joblib.dump({
-            'vectorizer': self.vectorizer,
-            'classifier': self.classifier,
-            'label_encoder': self.label_encoder,
+            'engine': self.engine.name,
+            'state': self.engine.get_state(),
             'is_trained': self.is_trained
         }, path)
         
@@ -53,28 +275,164 @@ class CategoryPredictor:
             return
             
         model_dict = joblib.load(path)
-        self.vectorizer = model_dict['vectorizer']
-        self.classifier = model_dict['classifier']
-        self.label_encoder = model_dict['label_encoder']
+        if 'engine' not in model_dict:
+            # Artifacts saved before engines were pluggable
+            model_dict = {
+                'engine': TfidfNBEngine.name,
+                'state': model_dict,
+                'is_trained': model_dict['is_trained']
+            }
+        engine = create_engine(model_dict['engine'])
+        engine.set_state(model_dict['state'])
+        self.engine = engine
         self.is_trained = model_dict['is_trained']
 
+def create_category_predictor(settings) -> CategoryPredictor:
+    """Build the CategoryPredictor configured in ``config.Settings``"""
+    if settings.category_engine == HashingLinearEngine.name:
+        return CategoryPredictor(
+            HashingLinearEngine.name,
+            n_features=settings.hashing_n_features,
+            quantize=settings.hashing_quantize
+        )
+    return CategoryPredictor(settings.category_engine)
+
 class PersonalizedRecommender:
     def __init__(self):
         self.user_embeddings = {}
         self.card_embeddings = {}
         self.embedding_size = 32
+        # Optional shared store (see personalization.RedisEmbeddingStore)
+        self.store = None
+        self.cache_ttl = 30.0
+        self.cache_size = 100_000
+        self._fetched_at: Dict[str, float] = {}
+        # Updates not yet in the store, as deltas so nodes' updates add up
+        self._user_deltas: Dict[str, np.ndarray] = {}
+        self._card_deltas: Dict[str, np.ndarray] = {}
+        # (users, cards) handed to the store by a flush and not committed yet
+        self._flushing: Optional[Tuple[Dict, Dict]] = None
+
+    def attach_store(self, store, cache_ttl: float = 30.0, cache_size: int = 100_000):
+        """Share vectors through ``store``; local dicts become a read-through cache"""
+        self.store = store
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
         
     def _initialize_embeddings(self, user_id: str, cards: List[Card]):
         """Initialize embeddings for new users and cards"""
         if user_id not in self.user_embeddings:
             self.user_embeddings[user_id] = np.random.normal(0, 0.1, self.embedding_size)
+            if self.store is not None:
+                # Stored on the next flush unless another node stored one first
+                self._user_deltas.setdefault(user_id, np.zeros(self.embedding_size))
             
         for card in cards:
             if card.id not in self.card_embeddings:
                 self.card_embeddings[card.id] = np.random.normal(0, 0.1, self.embedding_size)
+                if self.store is not None:
+                    self._card_deltas.setdefault(card.id, np.zeros(self.embedding_size))
+
+    def _is_fresh(self, key: str, now: float) -> bool:
+        return now - self._fetched_at.get(key, float("-inf")) < self.cache_ttl
+
+    async def prefetch(self, user_id: str, cards: List[Card]):
+        """
+        Refresh the user's and the cards' vectors from the store in one
+        round trip. Fresh entries are kept, and unflushed local deltas are
+        re-applied on top of what was fetched. Vectors whose deltas a flush
+        is writing are left alone, since the fetched copy may or may not
+        include them yet.
+        """
+        if self.store is None:
+            return
+        user_id = str(user_id)
+        now = time.monotonic()
+        user_key = f"u:{user_id}"
+        fetch_user = not self._is_fresh(user_key, now)
+        card_ids = [card.id for card in cards if not self._is_fresh(f"c:{card.id}", now)]
+        if not fetch_user and not card_ids:
+            PERSONALIZATION_STORE_OPS.inc(op="prefetch", result="hit")
+            return
+
+        in_flight = self._in_flight()
+        try:
+            user_vector, card_vectors = await self.store.fetch(user_id if fetch_user else None, card_ids)
+        except RedisError:
+            logger.warning("Personalization store read failed", exc_info=True)
+            PERSONALIZATION_STORE_OPS.inc(op="prefetch", result="error")
+            return
+        PERSONALIZATION_STORE_OPS.inc(op="prefetch", result="miss")
+        # A flush may have started or committed while the fetch was out
+        in_flight |= self._in_flight()
+
+        if fetch_user and user_key not in in_flight:
+            if user_vector is not None:
+                self.user_embeddings[user_id] = user_vector + self._user_deltas.get(user_id, 0)
+            self._touch(user_key, now)
+        for card_id in card_ids:
+            if f"c:{card_id}" in in_flight:
+                continue  # Refetched once the flush is done
+            if card_id in card_vectors:
+                self.card_embeddings[card_id] = card_vectors[card_id] + self._card_deltas.get(card_id, 0)
+            self._touch(f"c:{card_id}", now)
+        self._evict()
+
+    def _in_flight(self) -> Set[str]:
+        if self._flushing is None:
+            return set()
+        users, cards = self._flushing
+        return {f"u:{u}" for u in users} | {f"c:{c}" for c in cards}
+
+    def _touch(self, key: str, now: float):
+        # Re-insert so dict order stays least recently fetched first
+        self._fetched_at.pop(key, None)
+        self._fetched_at[key] = now
+
+    def _evict(self):
+        # Drop the least recently fetched entries without pending updates beyond cache_size
+        excess = len(self._fetched_at) - self.cache_size
+        in_flight = self._in_flight()
+        for key in list(itertools.islice(self._fetched_at, max(0, excess))):
+            kind, item_id = key.split(":", 1)
+            deltas, embeddings = (
+                (self._user_deltas, self.user_embeddings) if kind == "u"
+                else (self._card_deltas, self.card_embeddings)
+            )
+            if item_id not in deltas and key not in in_flight:
+                embeddings.pop(item_id, None)
+                del self._fetched_at[key]
+
+    async def flush(self):
+        """
+        Add pending deltas to the stored vectors in batched transactions.
+        Deltas that did not commit, whether the store failed or the flush
+        was cancelled, are kept for the next flush.
+        """
+        if self.store is None or self._flushing is not None or not (self._user_deltas or self._card_deltas):
+            return
+        # The local vector is stored as is where the store has none yet
+        users = {u: (d, self.user_embeddings[u].copy()) for u, d in self._user_deltas.items() if u in self.user_embeddings}
+        cards = {c: (d, self.card_embeddings[c].copy()) for c, d in self._card_deltas.items() if c in self.card_embeddings}
+        self._user_deltas, self._card_deltas = {}, {}
+        # The store removes entries as they commit
+        self._flushing = (users, cards)
+        try:
+            await self.store.apply(users, cards)
+            PERSONALIZATION_STORE_OPS.inc(op="flush", result="ok")
+        except RedisError:
+            logger.warning("Personalization store write failed", exc_info=True)
+            PERSONALIZATION_STORE_OPS.inc(op="flush", result="error")
+        finally:
+            self._flushing = None
+            # Retry with the next flush, merged with updates made meanwhile
+            for pending, failed in ((self._user_deltas, users), (self._card_deltas, cards)):
+                for item_id, (delta, _) in failed.items():
+                    pending[item_id] = delta + pending.get(item_id, 0)
                 
     def update_embeddings(self, user_id: str, card_id: str, reward_value: float):
         """Update embeddings based on user-card interactions"""
+        user_id = str(user_id)
         learning_rate = 0.01
         user_embed = self.user_embeddings[user_id]
         card_embed = self.card_embeddings[card_id]
@@ -82,12 +440,17 @@ class PersonalizedRecommender:
         # Simple gradient update
         pred = np.dot(user_embed, card_embed)
         error = reward_value - pred
-        
-        self.user_embeddings[user_id] += learning_rate * error * card_embed
-        self.card_embeddings[card_id] += learning_rate * error * user_embed
+        user_step = learning_rate * error * card_embed
+        self.user_embeddings[user_id] += user_step
+        card_step = learning_rate * error * user_embed  # user_embed already holds the update
+        self.card_embeddings[card_id] += card_step
+        if self.store is not None:
+            self._user_deltas[user_id] = self._user_deltas.get(user_id, 0) + user_step
+            self._card_deltas[card_id] = self._card_deltas.get(card_id, 0) + card_step
         
     def get_personalized_scores(self, user_id: str, cards: List[Card]) -> Dict[str, float]:
         """Get personalized scores for each card"""
+        user_id = str(user_id)
         self._initialize_embeddings(user_id, cards)
         
         scores = {}
@@ -120,12 +483,12 @@ class PersonalizedRecommender:
         self.embedding_size = model_dict['embedding_size']
 
 # Global instances
-category_predictor = CategoryPredictor()
+category_predictor = create_category_predictor(get_settings())
 recommender = PersonalizedRecommender()
 
 # Try to load pre-trained models
 try:
-    category_predictor.load()
-    recommender.load()
+    category_predictor.load(str(Path(get_settings().model_path) / "category_predictor.joblib"))
+    recommender.load(str(Path(get_settings().model_path) / "recommender.joblib"))
 except Exception:
     pass  # Models will be trained as data becomes available 
\ No newline at end of file
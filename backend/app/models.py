@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
 from typing import List, Dict, Optional
+from datetime import datetime
 from enum import Enum
 
 class Category(str, Enum):
@@ -30,6 +31,40 @@ class UserWallet(BaseModel):
     user_id: str
     cards: List[Card]
 
+class WalletSnapshot(BaseModel):
+    """Wallet with its cards' reward data already resolved, as cached"""
+    wallet_id: str
+    user_id: str
+    version: int
+    cards: List[Card]
+    updated_at: datetime
+    catalog_generation: int = 0  # Applied catalog generation the cards' reward data was resolved against
+
+class WalletCardRequest(BaseModel):
+    card_id: str = Field(..., alias="cardId")
+
+    class Config:
+        populate_by_name = True
+
+class SimulationRequest(BaseModel):
+    card_ids: List[str] = Field(..., alias="cardIds", min_length=1)
+    months: int = Field(12, ge=1, le=60)
+
+    class Config:
+        populate_by_name = True
+
+class SimulationResult(BaseModel):
+    """Rewards over the user's recent history, without and with the candidate cards"""
+    months: int
+    transactions: int
+    current_rewards: float
+    proposed_rewards: float
+    reward_delta: float
+    added_annual_fees: float  # Prorated to ``months``; cards already in the wallet add nothing
+    net_delta: float
+    category_deltas: Dict[Category, float]
+    transactions_won: Dict[str, int]  # Candidate card id -> transactions it would have paid for
+
 class InputQuery(BaseModel):
     category: Category
     amount: float = Field(..., gt=0)
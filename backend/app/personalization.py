@@ -0,0 +1,114 @@
+"""
+Redis-backed storage for PersonalizedRecommender vectors.
+
+User and card vectors are packed float32 bytes in two Redis hashes, so
+every node scores with the same picture of a user. A restart loses at most
+the updates since the last flush. The recommender keeps a small local
+read-through cache. Before scoring, ``prefetch`` loads the user vector and
+any stale card vectors in one pipelined round trip. Each node accumulates
+its updates as deltas, and ``flush`` adds them to the stored vectors in
+WATCH/MULTI transactions. Concurrent updates from different nodes are
+therefore summed rather than overwriting each other.
+"""
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from redis.exceptions import WatchError
+
+from .metrics import REGISTRY, Counter
+
+PERSONALIZATION_STORE_OPS = REGISTRY.register(Counter(
+    "cardmax_personalization_store_ops_total",
+    "Personalization vector store operations by kind and result",
+    labelnames=("op", "result")
+))
+
+
+def pack(vector: np.ndarray) -> bytes:
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+
+def unpack(payload: bytes) -> np.ndarray:
+    # float64 in memory so gradient updates don't accumulate float32 rounding
+    return np.frombuffer(payload, dtype=np.float32).astype(np.float64)
+
+
+class RedisEmbeddingStore:
+    """Reads and writes packed vectors; needs a client with decode_responses=False"""
+
+    def __init__(self, redis, key_prefix: str = "cardmax:embeddings", batch_size: int = 500, max_attempts: int = 10):
+        self.redis = redis
+        self.users_key = f"{key_prefix}:users"
+        self.cards_key = f"{key_prefix}:cards"
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+
+    async def fetch(
+        self,
+        user_id: Optional[str],
+        card_ids: List[str]
+    ) -> Tuple[Optional[np.ndarray], Dict[str, np.ndarray]]:
+        """User vector and card vectors in one round trip; missing ids are omitted"""
+        async with self.redis.pipeline(transaction=False) as pipe:
+            if user_id is not None:
+                pipe.hget(self.users_key, user_id)
+            if card_ids:
+                pipe.hmget(self.cards_key, card_ids)
+            results = await pipe.execute()
+
+        user_vector = None
+        if user_id is not None:
+            payload = results.pop(0)
+            user_vector = unpack(payload) if payload is not None else None
+        cards = {}
+        if card_ids:
+            cards = {cid: unpack(p) for cid, p in zip(card_ids, results[0]) if p is not None}
+        return user_vector, cards
+
+    async def apply(
+        self,
+        users: Dict[str, Tuple[np.ndarray, np.ndarray]],
+        cards: Dict[str, Tuple[np.ndarray, np.ndarray]]
+    ):
+        """
+        Add each ``(delta, fallback)`` delta to the stored vector, or store
+        ``fallback`` where there is none yet. Uses at most ``batch_size``
+        fields per transaction. Entries are removed from ``users`` and
+        ``cards`` as their transaction commits, so after a failure only the
+        unwritten ones remain.
+        """
+        for key, updates in ((self.users_key, users), (self.cards_key, cards)):
+            items = list(updates.items())
+            for start in range(0, len(items), self.batch_size):
+                batch = dict(items[start:start + self.batch_size])
+                await self._apply_batch(key, batch)
+                for field in batch:
+                    del updates[field]
+
+    async def _apply_batch(self, key: str, updates: Dict[str, Tuple[np.ndarray, np.ndarray]]):
+        fields = list(updates)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for _ in range(self.max_attempts):
+                try:
+                    # Re-read and retry if another node writes the hash in between
+                    await pipe.watch(key)
+                    stored = await pipe.hmget(key, fields)
+                    vectors = {
+                        field: unpack(payload) + updates[field][0] if payload is not None else updates[field][1]
+                        for field, payload in zip(fields, stored)
+                    }
+                    pipe.multi()
+                    pipe.hset(key, mapping={field: pack(vector) for field, vector in vectors.items()})
+                    await pipe.execute()
+                    return
+                except WatchError:
+                    PERSONALIZATION_STORE_OPS.inc(op="flush", result="conflict")
+        raise WatchError(f"{key} kept changing for {self.max_attempts} attempts")
+
+
+async def run_flush_loop(recommender, interval: float = 1.0):
+    """Periodically write the recommender's pending updates to its store"""
+    while True:
+        await asyncio.sleep(interval)
+        await recommender.flush()
@@ -0,0 +1,76 @@
+"""
+On-demand sampling profiler.
+
+A background thread periodically snapshots the stack of a target thread
+(normally the event loop) and aggregates the stacks in collapsed
+"frame;frame;frame count" form, which flamegraph tools read directly.
+Nothing runs unless a profile is requested.
+"""
+import asyncio
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+
+def _collapse(frame, max_depth: int = 64) -> str:
+    parts = []
+    while frame is not None and len(parts) < max_depth:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+class SamplingProfiler:
+    """Samples one thread's stack every ``interval`` seconds"""
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = 0.005):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[_collapse(frame)] += 1
+                self.samples += 1
+            time.sleep(self.interval)
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def collapsed(self) -> str:
+        """Stacks in collapsed format, most frequent first"""
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+
+_active_lock = asyncio.Lock()
+
+
+async def profile_event_loop(seconds: float, interval: float = 0.005) -> SamplingProfiler:
+    """
+    Sample the calling event loop's thread for ``seconds`` while it keeps
+    serving other requests. Only one profile runs at a time.
+    """
+    async with _active_lock:
+        profiler = SamplingProfiler(interval=interval)
+        profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.stop()
+        return profiler
@@ -0,0 +1,302 @@
+"""
+Incremental recomputation of stored transaction rewards after catalog changes.
+
+Each transaction keeps the recommendation it was given (``card_id`` and
+``reward_value``, scored against the user's wallet at the time). The catalog's
+best card for it is kept separately in ``best_card_id`` and
+``best_reward_value``, and that is what this module maintains.
+
+A transaction's best card and reward depend only on its (category, foreign)
+cell and its amount. Diffing the last applied catalog against the current one
+gives the cells whose per-card effective rates changed. Only transactions in
+those cells are rescored, found through the (category, is_foreign, _id) index.
+Rescoring runs in NumPy chunks, and the results go back as unordered bulk
+updates. Transactions inserted after their cell was last scanned have no best
+card yet, so every job ends by sweeping those (through the best_card_id
+index), and a job is started for them even when the catalog is unchanged. A
+checkpoint after every chunk lets an interrupted job resume where it stopped.
+"""
+import hashlib
+import json
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from bson import ObjectId
+from pymongo import ASCENDING, UpdateOne
+
+from .events import version_hub
+from .metrics import timed
+from .models import Card, Category
+from .rewards import load_card_data
+from .wallets import card_from_db
+
+logger = logging.getLogger(__name__)
+
+Cell = Tuple[Category, bool]
+
+ALL_CELLS: List[Cell] = [(category, foreign) for category in Category for foreign in (False, True)]
+BONUS_CATEGORIES = (Category.DINING, Category.TRAVEL)
+
+SNAPSHOT_ID = "applied"
+
+# Jobs being processed by this worker, so a second trigger doesn't double-run one
+_active_jobs: Set[ObjectId] = set()
+
+
+def effective_rate(card: Card, category: Category, foreign: bool) -> float:
+    """Percent of the amount earned in a cell, before the large-purchase bonus"""
+    rate = card.rewards.get(category, card.rewards.get(Category.OTHER, 0))
+    if foreign:
+        rate -= card.foreign_transaction_fee
+    return rate
+
+
+def catalog_version(cards: List[Card]) -> str:
+    """Stable hash of a catalog's contents"""
+    payload = json.dumps(
+        [card.model_dump(mode="json") for card in sorted(cards, key=lambda card: card.id)],
+        sort_keys=True
+    )
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def diff_catalogs(old: Optional[List[Card]], new: List[Card]) -> Set[Cell]:
+    """
+    Cells whose outcome may differ between two catalogs. Every cell counts
+    as changed when there is no previous catalog.
+    """
+    if old is None:
+        return set(ALL_CELLS)
+
+    old_by_id = {card.id: card for card in old}
+    new_by_id = {card.id: card for card in new}
+    changed: Set[Cell] = set()
+    for category, foreign in ALL_CELLS:
+        for card_id in old_by_id.keys() | new_by_id.keys():
+            before, after = old_by_id.get(card_id), new_by_id.get(card_id)
+            if before is None or after is None:
+                changed.add((category, foreign))
+                break
+            if effective_rate(before, category, foreign) != effective_rate(after, category, foreign):
+                changed.add((category, foreign))
+                break
+    return changed
+
+
+def score_chunk(cards: List[Card], category: Category, foreign: bool, amounts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Best card index and reward value for each amount in one cell.
+    Mirrors ``rewards.calculate_reward_value`` across the whole chunk.
+    """
+    rates = np.array([effective_rate(card, category, foreign) for card in cards])
+    values = amounts[:, None] * (rates[None, :] / 100)
+    if category in BONUS_CATEGORIES:
+        values *= np.where(amounts >= 100, 1.1, 1.0)[:, None]
+    best = values.argmax(axis=1)
+    return best, values[np.arange(len(amounts)), best]
+
+
+async def load_current_catalog(db) -> List[Card]:
+    """Bundled catalog plus active cards from the ``cards`` collection"""
+    cards = list(load_card_data())
+    async for doc in db.cards.find({"is_active": True}):
+        cards.append(card_from_db(doc))
+    return cards
+
+
+async def _load_applied_catalog(db) -> Optional[List[Card]]:
+    doc = await db.catalog_snapshots.find_one({"_id": SNAPSHOT_ID})
+    if doc is None:
+        return None
+    return [Card(**card) for card in doc["cards"]]
+
+
+def _best_updates(docs: List[Dict], card_ids: np.ndarray, best: np.ndarray, values: np.ndarray, now: datetime) -> List[UpdateOne]:
+    return [
+        UpdateOne({"_id": doc["_id"]}, {"$set": {
+            "best_card_id": card_ids[b],
+            "best_reward_value": float(v),
+            "updated_at": now,
+        }})
+        for doc, b, v in zip(docs, best, values)
+        if doc.get("best_card_id") != card_ids[b] or doc.get("best_reward_value") != float(v)
+    ]
+
+
+async def applied_generation(db) -> int:
+    """Generation of the last applied catalog, 0 before the first recompute"""
+    doc = await db.catalog_snapshots.find_one({"_id": SNAPSHOT_ID}, {"generation": 1})
+    return (doc or {}).get("generation", 0)
+
+
+def _cell_filter(category: Category, foreign: bool) -> Dict:
+    # Older transactions have no is_foreign field; treat them as domestic
+    return {
+        "category": category.value,
+        "is_foreign": True if foreign else {"$in": [False, None]},
+    }
+
+
+async def start_job(db) -> Optional[Dict]:
+    """
+    Diff the catalog and create (or resume) a recompute job. Returns None
+    when nothing changed since the last applied catalog and every
+    transaction already has a best card.
+    """
+    cards = await load_current_catalog(db)
+    version = catalog_version(cards)
+
+    running = await db.recompute_jobs.find_one({"status": "running", "catalog_version": version})
+    if running:
+        return running
+
+    previous = await _load_applied_catalog(db)
+    if previous is not None and catalog_version(previous) == version:
+        if await db.transactions.find_one({"best_card_id": None}, {"_id": 1}) is None:
+            return None
+        changed: Set[Cell] = set()
+    else:
+        changed = diff_catalogs(previous, cards)
+    ordered_cells = [cell for cell in ALL_CELLS if cell in changed]
+    now = datetime.utcnow()
+    job = {
+        "_id": ObjectId(),
+        "status": "running",
+        "catalog_version": version,
+        "cards": [card.model_dump(mode="json") for card in cards],
+        "cells": [[category.value, foreign] for category, foreign in ordered_cells],
+        "cell_index": 0,
+        "last_id": None,
+        "processed": 0,
+        "updated": 0,
+        "created_at": now,
+        "updated_at": now,
+    }
+    # Any older running job targets a catalog that no longer exists
+    await db.recompute_jobs.update_many(
+        {"status": "running"},
+        {"$set": {"status": "superseded", "updated_at": now}}
+    )
+    await db.recompute_jobs.insert_one(job)
+    return job
+
+
+def is_active(job_id: ObjectId) -> bool:
+    return job_id in _active_jobs
+
+
+async def run_job(db, job: Dict, chunk_size: int = 1000, scan_db=None) -> Dict:
+    """
+    Process a job from its checkpoint to completion. Chunks are read through
+    ``scan_db`` when given (e.g. a secondary-preferred handle); writes and
+    checkpoints always go through ``db``.
+    """
+    if job["_id"] in _active_jobs:
+        return job
+    _active_jobs.add(job["_id"])
+    try:
+        return await _run_job(db, job, chunk_size, scan_db or db)
+    finally:
+        _active_jobs.discard(job["_id"])
+
+
+async def _run_job(db, job: Dict, chunk_size: int, scan_db) -> Dict:
+    cards = [Card(**card) for card in job["cards"]]
+    card_ids = np.array([card.id for card in cards], dtype=object)
+    cells = job["cells"]
+
+    while job["cell_index"] < len(cells):
+        category, foreign = Category(cells[job["cell_index"]][0]), cells[job["cell_index"]][1]
+        query = _cell_filter(category, foreign)
+        if job["last_id"] is not None:
+            query["_id"] = {"$gt": job["last_id"]}
+
+        docs = await scan_db.transactions.find(query, {"_id": 1, "amount": 1, "best_card_id": 1, "best_reward_value": 1}) \
+            .sort("_id", ASCENDING).limit(chunk_size).to_list(length=chunk_size)
+
+        updates = []
+        if docs:
+            with timed("recompute_chunk"):
+                amounts = np.array([doc["amount"] for doc in docs], dtype=float)
+                best, values = score_chunk(cards, category, foreign, amounts)
+                updates = _best_updates(docs, card_ids, best, values, datetime.utcnow())
+        await _write_chunk(db, job, docs, updates, chunk_size)
+
+    # Sweep transactions that were inserted after their cell was scanned
+    while job["cell_index"] == len(cells):
+        query: Dict = {"best_card_id": None}
+        if job["last_id"] is not None:
+            query["_id"] = {"$gt": job["last_id"]}
+
+        docs = await scan_db.transactions.find(query, {"_id": 1, "amount": 1, "category": 1, "is_foreign": 1}) \
+            .sort("_id", ASCENDING).limit(chunk_size).to_list(length=chunk_size)
+
+        updates = []
+        if docs:
+            with timed("recompute_chunk"):
+                now = datetime.utcnow()
+                by_cell: Dict[Cell, List[Dict]] = {}
+                for doc in docs:
+                    by_cell.setdefault((Category(doc["category"]), bool(doc.get("is_foreign"))), []).append(doc)
+                for (category, foreign), cell_docs in by_cell.items():
+                    amounts = np.array([doc["amount"] for doc in cell_docs], dtype=float)
+                    best, values = score_chunk(cards, category, foreign, amounts)
+                    updates.extend(_best_updates(cell_docs, card_ids, best, values, now))
+        await _write_chunk(db, job, docs, updates, chunk_size)
+
+    job["status"] = "completed"
+    await db.recompute_jobs.update_one(
+        {"_id": job["_id"]},
+        {"$set": {"status": "completed", "updated_at": datetime.utcnow()}}
+    )
+    applied = await db.catalog_snapshots.find_one({"_id": SNAPSHOT_ID}, {"version": 1})
+    if applied is None or applied["version"] != job["catalog_version"]:
+        # The generation is shared by every node and only grows, unlike the
+        # content hash, so cached wallet snapshots can be ordered by it
+        await db.catalog_snapshots.update_one(
+            {"_id": SNAPSHOT_ID},
+            {
+                "$set": {"version": job["catalog_version"], "cards": job["cards"], "applied_at": datetime.utcnow()},
+                "$inc": {"generation": 1},
+            },
+            upsert=True
+        )
+        version_hub.publish("catalog", await applied_generation(db))
+    logger.info(
+        "Recompute job %s completed: %d processed, %d updated",
+        job["_id"], job["processed"], job["updated"]
+    )
+    return job
+
+
+async def _write_chunk(db, job: Dict, docs: List[Dict], updates: List[UpdateOne], chunk_size: int):
+    """Apply a chunk's updates and checkpoint the job past it"""
+    if updates:
+        await db.transactions.bulk_write(updates, ordered=False)
+    job["processed"] += len(docs)
+    job["updated"] += len(updates)
+
+    if len(docs) < chunk_size:
+        job["cell_index"] += 1
+        job["last_id"] = None
+    else:
+        job["last_id"] = docs[-1]["_id"]
+
+    # Checkpoint after every chunk so a restart resumes here
+    await db.recompute_jobs.update_one({"_id": job["_id"]}, {"$set": {
+        "cell_index": job["cell_index"],
+        "last_id": job["last_id"],
+        "processed": job["processed"],
+        "updated": job["updated"],
+        "updated_at": datetime.utcnow(),
+    }})
+
+
+async def recompute_missed_rewards(db, chunk_size: int = 1000) -> Optional[Dict]:
+    """Start or resume the recompute for the current catalog and run it to completion"""
+    job = await start_job(db)
+    if job is None:
+        return None
+    return await run_job(db, job, chunk_size=chunk_size)
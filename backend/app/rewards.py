@@ -1,11 +1,14 @@
 import json
+from functools import lru_cache
 from typing import List, Dict, Optional
 from pathlib import Path
-from fastapi_cache.decorator import cache
 from .models import Card, InputQuery, CardRecommendation, Category
 from .ml_models import category_predictor, recommender
+from .metrics import timed
 
-@cache(expire=3600)
+# Cached in-process: fastapi-cache's @cache would turn this into a coroutine,
+# which the synchronous scoring path below cannot consume.
+@lru_cache()
 def load_card_data() -> List[Card]:
     """
     Load card data from JSON file with caching
@@ -43,40 +46,54 @@ def calculate_reward_value(card: Card, query: InputQuery) -> float:
     
     return reward_value
 
-def get_best_card(query: InputQuery, user_id: Optional[str] = None) -> CardRecommendation:
+def get_best_card(
+    query: InputQuery,
+    user_id: Optional[str] = None,
+    cards: Optional[List[Card]] = None
+) -> CardRecommendation:
     """
-    Determine the best card to use for a given purchase, optionally using personalized recommendations
+    Determine the best card to use for a given purchase, optionally using personalized recommendations.
+    Scores ``cards`` (e.g. a wallet snapshot) when given, otherwise the full catalog.
     """
-    cards = load_card_data()
+    if cards is None:
+        with timed("load_catalog"):
+            cards = load_card_data()
     if not cards:
         raise ValueError("No cards available")
 
     best_card = None
     best_value = float('-inf')
+    best_reward = 0.0
     
     # Get personalized scores if user_id is provided
     personalized_scores = {}
     if user_id:
-        personalized_scores = recommender.get_personalized_scores(user_id, cards)
+        with timed("personalize"):
+            personalized_scores = recommender.get_personalized_scores(user_id, cards)
     
-    for card in cards:
-        value = calculate_reward_value(card, query)
-        
-        # Apply personalization if available
-        if user_id and card.id in personalized_scores:
-            personalization_weight = 0.2  # Adjust this weight based on confidence in personalization
-            value = value * (1 + personalization_weight * personalized_scores[card.id])
-        
-        if value > best_value:
-            best_card = card
-            best_value = value
+    with timed("score"):
+        for card in cards:
+            reward = calculate_reward_value(card, query)
+            value = reward
+            
+            # Apply personalization if available
+            if user_id and card.id in personalized_scores:
+                personalization_weight = 0.2  # Adjust this weight based on confidence in personalization
+                value = value * (1 + personalization_weight * personalized_scores[card.id])
+            
+            if value > best_value:
+                best_card = card
+                best_value = value
+                best_reward = reward
     
     if not best_card:
         raise ValueError("Could not determine best card")
     
-    # Update recommender system with the chosen card
+    # Update recommender system with the chosen card. Train on the raw reward:
+    # feeding back the personalized value makes the embeddings diverge.
     if user_id:
-        recommender.update_embeddings(user_id, best_card.id, best_value)
+        with timed("embedding_update"):
+            recommender.update_embeddings(user_id, best_card.id, best_reward)
     
     explanation = (
         f"Using {best_card.name} will earn you "
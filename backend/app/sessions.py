@@ -0,0 +1,302 @@
+"""
+Long-lived optimize sessions over WebSocket.
+
+A connection authenticates once and then keeps the user, their wallet cards
+and the catalog and model versions in memory. Queries are answered as they
+arrive without waiting for the client to read earlier answers. A bounded
+outbox provides backpressure, and described transactions are inserted in
+batches. Catalog, model and wallet changes are pushed to the client as
+they are published on ``version_hub``.
+
+Protocol (JSON text frames):
+
+* client -> ``{"id": 1, "category": "dining", "amount": 42.5,
+  "foreign_transaction": false, "description": "..."}``. ``id`` is echoed
+  back, and ``category`` may be omitted when a description is given.
+* server -> ``{"type": "session", ...}`` once, then ``{"type":
+  "recommendation", "id": ..., "card": ..., "reward_value": ...,
+  "explanation": ...}`` or ``{"type": "error", "id": ..., "detail": ...}``
+  per query, plus ``{"type": "catalog" | "model" | "wallet", "version": ...}``
+  pushes.
+
+The token goes in the ``token`` query parameter, or in a first
+``{"type": "auth", "token": "..."}`` message. The session closes with 1008
+when the token expires (``expires_at`` in the session message, epoch
+seconds) unless the client sends another ``auth`` message for the same
+user first; that is answered with ``{"type": "auth", "expires_at": ...}``.
+"""
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import WebSocket, WebSocketDisconnect, status
+from pydantic import model_validator
+
+from .auth import decode_token, user_from_claims
+from .db.models import TransactionDB, UserDB
+from .events import version_hub
+from .metrics import REGISTRY, Counter, Gauge, timed
+from .ml_models import recommender
+from .models import Card, Category, InputQuery
+from .rewards import get_best_card, load_card_data, predict_category
+from .wallets import get_wallet_snapshot
+
+logger = logging.getLogger(__name__)
+
+WS_SESSIONS = REGISTRY.register(Gauge(
+    "cardmax_ws_sessions",
+    "Open optimize WebSocket sessions"
+))
+WS_MESSAGES = REGISTRY.register(Counter(
+    "cardmax_ws_messages_total",
+    "WebSocket messages by direction and type",
+    labelnames=("direction", "type")
+))
+
+
+class SessionExpired(Exception):
+    """The session's credentials expired or were rejected"""
+
+
+class SessionQuery(InputQuery):
+    """A query frame; ``category`` may be left to the predictor when described"""
+    id: Any = None
+    category: Optional[Category] = None
+    description: Optional[str] = None
+
+    @model_validator(mode="after")
+    def category_or_description(self):
+        if self.category is None and not self.description:
+            raise ValueError("Either category or description is required")
+        return self
+
+
+class OptimizeSession:
+    """Per-connection state and message loop for ``/ws/optimize``"""
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        db,
+        user: UserDB,
+        expires_at: Optional[float] = None,
+        flush_size: int = 50,
+        outbox_size: int = 256
+    ):
+        self.websocket = websocket
+        self.db = db
+        self.user = user
+        self.expires_at = expires_at
+        self.flush_size = flush_size
+        self.outbox: asyncio.Queue = asyncio.Queue(maxsize=outbox_size)
+        self.cards: Optional[List[Card]] = None
+        self.wallet_version: Optional[int] = None
+        self.catalog_version = version_hub.current("catalog")
+        self.model_version = version_hub.current("model")
+        self._pending: List[Dict] = []
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def load_wallet(self):
+        wallet = await get_wallet_snapshot(self.db, str(self.user.id))
+        self.cards = wallet.cards if wallet and wallet.cards else None
+        self.wallet_version = wallet.version if wallet else None
+
+    def hello(self) -> Dict:
+        return {
+            "type": "session",
+            "user_id": str(self.user.id),
+            "expires_at": self.expires_at,
+            "wallet_version": self.wallet_version,
+            "catalog_version": self.catalog_version,
+            "model_version": self.model_version,
+        }
+
+    def answer(self, message: Dict) -> Dict:
+        """Score one query against the resident wallet"""
+        request_id = message.get("id")
+        try:
+            query = SessionQuery.model_validate(message)
+            if query.category is None:
+                with timed("predict_category"):
+                    query.category = predict_category(query.description)
+            recommendation = get_best_card(query, self.user.id, cards=self.cards)
+            if query.description:
+                transaction = TransactionDB(
+                    user_id=self.user.id,
+                    description=query.description,
+                    category=query.category,
+                    amount=query.amount,
+                    is_foreign=query.foreign_transaction,
+                    card_id=recommendation.card.id,
+                    reward_value=recommendation.reward_value
+                ).dict(by_alias=True)
+        except Exception as e:  # Includes pydantic's ValidationError; one bad frame must not end the session
+            return {"type": "error", "id": request_id, "detail": str(e)}
+
+        if query.description:
+            self._pending.append(transaction)
+        return {"type": "recommendation", "id": request_id, **recommendation.model_dump(mode="json")}
+
+    async def _receive(self) -> Optional[str]:
+        if self.expires_at is None:
+            return await _receive_text(self.websocket)
+        remaining = self.expires_at - time.time()
+        if remaining <= 0:
+            raise SessionExpired("Token expired")
+        try:
+            return await asyncio.wait_for(_receive_text(self.websocket), remaining)
+        except asyncio.TimeoutError:
+            raise SessionExpired("Token expired")
+
+    async def reauthenticate(self, token: Optional[str]):
+        """Extend the session with a fresh token for the same, still active user"""
+        user, expires_at = await authenticate(token, self.db)
+        if user is None or user.id != self.user.id:
+            raise SessionExpired("Could not validate credentials")
+        self.user, self.expires_at = user, expires_at
+        await self.outbox.put({"type": "auth", "expires_at": expires_at})
+
+    def _maybe_flush(self, force: bool = False):
+        # One insert in flight at a time; the rest accumulate for the next batch
+        if not self._pending or (self._flush_task and not self._flush_task.done()):
+            return
+        if force or len(self._pending) >= self.flush_size:
+            batch, self._pending = self._pending, []
+            self._flush_task = asyncio.create_task(self._insert(batch))
+
+    async def _insert(self, batch: List[Dict]):
+        try:
+            with timed("transaction_insert"):
+                await self.db.transactions.insert_many(batch, ordered=False)
+        except Exception:
+            logger.warning("Dropped %d session transactions", len(batch), exc_info=True)
+
+    async def _send_loop(self):
+        connected = True
+        while True:
+            message = await self.outbox.get()
+            if not connected:
+                continue  # Keep draining so producers never block on a dead socket
+            try:
+                await self.websocket.send_text(json.dumps(message))
+            except (WebSocketDisconnect, RuntimeError):
+                connected = False
+                continue
+            WS_MESSAGES.inc(direction="out", type=message["type"])
+
+    async def _watch(self, events: asyncio.Queue):
+        while True:
+            event = await events.get()
+            if event["type"] == "wallet" and event.get("user_id") != str(self.user.id):
+                continue
+            try:
+                if event["type"] == "catalog":
+                    self.catalog_version = event["version"]
+                elif event["type"] == "model":
+                    self.model_version = event["version"]
+                if event["type"] in ("wallet", "catalog"):
+                    # Wallet snapshots carry the cards' reward data
+                    await self.load_wallet()
+            except Exception:
+                logger.warning("Failed to refresh session wallet", exc_info=True)
+            await self.outbox.put(event)
+
+    async def run(self):
+        events: Optional[asyncio.Queue] = None
+        tasks: List[asyncio.Task] = []
+        WS_SESSIONS.inc()
+        try:
+            # Subscribe inside the try so a failed wallet load still unsubscribes
+            events = version_hub.subscribe()
+            await self.load_wallet()
+            tasks = [asyncio.create_task(self._send_loop()), asyncio.create_task(self._watch(events))]
+            await self.outbox.put(self.hello())
+            while True:
+                text = await self._receive()
+                if text is None:
+                    WS_MESSAGES.inc(direction="in", type="invalid")
+                    await self.outbox.put({"type": "error", "id": None, "detail": "Expected a text frame"})
+                    continue
+                try:
+                    message = json.loads(text)
+                except json.JSONDecodeError:
+                    message = None
+                if not isinstance(message, dict):
+                    WS_MESSAGES.inc(direction="in", type="invalid")
+                    await self.outbox.put({"type": "error", "id": None, "detail": "Expected a JSON object"})
+                    continue
+                if message.get("type") == "auth":
+                    WS_MESSAGES.inc(direction="in", type="auth")
+                    await self.reauthenticate(message.get("token"))
+                    continue
+                WS_MESSAGES.inc(direction="in", type="query")
+                # A no-op unless a shared store holds stale vectors
+                await recommender.prefetch(self.user.id, self.cards or load_card_data())
+                await self.outbox.put(self.answer(message))
+                self._maybe_flush()
+                # Let the sender drain between bursts
+                await asyncio.sleep(0)
+        except WebSocketDisconnect:
+            pass
+        except SessionExpired as e:
+            await self.websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=str(e))
+        finally:
+            WS_SESSIONS.dec()
+            if events is not None:
+                version_hub.unsubscribe(events)
+            for task in tasks:
+                task.cancel()
+            if self._flush_task:
+                await self._flush_task
+            self._maybe_flush(force=True)
+            if self._flush_task:
+                await self._flush_task
+
+
+async def _receive_text(websocket: WebSocket) -> Optional[str]:
+    """The next frame's text, or None for a binary frame"""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", status.WS_1000_NORMAL_CLOSURE))
+    return message.get("text")
+
+
+async def _read_token(websocket: WebSocket, timeout: float) -> Optional[str]:
+    token = websocket.query_params.get("token")
+    if token:
+        return token
+    try:
+        text = await asyncio.wait_for(_receive_text(websocket), timeout)
+        message = json.loads(text) if text is not None else None
+    except (asyncio.TimeoutError, json.JSONDecodeError):
+        return None
+    if isinstance(message, dict) and message.get("type") == "auth":
+        return message.get("token")
+    return None
+
+
+async def authenticate(token: Optional[str], db) -> Tuple[Optional[UserDB], Optional[float]]:
+    """The active user a token belongs to and when it expires, or (None, None)"""
+    claims = decode_token(token) if token else None
+    if claims is None:
+        return None, None
+    user = await user_from_claims(claims, db)
+    if user is None or not user.is_active:
+        return None, None
+    return user, claims.get("exp")
+
+
+async def run_session(websocket: WebSocket, db, auth_timeout: float = 10.0, flush_size: int = 50):
+    """Authenticate a connection once, then serve queries until it closes"""
+    await websocket.accept()
+    try:
+        token = await _read_token(websocket, auth_timeout)
+    except WebSocketDisconnect:
+        return
+    user, expires_at = await authenticate(token, db)
+    if user is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Could not validate credentials")
+        return
+    await OptimizeSession(websocket, db, user, expires_at=expires_at, flush_size=flush_size).run()
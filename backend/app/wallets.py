@@ -0,0 +1,238 @@
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from bson import ObjectId
+from redis.exceptions import RedisError, WatchError
+
+from .db.models import WalletDB
+from .events import version_hub
+from .metrics import REGISTRY, Counter, timed
+from .models import Card, WalletSnapshot
+from .rewards import load_card_data
+
+logger = logging.getLogger(__name__)
+
+WALLET_CACHE_REQUESTS = REGISTRY.register(Counter(
+    "cardmax_wallet_cache_requests_total",
+    "Wallet cache lookups by result",
+    labelnames=("result",)
+))
+
+
+class UnknownCardError(ValueError):
+    """Raised when a wallet references a card that exists nowhere"""
+
+
+def card_from_db(doc: Dict) -> Card:
+    """Convert a ``cards`` collection document into the API Card model"""
+    fields = {k: v for k, v in doc.items() if k != "_id"}
+    return Card(id=str(doc["_id"]), **fields)
+
+
+async def resolve_cards(db, card_ids: List[str]) -> List[Card]:
+    """
+    Resolve card ids against the bundled catalog first, then the ``cards``
+    collection, preserving the wallet's order.
+    """
+    catalog = {card.id: card for card in load_card_data()}
+    resolved: Dict[str, Card] = {cid: catalog[cid] for cid in card_ids if cid in catalog}
+
+    missing = [cid for cid in card_ids if cid not in resolved]
+    object_ids = [ObjectId(cid) for cid in missing if ObjectId.is_valid(cid)]
+    if object_ids:
+        async for doc in db.cards.find({"_id": {"$in": object_ids}}):
+            card = card_from_db(doc)
+            resolved[card.id] = card
+
+    unknown = [cid for cid in card_ids if cid not in resolved]
+    if unknown:
+        raise UnknownCardError(f"Unknown card(s): {', '.join(unknown)}")
+    return [resolved[cid] for cid in card_ids]
+
+
+def wallet_from_doc(doc: Dict) -> WalletDB:
+    # Wallets written before versioning have no version field. $inc starts
+    # those from 0, so read them as 0 too; otherwise the first update
+    # yields the same version as the snapshot already cached.
+    return WalletDB(**{"version": 0, **doc})
+
+
+async def build_snapshot(db, wallet: WalletDB) -> WalletSnapshot:
+    """Denormalize a wallet document into a snapshot"""
+    return WalletSnapshot(
+        wallet_id=str(wallet.id),
+        user_id=str(wallet.user_id),
+        version=wallet.version,
+        cards=await resolve_cards(db, wallet.cards),
+        updated_at=wallet.updated_at,
+        catalog_generation=current_catalog_generation()
+    )
+
+
+def current_catalog_generation() -> int:
+    """
+    Generation of the applied catalog as last seen by this process. The
+    generation lives in Mongo and only grows, so nodes that have not seen
+    the latest one yet still agree on which snapshot is newer.
+    """
+    return int(version_hub.current("catalog") or 0)
+
+
+def _replaces(snapshot: WalletSnapshot, cached: WalletSnapshot) -> bool:
+    if snapshot.version != cached.version:
+        return snapshot.version > cached.version
+    return snapshot.catalog_generation > cached.catalog_generation
+
+
+class WalletCache:
+    """
+    Write-through cache of wallet snapshots in Redis, keyed by user id.
+
+    Writers update Mongo first and then store the new snapshot; a snapshot
+    only replaces a cached one with a lower version (or the same version
+    resolved against an older catalog generation), so racing writers and
+    nodes that lag behind on the catalog can't roll the cache back. Redis errors are logged and treated as misses.
+    """
+
+    key_prefix = "wallet:"
+
+    def __init__(self):
+        self.redis = None
+        self.ttl = 3600
+
+    def init(self, redis, ttl: int = 3600):
+        self.redis = redis
+        self.ttl = ttl
+
+    def _key(self, user_id: str) -> str:
+        return f"{self.key_prefix}{user_id}"
+
+    async def get(self, user_id: str) -> Optional[WalletSnapshot]:
+        if self.redis is None:
+            return None
+        try:
+            payload = await self.redis.get(self._key(user_id))
+        except RedisError:
+            logger.warning("Wallet cache read failed", exc_info=True)
+            WALLET_CACHE_REQUESTS.inc(result="error")
+            return None
+        if payload is None:
+            WALLET_CACHE_REQUESTS.inc(result="miss")
+            return None
+        WALLET_CACHE_REQUESTS.inc(result="hit")
+        return WalletSnapshot.model_validate_json(payload)
+
+    async def put(self, snapshot: WalletSnapshot):
+        if self.redis is None:
+            return
+        key = self._key(snapshot.user_id)
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                await pipe.watch(key)
+                current = await pipe.get(key)
+                if current is not None and not _replaces(snapshot, WalletSnapshot.model_validate_json(current)):
+                    return
+                pipe.multi()
+                pipe.set(key, snapshot.model_dump_json(), ex=self.ttl)
+                await pipe.execute()
+        except WatchError:
+            # Another writer got there first; drop the entry rather than guess
+            await self.invalidate(snapshot.user_id)
+        except RedisError:
+            logger.warning("Wallet cache write failed", exc_info=True)
+            await self.invalidate(snapshot.user_id)
+
+    async def invalidate(self, user_id: str):
+        if self.redis is None:
+            return
+        try:
+            await self.redis.delete(self._key(user_id))
+        except RedisError:
+            logger.warning("Wallet cache invalidation failed", exc_info=True)
+
+
+wallet_cache = WalletCache()
+
+
+def _user_filter(user_id: str) -> Dict:
+    # Wallets store user_id as an ObjectId
+    return {"user_id": ObjectId(user_id) if ObjectId.is_valid(user_id) else user_id}
+
+
+async def get_wallet_snapshot(db, user_id: str) -> Optional[WalletSnapshot]:
+    """
+    Read a wallet from the cache, falling back to Mongo and repopulating.
+    Snapshots resolved against an older catalog generation are rebuilt, so
+    card reward changes take effect once the new catalog is applied.
+    """
+    with timed("wallet_cache_read"):
+        snapshot = await wallet_cache.get(user_id)
+    if snapshot is not None and snapshot.catalog_generation >= current_catalog_generation():
+        return snapshot
+
+    doc = await db.wallets.find_one(_user_filter(user_id))
+    if doc is None:
+        return None
+    snapshot = await build_snapshot(db, wallet_from_doc(doc))
+    await wallet_cache.put(snapshot)
+    return snapshot
+
+
+async def create_wallet(db, user_id: ObjectId, card_ids: List[str]) -> WalletSnapshot:
+    """Insert a wallet and cache its snapshot"""
+    card_ids = list(dict.fromkeys(card_ids))
+    cards = await resolve_cards(db, card_ids)
+    wallet = WalletDB(user_id=user_id, cards=card_ids)
+    await db.wallets.insert_one(wallet.dict(by_alias=True))
+
+    snapshot = WalletSnapshot(
+        wallet_id=str(wallet.id),
+        user_id=str(user_id),
+        version=wallet.version,
+        cards=cards,
+        updated_at=wallet.updated_at,
+        catalog_generation=current_catalog_generation()
+    )
+    await wallet_cache.put(snapshot)
+    version_hub.publish("wallet", snapshot.version, user_id=snapshot.user_id)
+    return snapshot
+
+
+async def _modify_wallet(db, user_id: ObjectId, query: Dict, update: Dict) -> Optional[WalletSnapshot]:
+    update.setdefault("$inc", {})["version"] = 1
+    update.setdefault("$set", {})["updated_at"] = datetime.utcnow()
+    result = await db.wallets.update_one({"user_id": user_id, **query}, update)
+    if result.modified_count == 0:
+        return None
+
+    doc = await db.wallets.find_one({"user_id": user_id})
+    snapshot = await build_snapshot(db, wallet_from_doc(doc))
+    await wallet_cache.put(snapshot)
+    version_hub.publish("wallet", snapshot.version, user_id=snapshot.user_id)
+    return snapshot
+
+
+async def add_card(db, user_id: ObjectId, card_id: str) -> Optional[WalletSnapshot]:
+    """
+    Add a card to the user's wallet. Returns None if the wallet does not
+    exist or already holds the card.
+    """
+    await resolve_cards(db, [card_id])
+    return await _modify_wallet(
+        db, user_id,
+        {"cards": {"$ne": card_id}},
+        {"$push": {"cards": card_id}}
+    )
+
+
+async def remove_card(db, user_id: ObjectId, card_id: str) -> Optional[WalletSnapshot]:
+    """
+    Remove a card from the user's wallet. Returns None if the wallet does
+    not exist or does not hold the card.
+    """
+    return await _modify_wallet(
+        db, user_id,
+        {"cards": card_id},
+        {"$pull": {"cards": card_id}}
+    )
@@ -0,0 +1,6 @@
+"""
+Benchmark suite for the Credit Card Optimizer backend.
+
+Run from ``backend/`` with ``python -m benchmarks``; compare two result
+files with ``python -m benchmarks.compare``.
+"""
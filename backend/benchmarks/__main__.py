@@ -0,0 +1,76 @@
+import argparse
+import asyncio
+
+from .api import run_api_benchmarks
+from .engines import run_engine_benchmarks
+from .harness import BenchmarkReport
+from .micro import run_micro_benchmarks
+from .overload import DEFAULT_STEPS, run_overload_benchmarks
+from .scale import DEFAULT_SIZES, run_scale_benchmarks
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the backend benchmark suite")
+    parser.add_argument(
+        "--suite", choices=["all", "api", "micro", "scale", "overload", "engines"], default="all",
+        help="'all' runs api and micro; the other suites must be requested explicitly"
+    )
+    parser.add_argument("--output", default="benchmarks/results/latest.json", help="Where to write the JSON report")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per API workload")
+    parser.add_argument("--token-requests", type=int, default=0, help="Requests for /token (default: requests / 10)")
+    parser.add_argument("--concurrency", type=int, default=32, help="Requests in flight per API workload")
+    parser.add_argument("--users", type=int, default=50, help="Seeded users")
+    parser.add_argument("--db-latency-ms", type=float, default=0.0, help="Simulated Mongo round-trip time")
+    parser.add_argument("--iterations", type=int, default=2000, help="Calls per micro-benchmark")
+    parser.add_argument("--catalog-size", type=int, default=50, help="Synthetic catalog size for recommender benchmarks")
+    parser.add_argument(
+        "--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+        help="Comma-separated row counts for the scale suite"
+    )
+    parser.add_argument("--rows-per-user", type=int, default=50, help="Average transactions per synthetic user")
+    parser.add_argument(
+        "--steps", default=",".join(str(s) for s in DEFAULT_STEPS),
+        help="Comma-separated client counts for the overload suite"
+    )
+    parser.add_argument("--engine-rows", type=int, default=20_000, help="Training rows for the engines suite")
+    args = parser.parse_args(argv)
+
+    report = BenchmarkReport(config=vars(args))
+    if args.suite in ("all", "api"):
+        asyncio.run(run_api_benchmarks(
+            report,
+            requests=args.requests,
+            concurrency=args.concurrency,
+            users=args.users,
+            db_latency_ms=args.db_latency_ms,
+            token_requests=args.token_requests
+        ))
+    if args.suite in ("all", "micro"):
+        run_micro_benchmarks(report, iterations=args.iterations, catalog_size=args.catalog_size)
+    if args.suite == "scale":
+        run_scale_benchmarks(
+            report,
+            sizes=[int(s) for s in args.sizes.split(",")],
+            rows_per_user=args.rows_per_user,
+            catalog_size=args.catalog_size,
+            iterations=min(args.iterations, 1000)
+        )
+
+    if args.suite == "engines":
+        run_engine_benchmarks(report, rows=args.engine_rows, iterations=min(args.iterations, 1000))
+
+    if args.suite == "overload":
+        asyncio.run(run_overload_benchmarks(
+            report,
+            steps=[int(s) for s in args.steps.split(",")],
+            users=args.users,
+            db_latency_ms=args.db_latency_ms
+        ))
+
+    report.write(args.output)
+    print(report.format_table())
+    print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+End-to-end load benchmarks for the FastAPI app.
+
+The app runs in-process behind an httpx ASGI transport, with Mongo replaced by
+``InMemoryDatabase`` and the Redis cache backend by fakeredis.
+"""
+from typing import Dict, List
+
+import httpx
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+
+from app.auth import create_access_token, get_password_hash
+from app.config import get_settings
+from app.db.database import Database
+from app.db.models import UserDB
+from app.main import admission_controller, app
+from app.ml_models import category_predictor
+from app.rewards import load_card_data
+from app.wallets import create_wallet, wallet_cache
+
+from .datagen import generate_training_data
+from .fakes import InMemoryClient
+from .harness import BenchmarkReport, run_load
+
+try:
+    from fakeredis import aioredis as fake_aioredis
+    from fastapi_cache.backends.redis import RedisBackend
+except ImportError:  # pragma: no cover - fakeredis is a dev dependency
+    fake_aioredis = None
+
+BENCH_PASSWORD = "bench-password"
+
+
+class BenchEnvironment:
+    """Seeded in-process app state shared by the API workloads"""
+
+    def __init__(self, users: int = 50, db_latency_ms: float = 0.0, admission: bool = False):
+        self.n_users = users
+        # Load shedding turns saturation into 503s; off unless a suite tests it
+        self.admission = admission
+        self._admission_was_enabled = admission_controller.enabled
+        self.db_latency = db_latency_ms / 1000
+        self.user_ids: List[str] = []
+        self.emails: List[str] = []
+        self.tokens: List[str] = []
+
+    async def setup(self):
+        admission_controller.enabled = self.admission
+        settings = get_settings()
+        Database.client = InMemoryClient(latency=self.db_latency)
+        Database.db = Database.client[settings.database_name]
+        await Database.create_indexes()
+
+        if fake_aioredis is not None:
+            redis = fake_aioredis.FakeRedis(encoding="utf8", decode_responses=True)
+            FastAPICache.init(RedisBackend(redis), prefix="fastapi-cache")
+            wallet_cache.init(redis)
+        else:
+            FastAPICache.init(InMemoryBackend(), prefix="fastapi-cache")
+
+        descriptions, categories = generate_training_data(2000, seed=1)
+        category_predictor.train(descriptions, categories)
+
+        # Hash once; bcrypt cost is what /token measures, not the seeding
+        hashed = get_password_hash(BENCH_PASSWORD)
+        catalog_ids = [card.id for card in load_card_data()]
+        for i in range(self.n_users):
+            email = f"bench-user-{i}@example.com"
+            user = UserDB(email=email, hashed_password=hashed)
+            await Database.db.users.insert_one(user.dict(by_alias=True))
+            # Every other user has a wallet with a rotating subset of the catalog
+            if i % 2 == 0:
+                await create_wallet(Database.db, user.id, catalog_ids[i % len(catalog_ids):] or catalog_ids)
+            self.user_ids.append(str(user.id))
+            self.emails.append(email)
+            self.tokens.append(create_access_token({"sub": email}))
+
+    async def teardown(self):
+        wallet_cache.init(None)
+        admission_controller.enabled = self._admission_was_enabled
+        await Database.close_db()
+        Database.client = None
+        Database.db = None
+
+    def auth_header(self, i: int) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.tokens[i % len(self.tokens)]}"}
+
+
+def _workloads(env: BenchEnvironment, client: httpx.AsyncClient):
+    descriptions = list(zip(*generate_training_data(1000, seed=2)))
+
+    async def token(i: int) -> bool:
+        response = await client.post(
+            "/token",
+            data={"username": env.emails[i % len(env.emails)], "password": BENCH_PASSWORD}
+        )
+        return response.status_code == 200
+
+    async def optimize(i: int) -> bool:
+        description, category = descriptions[i % len(descriptions)]
+        response = await client.post(
+            "/optimize",
+            params={"description": description},
+            json={
+                "category": category,
+                "amount": round(5 + (i * 37 % 400) + 0.99, 2),
+                "foreign_transaction": i % 10 == 0,
+            },
+            headers=env.auth_header(i)
+        )
+        return response.status_code == 200
+
+    async def predict_category(i: int) -> bool:
+        description, _ = descriptions[i % len(descriptions)]
+        response = await client.get(
+            "/predict-category",
+            params={"description": description},
+            headers=env.auth_header(i)
+        )
+        return response.status_code == 200
+
+    async def wallet(i: int) -> bool:
+        # Only even users have wallets
+        user = (i * 2) % len(env.user_ids)
+        response = await client.get(f"/wallet/{env.user_ids[user]}", headers=env.auth_header(user))
+        return response.status_code == 200
+
+    async def mixed(i: int) -> bool:
+        # Roughly what the mobile client sends: mostly scoring, occasional logins
+        bucket = i % 20
+        if bucket == 0:
+            return await token(i)
+        if bucket < 4:
+            return await predict_category(i)
+        return await optimize(i)
+
+    return {
+        "api.token": token,
+        "api.optimize": optimize,
+        "api.predict_category": predict_category,
+        "api.wallet": wallet,
+        "api.mixed": mixed,
+    }
+
+
+async def run_api_benchmarks(
+    report: BenchmarkReport,
+    requests: int = 500,
+    concurrency: int = 32,
+    users: int = 50,
+    db_latency_ms: float = 0.0,
+    token_requests: int = 0
+):
+    """Run every API workload and add its stats to ``report``"""
+    env = BenchEnvironment(users=users, db_latency_ms=db_latency_ms)
+    await env.setup()
+    try:
+        async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+            for name, workload in _workloads(env, client).items():
+                # bcrypt dominates /token, so it gets its own (smaller) budget
+                total = (token_requests or max(1, requests // 10)) if name == "api.token" else requests
+                await workload(0)  # warm up the route
+                report.add(name, await run_load(workload, total, concurrency))
+    finally:
+        await env.teardown()
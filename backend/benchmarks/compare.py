@@ -0,0 +1,64 @@
+"""
+Compare two benchmark reports and flag latency regressions.
+
+    python -m benchmarks.compare baseline.json candidate.json --threshold 0.10
+"""
+import argparse
+import json
+import sys
+from typing import Dict, List, Tuple
+
+METRICS = (
+    "p50_ms", "p95_ms", "p99_ms", "throughput_rps",
+    "train_s", "peak_rss_mb", "artifact_bytes", "bytes_per_user",
+    "batch_1k_ms", "parameter_bytes", "accuracy",
+)
+HIGHER_IS_BETTER = ("throughput_rps", "accuracy")
+
+
+def compare(baseline: Dict, candidate: Dict, threshold: float = 0.10) -> Tuple[List[str], List[str]]:
+    """Return (report lines, regressions) for benchmarks present in both runs"""
+    lines = [f"{'benchmark':<44}{'metric':<16}{'baseline':>12}{'candidate':>12}{'change':>10}"]
+    regressions = []
+    base_results = baseline.get("results", {})
+    for name, stats in candidate.get("results", {}).items():
+        if name not in base_results:
+            continue
+        for metric in METRICS:
+            old, new = base_results[name].get(metric), stats.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            # Lower is better for latency and size, higher for throughput and accuracy
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            flag = ""
+            if worse > threshold:
+                flag = "  REGRESSION"
+                regressions.append(f"{name} {metric}: {old:.3f} -> {new:.3f} ({change:+.1%})")
+            lines.append(f"{name:<44}{metric:<16}{old:>12.3f}{new:>12.3f}{change:>+10.1%}{flag}")
+    return lines, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark JSON reports")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed relative slowdown (default 10%%)")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    lines, regressions = compare(baseline, candidate, args.threshold)
+    print("\n".join(lines))
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
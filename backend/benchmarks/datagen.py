@@ -0,0 +1,243 @@
+"""
+Deterministic synthetic data for capacity planning.
+
+Transactions are generated column-wise with NumPy in fixed-size chunks, so
+millions of rows can be produced (or streamed into Mongo) in bounded memory.
+The same seed always yields the same data.
+"""
+import json
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from bson import ObjectId
+
+from app.models import Card, Category, RewardType
+
+MERCHANTS: Dict[Category, List[str]] = {
+    Category.DINING: [
+        "UBER EATS", "DOORDASH", "GRUBHUB", "CHIPOTLE", "STARBUCKS", "MCDONALDS",
+        "OLIVE GARDEN", "PANERA BREAD", "SWEETGREEN", "SHAKE SHACK", "DOMINOS PIZZA", "TST* LOCAL BISTRO",
+    ],
+    Category.TRAVEL: [
+        "DELTA AIR LINES", "UNITED AIRLINES", "AMERICAN AIRLINES", "SOUTHWEST AIR", "MARRIOTT HOTELS",
+        "HILTON HOTELS", "AIRBNB", "EXPEDIA", "UBER TRIP", "LYFT RIDE", "HERTZ RENTAL", "AMTRAK",
+    ],
+    Category.GROCERIES: [
+        "WHOLE FOODS MARKET", "TRADER JOES", "SAFEWAY", "KROGER", "WALMART GROCERY", "ALDI",
+        "PUBLIX", "WEGMANS", "INSTACART", "COSTCO WHOLESALE", "H-E-B", "SPROUTS FARMERS MKT",
+    ],
+    Category.GAS: [
+        "SHELL OIL", "EXXONMOBIL", "CHEVRON", "BP", "COSTCO GAS", "SUNOCO",
+        "MARATHON PETRO", "CIRCLE K FUEL", "WAWA FUEL", "SPEEDWAY", "VALERO", "76 GAS",
+    ],
+    Category.ENTERTAINMENT: [
+        "NETFLIX.COM", "SPOTIFY", "AMC THEATRES", "TICKETMASTER", "STEAM GAMES", "HULU",
+        "DISNEY PLUS", "REGAL CINEMAS", "STUBHUB", "PLAYSTATION NETWORK", "APPLE TV", "LIVE NATION",
+    ],
+    Category.ONLINE_SHOPPING: [
+        "AMAZON.COM", "AMZN MKTP US", "EBAY", "ETSY", "BESTBUY.COM", "TARGET.COM",
+        "WAYFAIR", "CHEWY.COM", "SHEIN", "APPLE.COM/BILL", "NEWEGG", "ZAPPOS",
+    ],
+    Category.OTHER: [
+        "CITY UTILITIES", "DMV FEES", "USPS", "DENTAL OFFICE", "HOME DEPOT", "CVS PHARMACY",
+        "VERIZON WIRELESS", "COMCAST", "STATE FARM INS", "PLANET FITNESS", "GREAT CLIPS", "VENMO PAYMENT",
+    ],
+}
+
+CITIES = [
+    "NEW YORK NY", "SAN FRANCISCO CA", "AUSTIN TX", "CHICAGO IL", "SEATTLE WA",
+    "BOSTON MA", "DENVER CO", "MIAMI FL", "ATLANTA GA", "LOS ANGELES CA",
+]
+FOREIGN_CITIES = ["LONDON GB", "PARIS FR", "TOKYO JP", "TORONTO CA", "MEXICO CITY MX"]
+
+CATEGORIES = list(Category)
+EPOCH = datetime(1970, 1, 1)
+
+# Share of transactions per category, in CATEGORIES order
+CATEGORY_WEIGHTS = np.array([0.22, 0.07, 0.18, 0.10, 0.08, 0.17, 0.18])
+
+# Log-normal (mu, sigma) of the amount in dollars, per category
+AMOUNT_PARAMS = {
+    Category.DINING: (3.1, 0.6),
+    Category.TRAVEL: (5.2, 0.9),
+    Category.GROCERIES: (4.0, 0.7),
+    Category.GAS: (3.7, 0.4),
+    Category.ENTERTAINMENT: (3.0, 0.8),
+    Category.ONLINE_SHOPPING: (3.6, 0.9),
+    Category.OTHER: (3.8, 1.0),
+}
+
+# Probability that a purchase is made abroad, per category
+FOREIGN_RATES = {Category.TRAVEL: 0.15}
+DEFAULT_FOREIGN_RATE = 0.02
+
+
+def user_ids(n_users: int, seed: int = 0) -> List[ObjectId]:
+    """Stable ObjectIds for ``n_users`` synthetic users"""
+    rng = np.random.default_rng(seed + 1)
+    return [ObjectId(bytes(rng.integers(0, 256, 12, dtype=np.uint8))) for _ in range(n_users)]
+
+
+def _user_weights(n_users: int, skew: float) -> np.ndarray:
+    # Zipf-like: a few heavy spenders, a long tail of occasional users
+    weights = 1.0 / np.arange(1, n_users + 1) ** skew
+    return weights / weights.sum()
+
+
+def _descriptions(
+    rng: np.random.Generator,
+    cat_idx: np.ndarray,
+    foreign: np.ndarray
+) -> Tuple[List[str], List[str], List[str]]:
+    """Merchant-style descriptions plus the merchant and location columns"""
+    size = len(cat_idx)
+    merchant_idx = rng.integers(0, 12, size)
+    city_idx = rng.integers(0, len(CITIES), size)
+    foreign_city_idx = rng.integers(0, len(FOREIGN_CITIES), size)
+    styles = rng.integers(0, 4, size)
+    numbers = rng.integers(100, 99999, size)
+
+    descriptions, merchants, locations = [], [], []
+    for i in range(size):
+        names = MERCHANTS[CATEGORIES[cat_idx[i]]]
+        merchant = names[merchant_idx[i] % len(names)]
+        location = FOREIGN_CITIES[foreign_city_idx[i]] if foreign[i] else CITIES[city_idx[i]]
+        style = styles[i]
+        if style == 0:
+            description = f"{merchant} #{numbers[i]} {location}"
+        elif style == 1:
+            description = f"POS PURCHASE {merchant} {location}"
+        elif style == 2:
+            description = f"SQ *{merchant} {numbers[i] % 9000 + 1000}"
+        else:
+            description = merchant
+        descriptions.append(description)
+        merchants.append(merchant)
+        locations.append(location)
+    return descriptions, merchants, locations
+
+
+def generate_transaction_chunks(
+    n_rows: int,
+    n_users: int = 1000,
+    seed: int = 0,
+    chunk_size: int = 100_000,
+    user_skew: float = 1.1,
+    start: Optional[datetime] = None,
+    days: int = 365
+) -> Iterator[List[Dict]]:
+    """
+    Yield lists of ``TransactionDB``-shaped documents, ``chunk_size`` at a time.
+
+    Documents match ``TransactionDB(...).dict(by_alias=True)`` but are built
+    directly, since validating millions of models would dominate run time.
+    """
+    rng = np.random.default_rng(seed)
+    users = user_ids(n_users, seed)
+    user_p = _user_weights(n_users, user_skew)
+    start = start or datetime(2024, 1, 1)
+    foreign_rates = np.array([FOREIGN_RATES.get(c, DEFAULT_FOREIGN_RATE) for c in CATEGORIES])
+    mus = np.array([AMOUNT_PARAMS[c][0] for c in CATEGORIES])
+    sigmas = np.array([AMOUNT_PARAMS[c][1] for c in CATEGORIES])
+
+    produced = 0
+    while produced < n_rows:
+        size = min(chunk_size, n_rows - produced)
+        cat_idx = rng.choice(len(CATEGORIES), size=size, p=CATEGORY_WEIGHTS)
+        user_idx = rng.choice(n_users, size=size, p=user_p)
+        amounts = np.round(rng.lognormal(mus[cat_idx], sigmas[cat_idx]), 2).clip(0.5, 20_000)
+        foreign = rng.random(size) < foreign_rates[cat_idx]
+        offsets = rng.integers(0, days * 86_400, size)
+        descriptions, merchants, locations = _descriptions(rng, cat_idx, foreign)
+
+        chunk = []
+        for i in range(size):
+            created = start + timedelta(seconds=int(offsets[i]))
+            chunk.append({
+                # Timestamp + seed + row number keeps ids unique and reproducible
+                "_id": ObjectId(
+                    int((created - EPOCH).total_seconds()).to_bytes(4, "big")
+                    + (seed % 2**32).to_bytes(4, "big")
+                    + (produced + i).to_bytes(4, "big")
+                ),
+                "created_at": created,
+                "updated_at": created,
+                "user_id": users[user_idx[i]],
+                "description": descriptions[i],
+                "amount": float(amounts[i]),
+                "category": CATEGORIES[cat_idx[i]].value,
+                "card_id": None,
+                "reward_value": None,
+                "is_foreign": bool(foreign[i]),
+                "merchant": merchants[i],
+                "location": locations[i],
+            })
+        produced += size
+        yield chunk
+
+
+def generate_training_data(n_rows: int, seed: int = 0) -> Tuple[List[str], List[str]]:
+    """Just the (descriptions, categories) columns that training consumes"""
+    rng = np.random.default_rng(seed)
+    cat_idx = rng.choice(len(CATEGORIES), size=n_rows, p=CATEGORY_WEIGHTS)
+    foreign = rng.random(n_rows) < DEFAULT_FOREIGN_RATE
+    descriptions, _, _ = _descriptions(rng, cat_idx, foreign)
+    return descriptions, [CATEGORIES[c].value for c in cat_idx]
+
+
+def generate_cards(n_cards: int, seed: int = 0) -> List[Card]:
+    """A catalog of ``n_cards`` cards with random per-category rates and fees"""
+    rng = np.random.default_rng(seed)
+    reward_types = list(RewardType)
+    cards = []
+    for i in range(n_cards):
+        rewards = {
+            c: float(np.round(rng.uniform(0.5, 5.0), 1))
+            for c in CATEGORIES
+            if c != Category.OTHER and rng.random() < 0.4
+        }
+        rewards[Category.OTHER] = float(np.round(rng.uniform(1.0, 2.0), 1))
+        cards.append(Card(
+            id=f"synthetic-{i}",
+            name=f"Synthetic Card {i}",
+            issuer=f"Bench Bank {i % 10}",
+            rewards=rewards,
+            reward_type=reward_types[rng.integers(len(reward_types))],
+            annual_fee=float(rng.choice([0.0, 95.0, 250.0, 550.0])),
+            foreign_transaction_fee=float(rng.choice([0.0, 3.0]))
+        ))
+    return cards
+
+
+async def seed_transactions(db, n_rows: int, n_users: int = 1000, seed: int = 0, chunk_size: int = 10_000) -> int:
+    """Insert synthetic transactions into ``db.transactions`` chunk by chunk"""
+    inserted = 0
+    for chunk in generate_transaction_chunks(n_rows, n_users=n_users, seed=seed, chunk_size=chunk_size):
+        await db.transactions.insert_many(chunk, ordered=False)
+        inserted += len(chunk)
+    return inserted
+
+
+def write_jsonl(path: str, n_rows: int, n_users: int = 1000, seed: int = 0) -> int:
+    """Dump synthetic transactions as JSON lines (ObjectIds and dates as strings)"""
+    written = 0
+    with open(path, "w") as f:
+        for chunk in generate_transaction_chunks(n_rows, n_users=n_users, seed=seed):
+            for doc in chunk:
+                f.write(json.dumps(doc, default=str))
+                f.write("\n")
+            written += len(chunk)
+    return written
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Write synthetic transactions as JSON lines")
+    parser.add_argument("output")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(f"Wrote {write_jsonl(args.output, args.rows, args.users, args.seed)} rows to {args.output}")
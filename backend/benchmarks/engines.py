@@ -0,0 +1,84 @@
+"""
+Side-by-side comparison of CategoryPredictor engines.
+
+Every engine trains on the same synthetic data. Each is then measured for
+holdout accuracy, batched latency per 1k descriptions, single-call latency,
+and memory (in-memory parameters and the saved artifact).
+"""
+import itertools
+import os
+import tempfile
+import time
+from typing import Dict, List, Sequence, Tuple
+
+from app.ml_models import CategoryPredictor
+
+from .datagen import generate_training_data
+from .harness import BenchmarkReport, run_micro
+
+# (label, engine, engine options)
+DEFAULT_ENGINES: Sequence[Tuple[str, str, Dict]] = (
+    ("tfidf_nb", "tfidf_nb", {}),
+    ("hashing", "hashing", {}),
+    ("hashing_int8", "hashing", {"quantize": True}),
+)
+
+
+def measure_engine(
+    engine: str,
+    options: Dict,
+    train: Tuple[List[str], List[str]],
+    test: Tuple[List[str], List[str]],
+    iterations: int = 1000
+) -> Dict[str, float]:
+    predictor = CategoryPredictor(engine, **options)
+    start = time.perf_counter()
+    predictor.train(*train)
+    train_s = time.perf_counter() - start
+
+    descriptions, labels = test
+    predicted = predictor.predict_batch(descriptions)
+    accuracy = sum(p.value == label for p, label in zip(predicted, labels)) / len(labels)
+
+    batch = descriptions[:1000]
+    batch_stats = run_micro(lambda: predictor.predict_batch(batch), iterations=max(5, iterations // 100), warmup=2)
+
+    samples = itertools.cycle(descriptions)
+    stats = run_micro(lambda: predictor.predict(next(samples)), iterations)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "category_predictor.joblib")
+        predictor.save(path)
+        artifact_bytes = os.path.getsize(path)
+        start = time.perf_counter()
+        CategoryPredictor().load(path)
+        load_s = time.perf_counter() - start
+
+    stats.update({
+        "accuracy": round(accuracy, 4),
+        "train_s": round(train_s, 3),
+        "batch_1k_ms": round(batch_stats["p50_ms"] * 1000 / len(batch), 3),
+        "parameter_bytes": predictor.engine.nbytes(),
+        "artifact_bytes": artifact_bytes,
+        "load_s": round(load_s, 4),
+    })
+    return stats
+
+
+def run_engine_benchmarks(
+    report: BenchmarkReport,
+    rows: int = 20_000,
+    iterations: int = 1000,
+    engines: Sequence[Tuple[str, str, Dict]] = DEFAULT_ENGINES
+):
+    """Train and measure every engine on the same data"""
+    train = generate_training_data(rows, seed=1)
+    test = generate_training_data(max(1000, rows // 10), seed=2)
+    for label, engine, options in engines:
+        stats = measure_engine(engine, options, train, test, iterations)
+        report.add(f"engines.{label}", stats)
+        print(
+            f"{label:<14} acc {stats['accuracy']:.4f}  {stats['batch_1k_ms']:.2f} ms/1k batched  "
+            f"{stats['p50_ms']:.3f} ms single  {stats['parameter_bytes'] / 1024:.0f} KiB",
+            flush=True
+        )
@@ -0,0 +1,464 @@
+"""
+In-process stand-ins for the Motor client used by the API.
+
+Only the subset of the Motor/PyMongo surface the app relies on is
+implemented. Every operation is a coroutine (like Motor) and can optionally
+sleep for a fixed ``latency`` to approximate a network round trip.
+"""
+import asyncio
+import copy
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import ASCENDING, UpdateOne, UpdateMany, InsertOne, DeleteOne, DeleteMany
+from pymongo.errors import DuplicateKeyError
+from pymongo.results import (
+    BulkWriteResult,
+    DeleteResult,
+    InsertManyResult,
+    InsertOneResult,
+    UpdateResult,
+)
+
+_MISSING = object()
+
+
+def _get_field(doc: Dict, key: str) -> Any:
+    """Resolve a (possibly dotted) key against a document"""
+    value: Any = doc
+    for part in key.split("."):
+        if isinstance(value, dict) and part in value:
+            value = value[part]
+        else:
+            return _MISSING
+    return value
+
+
+def _set_field(doc: Dict, key: str, value: Any):
+    parts = key.split(".")
+    for part in parts[:-1]:
+        doc = doc.setdefault(part, {})
+    doc[parts[-1]] = value
+
+
+def _unset_field(doc: Dict, key: str):
+    parts = key.split(".")
+    for part in parts[:-1]:
+        doc = doc.get(part, {})
+    doc.pop(parts[-1], None)
+
+
+def _values_equal(actual: Any, expected: Any) -> bool:
+    if isinstance(actual, list) and not isinstance(expected, list):
+        return expected in actual
+    return actual == expected
+
+
+def _match_operator(actual: Any, op: str, expected: Any) -> bool:
+    if op == "$exists":
+        return (actual is not _MISSING) == bool(expected)
+    if op == "$ne":
+        return actual is _MISSING or not _values_equal(actual, expected)
+    if op == "$nin":
+        return actual is _MISSING or not any(_values_equal(actual, e) for e in expected)
+    if actual is _MISSING:
+        # Like Mongo, null matches a missing field
+        if op == "$eq":
+            return expected is None
+        if op == "$in":
+            return None in expected
+        return False
+    if op == "$eq":
+        return _values_equal(actual, expected)
+    if op == "$in":
+        return any(_values_equal(actual, e) for e in expected)
+    if op == "$regex":
+        return isinstance(actual, str) and re.search(expected, actual) is not None
+    try:
+        if op == "$gt":
+            return actual > expected
+        if op == "$gte":
+            return actual >= expected
+        if op == "$lt":
+            return actual < expected
+        if op == "$lte":
+            return actual <= expected
+    except TypeError:
+        return False
+    raise NotImplementedError(f"Unsupported query operator: {op}")
+
+
+def matches(doc: Dict, query: Optional[Dict]) -> bool:
+    """Evaluate a Mongo-style query document against ``doc``"""
+    for key, expected in (query or {}).items():
+        if key == "$and":
+            if not all(matches(doc, q) for q in expected):
+                return False
+            continue
+        if key == "$or":
+            if not any(matches(doc, q) for q in expected):
+                return False
+            continue
+
+        actual = _get_field(doc, key)
+        if isinstance(expected, dict) and expected and all(k.startswith("$") for k in expected):
+            if not all(_match_operator(actual, op, v) for op, v in expected.items()):
+                return False
+        elif actual is _MISSING:
+            if expected is not None:
+                return False
+        elif not _values_equal(actual, expected):
+            return False
+    return True
+
+
+def _apply_update(doc: Dict, update: Dict, inserting: bool = False):
+    for op, fields in update.items():
+        if op == "$setOnInsert":
+            if inserting:
+                for key, value in fields.items():
+                    _set_field(doc, key, copy.deepcopy(value))
+        elif op == "$set":
+            for key, value in fields.items():
+                _set_field(doc, key, copy.deepcopy(value))
+        elif op == "$unset":
+            for key in fields:
+                _unset_field(doc, key)
+        elif op == "$inc":
+            for key, value in fields.items():
+                current = _get_field(doc, key)
+                _set_field(doc, key, (0 if current is _MISSING else current) + value)
+        elif op == "$push":
+            for key, value in fields.items():
+                current = _get_field(doc, key)
+                items = [] if current is _MISSING else list(current)
+                if isinstance(value, dict) and "$each" in value:
+                    items.extend(copy.deepcopy(value["$each"]))
+                else:
+                    items.append(copy.deepcopy(value))
+                _set_field(doc, key, items)
+        elif op == "$addToSet":
+            for key, value in fields.items():
+                current = _get_field(doc, key)
+                items = [] if current is _MISSING else list(current)
+                values = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                for item in values:
+                    if item not in items:
+                        items.append(copy.deepcopy(item))
+                _set_field(doc, key, items)
+        elif op == "$pull":
+            for key, value in fields.items():
+                current = _get_field(doc, key)
+                if current is not _MISSING:
+                    _set_field(doc, key, [item for item in current if item != value])
+        else:
+            raise NotImplementedError(f"Unsupported update operator: {op}")
+
+
+def _project(doc: Dict, projection: Optional[Dict]) -> Dict:
+    if not projection:
+        return copy.deepcopy(doc)
+    included = [k for k, v in projection.items() if v and k != "_id"]
+    if included:
+        result = {k: copy.deepcopy(doc[k]) for k in included if k in doc}
+        if projection.get("_id", 1) and "_id" in doc:
+            result["_id"] = doc["_id"]
+        return result
+    return {k: copy.deepcopy(v) for k, v in doc.items() if projection.get(k, 1)}
+
+
+def _normalize_keys(keys) -> List[Tuple[str, Any]]:
+    if isinstance(keys, str):
+        return [(keys, ASCENDING)]
+    return [(k, d) for k, d in keys]
+
+
+class InMemoryCursor:
+    """Async cursor supporting the chaining used with Motor cursors"""
+
+    def __init__(self, collection: "InMemoryCollection", query: Optional[Dict], projection: Optional[Dict]):
+        self._collection = collection
+        self._query = query
+        self._projection = projection
+        self._sort: List[Tuple[str, int]] = []
+        self._skip = 0
+        self._limit = 0
+        self._batch: Optional[List[Dict]] = None
+
+    def sort(self, key_or_list, direction: int = ASCENDING) -> "InMemoryCursor":
+        if isinstance(key_or_list, str):
+            self._sort = [(key_or_list, direction)]
+        else:
+            self._sort = list(key_or_list)
+        return self
+
+    def skip(self, count: int) -> "InMemoryCursor":
+        self._skip = count
+        return self
+
+    def limit(self, count: int) -> "InMemoryCursor":
+        self._limit = count
+        return self
+
+    def batch_size(self, size: int) -> "InMemoryCursor":
+        return self
+
+    def _materialize(self) -> List[Dict]:
+        docs = [d for d in self._collection._docs.values() if matches(d, self._query)]
+        for key, direction in reversed(self._sort):
+            docs.sort(
+                key=lambda d: (_get_field(d, key) is _MISSING, _get_field(d, key)),
+                reverse=direction < 0,
+            )
+        docs = docs[self._skip:]
+        if self._limit:
+            docs = docs[:self._limit]
+        return [_project(d, self._projection) for d in docs]
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict]:
+        await self._collection._database._round_trip()
+        docs = self._materialize()
+        return docs if length is None else docs[:length]
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Dict:
+        if self._batch is None:
+            await self._collection._database._round_trip()
+            self._batch = self._materialize()
+        if not self._batch:
+            raise StopAsyncIteration
+        return self._batch.pop(0)
+
+
+class InMemoryCollection:
+    """Dict-backed collection with the Motor coroutine interface"""
+
+    def __init__(self, database: "InMemoryDatabase", name: str):
+        self._database = database
+        self.name = name
+        self._docs: Dict[Any, Dict] = {}
+        self._indexes: Dict[str, Dict[str, Any]] = {"_id_": {"key": [("_id", ASCENDING)]}}
+
+    # Indexes
+
+    async def create_index(self, keys, unique: bool = False, name: Optional[str] = None, **kwargs) -> str:
+        await self._database._round_trip()
+        key = _normalize_keys(keys)
+        name = name or "_".join(f"{k}_{d}" for k, d in key)
+        spec: Dict[str, Any] = {"key": key}
+        if unique:
+            spec["unique"] = True
+        spec.update(kwargs)
+        self._indexes[name] = spec
+        return name
+
+    async def index_information(self) -> Dict[str, Dict[str, Any]]:
+        await self._database._round_trip()
+        return copy.deepcopy(self._indexes)
+
+    async def drop_index(self, name: str):
+        await self._database._round_trip()
+        self._indexes.pop(name, None)
+
+    def _check_unique(self, doc: Dict, ignore_id: Any = _MISSING):
+        for name, spec in self._indexes.items():
+            if not spec.get("unique") or name == "_id_":
+                continue
+            fields = [k for k, _ in spec["key"]]
+            values = [_get_field(doc, f) for f in fields]
+            for other_id, other in self._docs.items():
+                if other_id == ignore_id:
+                    continue
+                if [_get_field(other, f) for f in fields] == values:
+                    raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: {name}")
+
+    # Writes
+
+    def _insert(self, document: Dict) -> Any:
+        doc = copy.deepcopy(document)
+        doc.setdefault("_id", ObjectId())
+        if doc["_id"] in self._docs:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: _id_")
+        self._check_unique(doc)
+        self._docs[doc["_id"]] = doc
+        document.setdefault("_id", doc["_id"])
+        return doc["_id"]
+
+    async def insert_one(self, document: Dict) -> InsertOneResult:
+        await self._database._round_trip()
+        return InsertOneResult(self._insert(document), True)
+
+    async def insert_many(self, documents: List[Dict], ordered: bool = True) -> InsertManyResult:
+        await self._database._round_trip()
+        return InsertManyResult([self._insert(d) for d in documents], True)
+
+    def _update(self, query: Dict, update: Dict, upsert: bool, multi: bool) -> Dict[str, Any]:
+        matched = modified = 0
+        for doc_id, doc in list(self._docs.items()):
+            if not matches(doc, query):
+                continue
+            matched += 1
+            updated = copy.deepcopy(doc)
+            _apply_update(updated, update)
+            if updated != doc:
+                self._check_unique(updated, ignore_id=doc_id)
+                self._docs[doc_id] = updated
+                modified += 1
+            if not multi:
+                break
+
+        raw: Dict[str, Any] = {"n": matched, "nModified": modified}
+        if not matched and upsert:
+            doc = {
+                k: copy.deepcopy(v)
+                for k, v in query.items()
+                if not k.startswith("$") and not (isinstance(v, dict) and any(x.startswith("$") for x in v))
+            }
+            _apply_update(doc, update, inserting=True)
+            raw["upserted"] = self._insert(doc)
+            raw["n"] = 1
+        return raw
+
+    async def update_one(self, filter: Dict, update: Dict, upsert: bool = False) -> UpdateResult:
+        await self._database._round_trip()
+        return UpdateResult(self._update(filter, update, upsert, multi=False), True)
+
+    async def update_many(self, filter: Dict, update: Dict, upsert: bool = False) -> UpdateResult:
+        await self._database._round_trip()
+        return UpdateResult(self._update(filter, update, upsert, multi=True), True)
+
+    async def replace_one(self, filter: Dict, replacement: Dict, upsert: bool = False) -> UpdateResult:
+        await self._database._round_trip()
+        for doc_id, doc in self._docs.items():
+            if matches(doc, filter):
+                new_doc = copy.deepcopy(replacement)
+                new_doc["_id"] = doc_id
+                self._check_unique(new_doc, ignore_id=doc_id)
+                self._docs[doc_id] = new_doc
+                return UpdateResult({"n": 1, "nModified": int(new_doc != doc)}, True)
+        if upsert:
+            return UpdateResult({"n": 1, "nModified": 0, "upserted": self._insert(replacement)}, True)
+        return UpdateResult({"n": 0, "nModified": 0}, True)
+
+    def _delete(self, query: Dict, multi: bool) -> int:
+        deleted = 0
+        for doc_id, doc in list(self._docs.items()):
+            if matches(doc, query):
+                del self._docs[doc_id]
+                deleted += 1
+                if not multi:
+                    break
+        return deleted
+
+    async def delete_one(self, filter: Dict) -> DeleteResult:
+        await self._database._round_trip()
+        return DeleteResult({"n": self._delete(filter, multi=False)}, True)
+
+    async def delete_many(self, filter: Dict) -> DeleteResult:
+        await self._database._round_trip()
+        return DeleteResult({"n": self._delete(filter, multi=True)}, True)
+
+    async def bulk_write(self, requests: List[Any], ordered: bool = True) -> BulkWriteResult:
+        await self._database._round_trip()
+        result = {"nInserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0, "nUpserted": 0, "upserted": []}
+        for index, request in enumerate(requests):
+            doc = request._doc if hasattr(request, "_doc") else None
+            if isinstance(request, InsertOne):
+                self._insert(doc)
+                result["nInserted"] += 1
+            elif isinstance(request, (UpdateOne, UpdateMany)):
+                raw = self._update(request._filter, request._doc, bool(request._upsert), isinstance(request, UpdateMany))
+                if "upserted" in raw:
+                    result["nUpserted"] += 1
+                    result["upserted"].append({"index": index, "_id": raw["upserted"]})
+                else:
+                    result["nMatched"] += raw["n"]
+                    result["nModified"] += raw["nModified"]
+            elif isinstance(request, (DeleteOne, DeleteMany)):
+                result["nRemoved"] += self._delete(request._filter, isinstance(request, DeleteMany))
+            else:
+                raise NotImplementedError(f"Unsupported bulk operation: {type(request).__name__}")
+        return BulkWriteResult(result, True)
+
+    # Reads
+
+    def find(self, filter: Optional[Dict] = None, projection: Optional[Dict] = None) -> InMemoryCursor:
+        return InMemoryCursor(self, filter, projection)
+
+    async def find_one(self, filter: Optional[Dict] = None, projection: Optional[Dict] = None) -> Optional[Dict]:
+        await self._database._round_trip()
+        for doc in self._docs.values():
+            if matches(doc, filter):
+                return _project(doc, projection)
+        return None
+
+    async def count_documents(self, filter: Dict) -> int:
+        await self._database._round_trip()
+        return sum(1 for d in self._docs.values() if matches(d, filter))
+
+    async def estimated_document_count(self) -> int:
+        await self._database._round_trip()
+        return len(self._docs)
+
+
+class InMemoryDatabase:
+    """Stand-in for ``AsyncIOMotorDatabase``"""
+
+    def __init__(self, name: str = "cardmax", latency: float = 0.0, read_preference: Any = None):
+        self.name = name
+        self.latency = latency
+        self.read_preference = read_preference
+        self._collections: Dict[str, InMemoryCollection] = {}
+
+    def with_options(self, read_preference: Any = None, **kwargs) -> "InMemoryDatabase":
+        """A handle on the same collections; there are no secondaries to lag"""
+        view = InMemoryDatabase(self.name, self.latency, read_preference)
+        view._collections = self._collections
+        return view
+
+    async def _round_trip(self):
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        else:
+            # Still yield to the loop so concurrency behaves like real I/O
+            await asyncio.sleep(0)
+
+    def __getitem__(self, name: str) -> InMemoryCollection:
+        if name not in self._collections:
+            self._collections[name] = InMemoryCollection(self, name)
+        return self._collections[name]
+
+    def __getattr__(self, name: str) -> InMemoryCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    async def list_collection_names(self) -> List[str]:
+        await self._round_trip()
+        return list(self._collections)
+
+    async def drop_collection(self, name: str):
+        await self._round_trip()
+        self._collections.pop(name, None)
+
+
+class InMemoryClient:
+    """Stand-in for ``AsyncIOMotorClient``"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self._databases: Dict[str, InMemoryDatabase] = {}
+
+    def __getitem__(self, name: str) -> InMemoryDatabase:
+        if name not in self._databases:
+            self._databases[name] = InMemoryDatabase(name, latency=self.latency)
+        return self._databases[name]
+
+    async def drop_database(self, name: str):
+        self._databases.pop(name, None)
+
+    def close(self):
+        pass
@@ -0,0 +1,133 @@
+"""
+Timing, aggregation and reporting helpers shared by all benchmarks.
+"""
+import asyncio
+import json
+import platform
+import subprocess
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+def percentile(sorted_samples: List[float], q: float) -> float:
+    """Linearly interpolated percentile of pre-sorted samples (q in [0, 100])"""
+    if not sorted_samples:
+        return 0.0
+    if len(sorted_samples) == 1:
+        return float(sorted_samples[0])
+    rank = (len(sorted_samples) - 1) * q / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(sorted_samples) - 1)
+    fraction = rank - lower
+    return float(sorted_samples[lower] + (sorted_samples[upper] - sorted_samples[lower]) * fraction)
+
+
+def summarize(latencies_ms: List[float], wall_time_s: float, errors: int = 0) -> Dict[str, float]:
+    """Reduce raw latencies to the statistics we compare between commits"""
+    samples = sorted(latencies_ms)
+    count = len(samples)
+    return {
+        "requests": count,
+        "errors": errors,
+        "wall_time_s": round(wall_time_s, 4),
+        "throughput_rps": round(count / wall_time_s, 2) if wall_time_s > 0 else 0.0,
+        "mean_ms": round(sum(samples) / count, 4) if count else 0.0,
+        "p50_ms": round(percentile(samples, 50), 4),
+        "p95_ms": round(percentile(samples, 95), 4),
+        "p99_ms": round(percentile(samples, 99), 4),
+        "max_ms": round(samples[-1], 4) if count else 0.0,
+    }
+
+
+async def run_load(
+    request: Callable[[int], Awaitable[bool]],
+    total: int,
+    concurrency: int
+) -> Dict[str, float]:
+    """
+    Issue ``total`` requests with at most ``concurrency`` in flight.
+
+    ``request`` receives the request index and returns whether it succeeded.
+    """
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                ok = await request(i)
+            except Exception:
+                ok = False
+            latencies.append((time.perf_counter() - start) * 1000)
+            if not ok:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, total)))))
+    return summarize(latencies, time.perf_counter() - start, errors)
+
+
+def run_micro(fn: Callable[[], Any], iterations: int, warmup: int = 10) -> Dict[str, float]:
+    """Time ``fn`` call by call after a short warmup"""
+    for _ in range(warmup):
+        fn()
+
+    latencies: List[float] = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter_ns()
+        fn()
+        latencies.append((time.perf_counter_ns() - t0) / 1e6)
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+class BenchmarkReport:
+    """Collects results from a run and persists them as JSON"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self.meta = {
+            "timestamp": datetime.utcnow().isoformat(),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": config or {},
+        }
+        self.results: Dict[str, Dict[str, Any]] = {}
+
+    def add(self, name: str, stats: Dict[str, Any]):
+        self.results[name] = stats
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"meta": self.meta, "results": self.results}
+
+    def write(self, path: str):
+        out = Path(path)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(json.dumps(self.to_dict(), indent=2, sort_keys=True))
+
+    def format_table(self) -> str:
+        header = f"{'benchmark':<44}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}"
+        lines = [header, "-" * len(header)]
+        for name, stats in self.results.items():
+            if "p50_ms" not in stats:
+                continue
+            lines.append(
+                f"{name:<44}{stats['throughput_rps']:>10.1f}{stats['p50_ms']:>10.3f}"
+                f"{stats['p95_ms']:>10.3f}{stats['p99_ms']:>10.3f}{stats['errors']:>8}"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,61 @@
+"""
+Micro-benchmarks for the scoring and ML hot paths.
+"""
+import itertools
+import random
+
+from app.ml_models import CategoryPredictor, PersonalizedRecommender
+from app.models import Category, InputQuery
+from app.rewards import calculate_reward_value, get_best_card, load_card_data
+
+from .datagen import generate_cards, generate_training_data
+from .harness import BenchmarkReport, run_micro
+
+
+def run_micro_benchmarks(report: BenchmarkReport, iterations: int = 2000, catalog_size: int = 50):
+    """Run every micro-benchmark and add its stats to ``report``"""
+    rng = random.Random(0)
+    queries = itertools.cycle([
+        InputQuery(
+            category=rng.choice(list(Category)),
+            amount=round(rng.uniform(1, 500), 2),
+            foreign_transaction=rng.random() < 0.1
+        )
+        for _ in range(256)
+    ])
+    catalog = load_card_data()
+    big_catalog = generate_cards(catalog_size)
+
+    def reward_all_cards():
+        query = next(queries)
+        for card in catalog:
+            calculate_reward_value(card, query)
+
+    report.add("micro.calculate_reward_value", run_micro(reward_all_cards, iterations))
+    report.add(
+        "micro.get_best_card.anonymous",
+        run_micro(lambda: get_best_card(next(queries)), iterations)
+    )
+    report.add(
+        "micro.get_best_card.personalized",
+        run_micro(lambda: get_best_card(next(queries), "bench-user"), iterations)
+    )
+
+    predictor = CategoryPredictor()
+    predictor.train(*generate_training_data(2000, seed=1))
+    descriptions = itertools.cycle(generate_training_data(256, seed=2)[0])
+    report.add(
+        "micro.category_predictor.predict",
+        run_micro(lambda: predictor.predict(next(descriptions)), iterations)
+    )
+
+    recommender = PersonalizedRecommender()
+    users = itertools.cycle([f"user-{i}" for i in range(100)])
+    report.add(
+        f"micro.recommender.scores.{len(catalog)}_cards",
+        run_micro(lambda: recommender.get_personalized_scores(next(users), catalog), iterations)
+    )
+    report.add(
+        f"micro.recommender.scores.{catalog_size}_cards",
+        run_micro(lambda: recommender.get_personalized_scores(next(users), big_catalog), iterations)
+    )
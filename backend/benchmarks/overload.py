@@ -0,0 +1,108 @@
+"""
+Overload benchmark for admission control.
+
+Ramps concurrency on a mixed workload for a fixed duration per step. Clients
+back off briefly after a 503, as they would on Retry-After. Reports, per step, the goodput,
+the latency of admitted requests, how many requests each priority class
+had shed, and where the adaptive limit settled.
+"""
+import asyncio
+import itertools
+import time
+from collections import Counter
+from typing import Dict, List, Sequence
+
+import httpx
+
+from app.admission import CRITICAL, LOW, NORMAL
+from app.main import admission_controller, app
+
+from .api import BenchEnvironment
+from .datagen import generate_training_data
+from .harness import BenchmarkReport, summarize
+
+DEFAULT_STEPS = (8, 32, 128, 512)
+
+
+async def _run_step(
+    env: BenchEnvironment,
+    client: httpx.AsyncClient,
+    concurrency: int,
+    duration: float,
+    backoff: float
+) -> Dict:
+    descriptions = list(zip(*generate_training_data(500, seed=3)))
+    latencies: List[float] = []
+    outcomes: Counter = Counter()
+    counter = itertools.count()
+
+    async def request(i: int):
+        bucket = i % 50
+        if bucket == 0:
+            # Low priority and expensive: bcrypt on the event loop
+            priority = LOW
+            call = client.post("/users", params={"email": f"overload-{concurrency}-{i}@example.com", "password": "pw"})
+        elif bucket < 10:
+            priority = NORMAL
+            call = client.get(
+                "/predict-category",
+                params={"description": descriptions[i % len(descriptions)][0]},
+                headers=env.auth_header(i)
+            )
+        else:
+            priority = CRITICAL
+            description, category = descriptions[i % len(descriptions)]
+            call = client.post(
+                "/optimize",
+                params={"description": description},
+                json={"category": category, "amount": 25.0 + i % 200},
+                headers=env.auth_header(i)
+            )
+        start = time.perf_counter()
+        response = await call
+        elapsed = (time.perf_counter() - start) * 1000
+        if response.status_code == 503:
+            outcomes[f"{priority}_shed"] += 1
+            # Well-behaved clients back off (scaled down from Retry-After)
+            await asyncio.sleep(backoff)
+        elif response.status_code == 200:
+            outcomes[f"{priority}_ok"] += 1
+            latencies.append(elapsed)
+        else:
+            outcomes[f"{priority}_error"] += 1
+
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            await request(next(counter))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    total = sum(outcomes.values())
+    stats = summarize(latencies, time.perf_counter() - start, errors=total - len(latencies))
+    stats.update({f"count_{k}": v for k, v in sorted(outcomes.items())})
+    stats["concurrency"] = concurrency
+    stats["limit"] = round(admission_controller.limit, 1)
+    stats["shed_ratio"] = round(sum(v for k, v in outcomes.items() if k.endswith("_shed")) / max(total, 1), 4)
+    return stats
+
+
+async def run_overload_benchmarks(
+    report: BenchmarkReport,
+    steps: Sequence[int] = DEFAULT_STEPS,
+    duration: float = 5.0,
+    backoff: float = 0.05,
+    users: int = 50,
+    db_latency_ms: float = 0.0
+):
+    """Run each concurrency step with admission control on and record the outcome"""
+    env = BenchEnvironment(users=users, db_latency_ms=db_latency_ms, admission=True)
+    await env.setup()
+    try:
+        async with httpx.AsyncClient(app=app, base_url="http://bench", timeout=60) as client:
+            for concurrency in steps:
+                stats = await _run_step(env, client, concurrency, duration, backoff)
+                report.add(f"overload.{concurrency}_clients", stats)
+    finally:
+        await env.teardown()
@@ -0,0 +1,119 @@
+"""
+Scale benchmarks: how training and the recommender grow with data volume.
+
+Each size runs in a fresh (spawned) process so peak RSS is attributable to
+that size alone rather than to everything the parent has allocated so far.
+"""
+import itertools
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Sequence
+
+from app.ml_models import CategoryPredictor, PersonalizedRecommender
+
+from .datagen import generate_cards, generate_training_data, user_ids
+from .harness import BenchmarkReport, run_micro
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000, 10_000_000)
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def measure_training(rows: int, iterations: int = 1000, seed: int = 0) -> Dict[str, float]:
+    """Train, save, reload and query a CategoryPredictor on ``rows`` rows"""
+    start = time.perf_counter()
+    descriptions, categories = generate_training_data(rows, seed=seed)
+    generate_s = time.perf_counter() - start
+
+    predictor = CategoryPredictor()
+    start = time.perf_counter()
+    predictor.train(descriptions, categories)
+    train_s = time.perf_counter() - start
+    del descriptions, categories
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "category_predictor.joblib")
+        predictor.save(path)
+        artifact_bytes = os.path.getsize(path)
+        start = time.perf_counter()
+        CategoryPredictor().load(path)
+        load_s = time.perf_counter() - start
+
+    samples = itertools.cycle(generate_training_data(256, seed=seed + 1)[0])
+    stats = run_micro(lambda: predictor.predict(next(samples)), iterations)
+    stats.update({
+        "rows": rows,
+        "generate_s": round(generate_s, 3),
+        "train_s": round(train_s, 3),
+        "load_s": round(load_s, 4),
+        "artifact_bytes": artifact_bytes,
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    })
+    return stats
+
+
+def measure_recommender(n_users: int, n_cards: int, iterations: int = 1000) -> Dict[str, float]:
+    """Memory and scoring latency of PersonalizedRecommender with ``n_users`` users"""
+    recommender = PersonalizedRecommender()
+    cards = generate_cards(n_cards)
+    users = [str(u) for u in user_ids(n_users)]
+
+    tracemalloc.start()
+    recommender._initialize_embeddings(users[0], cards)
+    for user_id in users[1:]:
+        recommender._initialize_embeddings(user_id, [])
+    embedding_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    cycle = itertools.cycle(users)
+    stats = run_micro(lambda: recommender.get_personalized_scores(next(cycle), cards), iterations)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "recommender.joblib")
+        recommender.save(path)
+        artifact_bytes = os.path.getsize(path)
+
+    stats.update({
+        "users": n_users,
+        "cards": n_cards,
+        "embedding_bytes": embedding_bytes,
+        "bytes_per_user": round(embedding_bytes / n_users, 1),
+        "artifact_bytes": artifact_bytes,
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    })
+    return stats
+
+
+def _isolated(fn, *args) -> Dict[str, float]:
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(fn, *args).result()
+
+
+def run_scale_benchmarks(
+    report: BenchmarkReport,
+    sizes: Sequence[int] = DEFAULT_SIZES,
+    rows_per_user: int = 50,
+    catalog_size: int = 50,
+    iterations: int = 1000
+):
+    """Run training and recommender benchmarks for each size in ``sizes``"""
+    for rows in sizes:
+        stats = _isolated(measure_training, rows, iterations)
+        report.add(f"scale.train.{rows}_rows", stats)
+        print(f"train {rows:>10} rows: {stats['train_s']:.2f}s, {stats['peak_rss_mb']:.0f} MB peak", flush=True)
+
+        n_users = max(1, rows // rows_per_user)
+        stats = _isolated(measure_recommender, n_users, catalog_size, iterations)
+        report.add(f"scale.recommender.{n_users}_users", stats)
+        print(f"recommender {n_users:>7} users: {stats['bytes_per_user']:.0f} B/user", flush=True)
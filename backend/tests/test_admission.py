@@ -0,0 +1,105 @@
+import asyncio
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from app.admission import (
+    CRITICAL,
+    EXEMPT,
+    LOW,
+    NORMAL,
+    AIMDLimit,
+    AdmissionController,
+    AdmissionMiddleware,
+    GradientLimit
+)
+from app.main import admission_controller, app
+
+def test_priority_for_uses_longest_prefix():
+    controller = AdmissionController(AIMDLimit(), {"/transactions": NORMAL, "/transactions/train": LOW, "/metrics": EXEMPT})
+    assert controller.priority_for("/transactions/train") == LOW
+    assert controller.priority_for("/transactions") == NORMAL
+    assert controller.priority_for("/metrics") == EXEMPT
+    assert controller.priority_for("/anything") == NORMAL
+
+def test_low_priority_is_shed_first():
+    controller = AdmissionController(AIMDLimit(initial=10, min_limit=1))
+    for _ in range(5):
+        assert controller.try_acquire(CRITICAL)
+    # Low may only use half of the limit
+    assert not controller.try_acquire(LOW)
+    for _ in range(5):
+        assert controller.try_acquire(CRITICAL)
+    assert not controller.try_acquire(CRITICAL)
+
+    controller.release(CRITICAL, rtt=0.01)
+    assert controller.in_flight == 9
+
+def test_aimd_backs_off_above_target():
+    limit = AIMDLimit(initial=20, latency_target=0.1, backoff=0.5)
+    assert limit.update(0.5, in_flight=20, dropped=False) == 10
+    assert limit.update(0.01, in_flight=10, dropped=False) == 11
+    # Not growing while mostly idle
+    assert limit.update(0.01, in_flight=1, dropped=False) == 11
+
+def test_gradient_shrinks_when_latency_queues():
+    limit = GradientLimit(initial=50, min_limit=4, window=5)
+    for _ in range(5):
+        limit.update(0.010, in_flight=50, dropped=False)
+    grown = limit.limit
+    assert grown > 50
+
+    for _ in range(50):
+        limit.update(0.200, in_flight=50, dropped=False)
+    assert limit.limit < grown
+
+def test_slow_background_routes_do_not_shrink_the_limit():
+    controller = AdmissionController(GradientLimit(initial=50, min_limit=4, window=25))
+    assert not controller.samples("/debug/profile", LOW)
+    assert not controller.samples("/transactions/train", CRITICAL)
+    assert not controller.samples("/users/me", LOW)
+    assert controller.samples("/optimize", CRITICAL)
+
+    for _ in range(20):
+        for path in ["/debug/profile"] + ["/optimize"] * 24:
+            priority = controller.priority_for(path)
+            assert controller.try_acquire(priority)
+            rtt = 5.0 if path == "/debug/profile" else 0.01
+            controller.release(priority, rtt, sample=controller.samples(path, priority))
+    assert controller.limit >= 50
+    assert controller.in_flight == 0
+
+@pytest.mark.asyncio
+async def test_middleware_returns_fast_503_with_retry_after():
+    release = asyncio.Event()
+
+    async def slow_app(scope, receive, send):
+        await release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    controller = AdmissionController(AIMDLimit(initial=1, min_limit=1), retry_after=3)
+    app = AdmissionMiddleware(slow_app, controller)
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        first = asyncio.create_task(client.get("/optimize"))
+        await asyncio.sleep(0.01)
+        rejected = await client.get("/optimize")
+        assert rejected.status_code == 503
+        assert rejected.headers["retry-after"] == "3"
+
+        release.set()
+        assert (await first).status_code == 200
+        assert controller.in_flight == 0
+
+def test_shed_responses_keep_cors_headers(monkeypatch):
+    monkeypatch.setattr(admission_controller, "enabled", True)
+    monkeypatch.setattr(admission_controller, "try_acquire", lambda priority: False)
+    client = TestClient(app)
+    origin = {"Origin": "http://localhost:3000"}
+
+    rejected = client.get("/cards", headers=origin)
+    assert rejected.status_code == 503
+    assert "access-control-allow-origin" in rejected.headers
+    assert "retry-after" in rejected.headers["access-control-expose-headers"].lower()
+
+    preflight = client.options("/cards", headers={**origin, "Access-Control-Request-Method": "GET"})
+    assert preflight.status_code == 200
@@ -0,0 +1,62 @@
+import pytest
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from benchmarks.fakes import InMemoryDatabase, matches
+from benchmarks.harness import percentile, summarize
+from benchmarks.compare import compare
+from benchmarks.datagen import generate_cards, generate_transaction_chunks
+from app.db.models import TransactionDB
+from app.models import Category
+
+def test_query_matching():
+    doc = {"user_id": "u1", "amount": 120.0, "category": "dining", "tags": ["a", "b"]}
+    assert matches(doc, {"user_id": "u1"})
+    assert matches(doc, {"amount": {"$gte": 100, "$lt": 200}})
+    assert matches(doc, {"category": {"$in": ["dining", "travel"]}})
+    assert matches(doc, {"tags": "a"})
+    assert matches(doc, {"$or": [{"category": "gas"}, {"amount": {"$gt": 100}}]})
+    assert not matches(doc, {"user_id": "u2"})
+    assert not matches(doc, {"merchant": {"$exists": True}})
+
+@pytest.mark.asyncio
+async def test_in_memory_collection_roundtrip():
+    db = InMemoryDatabase()
+    await db.users.create_index("email", unique=True)
+    await db.users.insert_one({"email": "a@example.com", "n": 1})
+    with pytest.raises(DuplicateKeyError):
+        await db.users.insert_one({"email": "a@example.com"})
+
+    await db.users.update_one({"email": "a@example.com"}, {"$inc": {"n": 2}})
+    await db.users.update_one({"email": "b@example.com"}, {"$set": {"n": 5}}, upsert=True)
+    result = await db.users.bulk_write([UpdateOne({"email": "b@example.com"}, {"$set": {"n": 6}})])
+    assert result.modified_count == 1
+
+    docs = await db.users.find({"n": {"$gte": 3}}).sort("n", -1).to_list(length=None)
+    assert [d["n"] for d in docs] == [6, 3]
+    assert "email_1" in await db.users.index_information()
+
+def test_summarize_percentiles():
+    samples = [float(i) for i in range(1, 101)]
+    assert percentile(samples, 50) == pytest.approx(50.5)
+    stats = summarize(samples, wall_time_s=2.0, errors=1)
+    assert stats["requests"] == 100
+    assert stats["throughput_rps"] == 50.0
+    assert stats["p99_ms"] == pytest.approx(99.01)
+
+def test_compare_flags_regressions():
+    baseline = {"results": {"api.optimize": {"p50_ms": 10.0, "p95_ms": 20.0, "p99_ms": 30.0, "throughput_rps": 100.0}}}
+    candidate = {"results": {"api.optimize": {"p50_ms": 10.5, "p95_ms": 30.0, "p99_ms": 30.0, "throughput_rps": 80.0}}}
+    _, regressions = compare(baseline, candidate, threshold=0.10)
+    assert len(regressions) == 2
+
+def test_datagen_is_deterministic_and_model_shaped():
+    first = next(generate_transaction_chunks(200, n_users=20, seed=7, chunk_size=100))
+    second = next(generate_transaction_chunks(200, n_users=20, seed=7, chunk_size=100))
+    assert first == second
+    assert len(first) == 100
+    assert len({d["_id"] for d in first}) == 100
+    TransactionDB(**first[0])
+
+    cards = generate_cards(5, seed=1)
+    assert [c.id for c in cards] == [f"synthetic-{i}" for i in range(5)]
+    assert all(Category.OTHER in c.rewards for c in cards)
@@ -0,0 +1,93 @@
+import datetime
+import os
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+from pymongo.read_preferences import Primary, PrimaryPreferred, SecondaryPreferred
+from app.config import Settings
+from app.db.database import Database, client_options, database_for, read_preference
+from app.metrics import MONGO_COMMAND_LATENCY, MongoCommandListener
+from benchmarks.fakes import InMemoryClient
+
+pytestmark = pytest.mark.asyncio
+
+@pytest.fixture
+def database():
+    yield Database
+    Database.client, Database.db, Database.read_preferences = None, None, {}
+
+async def test_client_options_from_settings():
+    settings = Settings(
+        mongo_max_pool_size=7,
+        mongo_wait_queue_timeout_ms=50,
+        mongo_server_selection_timeout_ms=100,
+        mongo_compressors="zlib",
+        mongo_zlib_compression_level=3
+    )
+    client = AsyncIOMotorClient("mongodb://localhost:1/?replicaSet=rs0", **client_options(settings))
+    try:
+        pool = client.options.pool_options
+        assert pool.max_pool_size == 7
+        assert pool.wait_queue_timeout == 0.05
+        assert pool.socket_timeout is None
+        assert client.options.server_selection_timeout == 0.1
+        assert pool._compression_settings.compressors == ["zlib"]
+    finally:
+        client.close()
+    assert "compressors" not in client_options(Settings())
+
+async def test_workloads_get_their_read_preference(database):
+    settings = Settings(mongo_read_preferences={"training": "secondary"}, mongo_max_staleness_seconds=120)
+    await Database.connect_db(InMemoryClient(), settings)
+
+    assert Database.get_db() is Database.db
+    assert Database.get_db("catalog").read_preference == SecondaryPreferred(max_staleness=120)
+    assert Database.get_db("wallet").read_preference == PrimaryPreferred(max_staleness=120)
+    assert Database.get_db("training").read_preference.mongos_mode == "secondary"
+    assert Database.get_db("catalog") is Database.get_db("catalog")
+    # Routed handles share the primary's data
+    await Database.db.cards.insert_one({"name": "Card"})
+    assert await (await database_for("catalog")()).cards.count_documents({}) == 1
+
+    with pytest.raises(ValueError):
+        read_preference("secondaryOnly")
+    assert read_preference("primary") == Primary()
+
+async def test_indexes_are_only_created_once(database):
+    await Database.connect_db(InMemoryClient(), Settings())
+    info = await Database.db.transactions.index_information()
+    assert [("category", 1), ("is_foreign", 1), ("_id", 1)] in [spec["key"] for spec in info.values()]
+    assert await Database.create_indexes() == []
+
+    await Database.db.cards.drop_index("name_1")
+    assert await Database.create_indexes() == ["name_1"]
+
+def _event(cls, command_name, request_id, **kwargs):
+    return cls(datetime.timedelta(milliseconds=3), kwargs, command_name, request_id, ("localhost", 27017), 1)
+
+async def test_command_listener_records_per_collection_latency():
+    listener = MongoCommandListener()
+    before = MONGO_COMMAND_LATENCY.count(collection="cards", command="find", status="ok")
+    errors = MONGO_COMMAND_LATENCY.count(collection="cards", command="getMore", status="error")
+
+    listener.started(monitoring.CommandStartedEvent({"find": "cards", "filter": {}}, "cardmax", 1, ("localhost", 27017), 1))
+    listener.succeeded(_event(monitoring.CommandSucceededEvent, "find", 1, ok=1))
+    listener.started(monitoring.CommandStartedEvent({"getMore": 42, "collection": "cards"}, "cardmax", 2, ("localhost", 27017), 1))
+    listener.failed(_event(monitoring.CommandFailedEvent, "getMore", 2, ok=0))
+
+    assert MONGO_COMMAND_LATENCY.count(collection="cards", command="find", status="ok") == before + 1
+    assert MONGO_COMMAND_LATENCY.count(collection="cards", command="getMore", status="error") == errors + 1
+    assert not listener._pending
+
+@pytest.mark.skipif("MONGODB_TEST_URL" not in os.environ, reason="set MONGODB_TEST_URL to a replica set to run")
+async def test_against_replica_set(database):
+    settings = Settings(mongodb_url=os.environ["MONGODB_TEST_URL"], database_name="cardmax_test", mongo_server_selection_timeout_ms=5000)
+    await Database.connect_db(settings=settings)
+    try:
+        assert await Database.create_indexes() == []
+        before = MONGO_COMMAND_LATENCY.count(collection="cards", command="find", status="ok")
+        await Database.get_db("catalog").cards.find({"is_active": True}).to_list(length=10)
+        assert MONGO_COMMAND_LATENCY.count(collection="cards", command="find", status="ok") == before + 1
+    finally:
+        await Database.client.drop_database("cardmax_test")
+        await Database.close_db()
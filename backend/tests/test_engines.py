@@ -0,0 +1,93 @@
+import joblib
+import numpy as np
+import pytest
+from app.config import Settings
+from app.ml_models import (
+    CategoryPredictor,
+    HashingLinearEngine,
+    TfidfNBEngine,
+    create_category_predictor,
+    hash_ngrams
+)
+from app.models import Category
+from benchmarks.datagen import generate_training_data
+
+@pytest.fixture(scope="module")
+def data():
+    return generate_training_data(3000, seed=1), generate_training_data(500, seed=2)
+
+def test_hash_ngrams_stay_within_each_description():
+    alone = hash_ngrams(["shell gas"], 1024)
+    doc, bucket, value = hash_ngrams(["shell gas", "uber eats"], 1024)
+    assert list(bucket[doc == 0]) == list(alone[1])
+    assert np.allclose(value[doc == 0], alone[2])
+    # Same input, same features, in every process (no salted hash())
+    assert list(hash_ngrams(["shell gas"], 1024)[1]) == list(alone[1])
+
+def test_hashing_engine_predicts_without_vocabulary():
+    predictor = CategoryPredictor("hashing", n_features=2 ** 12)
+    predictor.train(
+        ["UBER EATS DELIVERY", "AMAZON.COM", "SHELL GAS STATION", "WALMART GROCERY"],
+        [Category.DINING, Category.ONLINE_SHOPPING, Category.GAS, Category.GROCERIES]
+    )
+    assert predictor.predict("DOORDASH FOOD DELIVERY") == Category.DINING
+    assert predictor.predict("EXXON GAS") == Category.GAS
+    assert predictor.engine.weights.dtype == np.float32
+    assert predictor.engine.weights.ndim == 1
+
+def test_batch_matches_single_predictions(data):
+    (descriptions, categories), (test, _) = data
+    for engine in ("tfidf_nb", "hashing"):
+        predictor = CategoryPredictor(engine)
+        predictor.train(descriptions, categories)
+        assert predictor.predict_batch(test[:50]) == [predictor.predict(d) for d in test[:50]]
+
+def test_int8_quantization_keeps_accuracy(data):
+    (descriptions, categories), (test, labels) = data
+    full = CategoryPredictor("hashing")
+    full.train(descriptions, categories)
+    quantized = CategoryPredictor("hashing", quantize=True)
+    quantized.train(descriptions, categories)
+
+    assert quantized.engine.weights.dtype == np.int8
+    assert quantized.engine.nbytes() < full.engine.nbytes() / 3
+    agreement = np.mean([a == b for a, b in zip(full.predict_batch(test), quantized.predict_batch(test))])
+    assert agreement > 0.98
+    accuracy = np.mean([p.value == label for p, label in zip(quantized.predict_batch(test), labels)])
+    assert accuracy > 0.9
+
+def test_save_load_restores_engine(tmp_path, data):
+    (descriptions, categories), (test, _) = data
+    predictor = CategoryPredictor("hashing", quantize=True)
+    predictor.train(descriptions, categories)
+    path = str(tmp_path / "model.joblib")
+    predictor.save(path)
+
+    loaded = CategoryPredictor()
+    loaded.load(path)
+    assert isinstance(loaded.engine, HashingLinearEngine)
+    assert loaded.predict_batch(test) == predictor.predict_batch(test)
+
+    # Retraining switches back to the configured engine
+    loaded.train(descriptions, categories)
+    assert isinstance(loaded.engine, TfidfNBEngine)
+
+def test_loads_artifacts_from_before_engines(tmp_path, data):
+    (descriptions, categories), (test, _) = data
+    predictor = CategoryPredictor()
+    predictor.train(descriptions, categories)
+    path = str(tmp_path / "legacy.joblib")
+    joblib.dump({**predictor.engine.get_state(), "is_trained": True}, path)
+
+    loaded = CategoryPredictor("hashing")
+    loaded.load(path)
+    assert loaded.predict_batch(test) == predictor.predict_batch(test)
+
+def test_engine_is_chosen_from_settings():
+    predictor = create_category_predictor(Settings(category_engine="hashing", hashing_n_features=2 ** 10, hashing_quantize=True))
+    assert predictor.engine.n_features == 2 ** 10 and predictor.engine.quantize
+    assert isinstance(create_category_predictor(Settings()).engine, TfidfNBEngine)
+    with pytest.raises(ValueError):
+        CategoryPredictor("bert")
+    with pytest.raises(ValueError):
+        HashingLinearEngine(n_features=1000)
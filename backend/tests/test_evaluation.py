@@ -0,0 +1,110 @@
+import asyncio
+import pytest
+from bson import ObjectId
+from fastapi.testclient import TestClient
+from app.auth import create_access_token
+from app.config import Settings
+from app.db.database import Database
+from app.db.models import UserDB
+from app.evaluation import check_promotion, compare_latency, cross_validate, quality_metrics
+from app.main import app, settings
+from app.ml_models import CategoryPredictor, category_predictor
+from benchmarks.datagen import generate_training_data
+from benchmarks.fakes import InMemoryDatabase
+
+def test_quality_metrics_per_category():
+    predictor = CategoryPredictor()
+    predictor.train(["uber eats", "shell gas", "doordash food", "exxon gas"], ["dining", "gas", "dining", "gas"])
+    metrics = quality_metrics(predictor, ["uber eats", "shell gas", "exxon gas"], ["dining", "gas", "dining"])
+    assert metrics["accuracy"] == pytest.approx(2 / 3)
+    assert set(metrics) == {"accuracy", "macro_f1", "f1_dining", "f1_gas"}
+    assert metrics["macro_f1"] == pytest.approx((metrics["f1_dining"] + metrics["f1_gas"]) / 2)
+
+def test_holdout_and_parallel_kfold():
+    descriptions, labels = generate_training_data(600, seed=3)
+    holdout, held_out = cross_validate(descriptions, labels, "tfidf_nb", test_size=0.25)
+    assert holdout["folds"] == 1 and len(held_out) == 150
+    assert holdout["accuracy"] > 0.7
+
+    kfold, _ = cross_validate(descriptions, labels, "hashing", {"n_features": 2 ** 12}, folds=3, n_jobs=2)
+    assert kfold["folds"] == 3
+    assert kfold["accuracy"] > 0.9
+    assert "f1_groceries" in kfold
+
+    with pytest.raises(ValueError):
+        cross_validate(descriptions[:10], labels[:10], "tfidf_nb", folds=5)
+
+def test_check_promotion_thresholds():
+    settings = Settings(
+        promotion_max_accuracy_drop=0.01,
+        promotion_max_f1_drop=0.02,
+        promotion_max_latency_increase=0.5,
+        promotion_min_latency_increase_ms=0.5
+    )
+    baseline = {"accuracy": 0.95, "macro_f1": 0.94}
+    live = {"predict_p99_ms": 1.0, "batch_p99_ms": 10.0}
+    assert check_promotion({**baseline, **live}, None, settings) == []
+    assert check_promotion({**baseline, "accuracy": 0.945, "predict_p99_ms": 1.4}, baseline, settings, live) == []
+    # A large relative increase of a fraction of a millisecond is noise
+    assert check_promotion({**baseline, "predict_p99_ms": 0.3}, baseline, settings, {"predict_p99_ms": 0.1}) == []
+
+    candidate = {**baseline, "accuracy": 0.9, "batch_p99_ms": 20.0}
+    regressions = check_promotion(candidate, baseline, settings, live)
+    assert len(regressions) == 2
+    assert regressions[0].startswith("accuracy dropped")
+    assert regressions[1].startswith("batch_p99_ms rose")
+    # Stored latency from an earlier run is never the reference
+    assert check_promotion(candidate, {**baseline, **live}, settings) == regressions[:1]
+
+def test_compare_latency_times_both_models_on_the_same_descriptions():
+    descriptions, labels = generate_training_data(200, seed=5)
+    candidate, live = CategoryPredictor("hashing", n_features=2 ** 10), CategoryPredictor()
+    candidate.train(descriptions, labels)
+    live.train(descriptions, labels)
+    candidate_latency, live_latency = compare_latency(candidate, live, descriptions[:20], samples=10, batch_size=10)
+    assert set(candidate_latency) == set(live_latency)
+    assert all(candidate_latency[key] > 0 and live_latency[key] > 0 for key in ("predict_p99_ms", "batch_p99_ms"))
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "model_path", str(tmp_path))
+    monkeypatch.setattr(settings, "evaluation_latency_samples", 20)
+    engine, trained = category_predictor.engine, category_predictor.is_trained
+
+    Database.db = InMemoryDatabase()
+    admin = UserDB(email="admin@example.com", hashed_password="unused", is_superuser=True)
+    descriptions, categories = generate_training_data(300, seed=4)
+    asyncio.run(Database.db.users.insert_one(admin.dict(by_alias=True)))
+    asyncio.run(Database.db.transactions.insert_many([
+        {"_id": ObjectId(), "user_id": admin.id, "description": d, "category": c, "amount": 10.0}
+        for d, c in zip(descriptions, categories)
+    ]))
+    yield TestClient(app)
+    Database.db = None
+    category_predictor.engine, category_predictor.is_trained = engine, trained
+
+def test_train_records_metrics_and_refuses_regressions(client, tmp_path):
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'admin@example.com'})}"}
+    response = client.post("/transactions/train", headers=headers)
+    assert response.status_code == 200
+    metrics = response.json()["performance_metrics"]
+    for key in ("accuracy", "macro_f1", "f1_dining", "train_s", "artifact_bytes", "predict_p99_ms", "batch_p99_ms"):
+        assert key in metrics
+    assert (tmp_path / "category_predictor.joblib").exists()
+    stored = asyncio.run(Database.db.ml_model_metadata.find_one({"model_name": "category_predictor"}))
+    assert stored["performance_metrics"] == metrics
+
+    # Pretend the promoted model was far better; the next candidate must be refused
+    asyncio.run(Database.db.ml_model_metadata.update_one(
+        {"model_name": "category_predictor"}, {"$set": {"performance_metrics.accuracy": 1.5}}
+    ))
+    response = client.post("/transactions/train", headers=headers)
+    assert response.status_code == 409
+    assert response.json()["detail"]["regressions"][0].startswith("accuracy dropped")
+
+    response = client.post("/transactions/train", params={"force": True}, headers=headers)
+    assert response.status_code == 200
+    evaluations = asyncio.run(Database.db.model_evaluations.find().to_list(length=None))
+    assert [e["promoted"] for e in evaluations] == [True, False, True]
+    # Once a model is live, later candidates are timed against it in the same run
+    assert "predict_p99_ms" in evaluations[1]["live_latency"]
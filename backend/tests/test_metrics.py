@@ -0,0 +1,49 @@
+import time
+import pytest
+from app.metrics import Counter, Gauge, Histogram, MetricsRegistry, STAGE_LATENCY, timed
+from app.profiling import SamplingProfiler
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("test_latency_seconds", "Test", labelnames=("stage",), buckets=(0.01, 0.1))
+    histogram.observe(0.005, stage="a")
+    histogram.observe(0.05, stage="a")
+    histogram.observe(5.0, stage="a")
+
+    lines = histogram.render().splitlines()
+    assert '# TYPE test_latency_seconds histogram' in lines
+    assert 'test_latency_seconds_bucket{stage="a",le="0.01"} 1' in lines
+    assert 'test_latency_seconds_bucket{stage="a",le="0.1"} 2' in lines
+    assert 'test_latency_seconds_bucket{stage="a",le="+Inf"} 3' in lines
+    assert 'test_latency_seconds_count{stage="a"} 3' in lines
+    assert histogram.quantile(0.5, stage="a") == 0.1
+
+def test_registry_renders_counters_and_gauges():
+    registry = MetricsRegistry()
+    counter = registry.register(Counter("test_events_total", "Events", labelnames=("event",)))
+    gauge = registry.register(Gauge("test_pool", "Pool", labelnames=("state",)))
+    counter.inc(event="a")
+    counter.inc(2, event="a")
+    gauge.set_function(lambda: {("open",): 4})
+
+    text = registry.render()
+    assert 'test_events_total{event="a"} 3.0' in text
+    assert 'test_pool{state="open"} 4' in text
+
+def test_timed_records_stage_span():
+    before = STAGE_LATENCY.count(stage="test_stage")
+    with timed("test_stage"):
+        pass
+    with pytest.raises(ValueError):
+        with timed("test_stage"):
+            raise ValueError()
+    assert STAGE_LATENCY.count(stage="test_stage") == before + 2
+
+def test_sampling_profiler_collects_stacks():
+    profiler = SamplingProfiler(interval=0.001)
+    profiler.start()
+    deadline = time.perf_counter() + 0.05
+    while time.perf_counter() < deadline:
+        sum(range(100))
+    profiler.stop()
+    assert profiler.samples > 0
+    assert "test_sampling_profiler_collects_stacks" in profiler.collapsed()
@@ -0,0 +1,222 @@
+import asyncio
+import numpy as np
+import pytest
+import fakeredis
+from fakeredis import aioredis as fake_aioredis
+from app.ml_models import PersonalizedRecommender
+from app.personalization import PERSONALIZATION_STORE_OPS, RedisEmbeddingStore, pack, unpack
+from app.rewards import load_card_data
+
+pytestmark = pytest.mark.asyncio
+
+class CountingRedis:
+    """Counts pipelines (one round trip each) on a shared fake server"""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.round_trips = 0
+
+    def pipeline(self, *args, **kwargs):
+        self.round_trips += 1
+        return self.redis.pipeline(*args, **kwargs)
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+def _node(server, **kwargs):
+    redis = CountingRedis(fake_aioredis.FakeRedis(server=server))
+    recommender = PersonalizedRecommender()
+    recommender.attach_store(RedisEmbeddingStore(redis, batch_size=2), **kwargs)
+    return recommender, redis
+
+async def test_pack_round_trips_float32():
+    vector = np.random.normal(0, 0.1, 32)
+    assert len(pack(vector)) == 32 * 4
+    assert np.allclose(unpack(pack(vector)), vector, atol=1e-7)
+
+async def test_nodes_share_vectors(server):
+    cards = load_card_data()
+    node_a, _ = _node(server)
+    node_b, redis_b = _node(server)
+
+    await node_a.prefetch("user-1", cards)
+    node_a.get_personalized_scores("user-1", cards)
+    node_a.update_embeddings("user-1", cards[0].id, 1.0)
+    await node_a.flush()
+
+    # One round trip for the user and every card
+    await node_b.prefetch("user-1", cards)
+    assert redis_b.round_trips == 1
+    assert np.allclose(node_b.user_embeddings["user-1"], node_a.user_embeddings["user-1"], atol=1e-6)
+    assert node_b.get_personalized_scores("user-1", cards) == pytest.approx(
+        node_a.get_personalized_scores("user-1", cards), abs=1e-5
+    )
+
+    # Fresh entries are served locally
+    await node_b.prefetch("user-1", cards)
+    assert redis_b.round_trips == 1
+
+async def test_concurrent_card_updates_all_survive(server):
+    cards = load_card_data()
+    card_id = cards[0].id
+    node_a, _ = _node(server)
+    node_b, _ = _node(server)
+    node_a.get_personalized_scores("user-a", cards)
+    await node_a.flush()
+    await node_b.prefetch("user-b", cards)
+    node_b.get_personalized_scores("user-b", cards)
+    base = node_a.card_embeddings[card_id].copy()
+
+    # Both nodes update the same card before either flushes
+    node_a.update_embeddings("user-a", card_id, 1.0)
+    node_b.update_embeddings("user-b", card_id, 2.0)
+    delta_a = node_a.card_embeddings[card_id] - base
+    delta_b = node_b.card_embeddings[card_id] - base
+    await asyncio.gather(node_a.flush(), node_b.flush())
+
+    reader, _ = _node(server)
+    await reader.prefetch("user-a", cards)
+    assert np.allclose(reader.card_embeddings[card_id], base + delta_a + delta_b, atol=1e-6)
+
+async def test_conflicting_write_is_retried(server, monkeypatch):
+    cards = load_card_data()[:1]
+    node, _ = _node(server)
+    node.get_personalized_scores("user-1", cards)
+    other = fake_aioredis.FakeRedis(server=server)
+    real_pipeline = node.store.redis.pipeline
+
+    def racing_pipeline(*args, **kwargs):
+        pipe = real_pipeline(*args, **kwargs)
+        hmget = pipe.hmget
+
+        async def hmget_then_race(*a, **k):
+            result = await hmget(*a, **k)
+            if not await other.exists("raced"):
+                # Another node writes between our read and our commit
+                await other.set("raced", 1)
+                await other.hset("cardmax:embeddings:users", "user-2", pack(np.zeros(32)))
+            return result
+        pipe.hmget = hmget_then_race
+        return pipe
+
+    monkeypatch.setattr(node.store.redis, "pipeline", racing_pipeline)
+    conflicts = PERSONALIZATION_STORE_OPS.value(op="flush", result="conflict")
+    await node.flush()
+    assert PERSONALIZATION_STORE_OPS.value(op="flush", result="conflict") == conflicts + 1
+    assert set(await other.hkeys("cardmax:embeddings:users")) == {b"user-1", b"user-2"}
+    assert not node._user_deltas
+
+async def test_unflushed_deltas_are_kept_over_a_refresh(server):
+    cards = load_card_data()
+    card_id = cards[0].id
+    node, _ = _node(server, cache_ttl=0)
+    other, _ = _node(server)
+    other.get_personalized_scores("user-2", cards)
+    await other.flush()
+
+    await node.prefetch("user-1", cards)
+    node.get_personalized_scores("user-1", cards)
+    node.update_embeddings("user-1", card_id, 1.0)
+    pending = node._card_deltas[card_id].copy()
+
+    other.update_embeddings("user-2", card_id, 3.0)
+    await other.flush()
+    await node.prefetch("user-1", cards)
+    assert np.allclose(node.card_embeddings[card_id], other.card_embeddings[card_id] + pending, atol=1e-6)
+
+async def test_flush_batches_writes_and_retries_on_error(server):
+    cards = load_card_data()
+    node, redis = _node(server)
+    node.get_personalized_scores("user-1", cards)
+    node.get_personalized_scores("user-2", cards)
+
+    server.connected = False
+    await node.flush()
+    assert set(node._user_deltas) == {"user-1", "user-2"}
+
+    server.connected = True
+    redis.round_trips = 0
+    await node.flush()
+    # batch_size=2: one transaction for the users, two for the cards
+    assert redis.round_trips == 3
+    assert not node._user_deltas and not node._card_deltas
+    assert await redis.redis.hlen("cardmax:embeddings:cards") == len(cards)
+    assert np.allclose(
+        unpack(await redis.redis.hget("cardmax:embeddings:users", "user-1")), node.user_embeddings["user-1"], atol=1e-7
+    )
+
+def _block_after(node, monkeypatch, commits):
+    """Make the store hang before its transaction number ``commits`` + 1"""
+    apply_batch = node.store._apply_batch
+    blocked, release = asyncio.Event(), asyncio.Event()
+    calls = []
+
+    async def blocking_apply_batch(key, updates):
+        calls.append(key)
+        if len(calls) == commits + 1:
+            blocked.set()
+            await release.wait()
+        await apply_batch(key, updates)
+
+    monkeypatch.setattr(node.store, "_apply_batch", blocking_apply_batch)
+    return blocked, release
+
+async def test_cancelled_flush_keeps_unwritten_deltas(server, monkeypatch):
+    cards = load_card_data()
+    node, redis = _node(server)
+    node.get_personalized_scores("user-1", cards)
+    blocked, _ = _block_after(node, monkeypatch, commits=1)
+
+    flush = asyncio.create_task(node.flush())
+    await blocked.wait()
+    flush.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await flush
+    # The user's transaction committed; every card is still pending
+    assert not node._user_deltas
+    assert set(node._card_deltas) == {card.id for card in cards}
+
+    monkeypatch.undo()
+    await node.flush()
+    stored = await redis.redis.hgetall("cardmax:embeddings:cards")
+    for card in cards:
+        assert np.allclose(unpack(stored[card.id.encode()]), node.card_embeddings[card.id], atol=1e-7)
+
+async def test_refresh_during_a_flush_keeps_in_flight_deltas(server, monkeypatch):
+    cards = load_card_data()[:1]
+    card_id = cards[0].id
+    node, _ = _node(server, cache_ttl=0)
+    other, _ = _node(server)
+    other.get_personalized_scores("user-2", cards)
+    await other.flush()
+
+    await node.prefetch("user-1", cards)
+    node.get_personalized_scores("user-1", cards)
+    await node.flush()
+    node.update_embeddings("user-1", card_id, 1.0)
+    updated = node.card_embeddings[card_id].copy()
+
+    blocked, release = _block_after(node, monkeypatch, commits=0)
+    flush = asyncio.create_task(node.flush())
+    await blocked.wait()
+    # The store doesn't have the update yet, so the local vector must keep it
+    await node.prefetch("user-1", cards)
+    assert np.allclose(node.card_embeddings[card_id], updated)
+
+    release.set()
+    await flush
+    await node.prefetch("user-1", cards)
+    assert np.allclose(node.card_embeddings[card_id], updated, atol=1e-6)
+
+async def test_local_cache_is_bounded(server):
+    cards = load_card_data()[:1]
+    writer, _ = _node(server)
+    for i in range(10):
+        writer.get_personalized_scores(f"user-{i}", cards)
+    await writer.flush()
+
+    reader, _ = _node(server, cache_size=4)
+    for i in range(10):
+        await reader.prefetch(f"user-{i}", cards)
+    assert len(reader.user_embeddings) + len(reader.card_embeddings) <= 4
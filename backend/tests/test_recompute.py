@@ -0,0 +1,145 @@
+import numpy as np
+import pytest
+from bson import ObjectId
+from app.models import Category, InputQuery
+from app.recompute import (
+    ALL_CELLS,
+    applied_generation,
+    diff_catalogs,
+    recompute_missed_rewards,
+    score_chunk,
+    start_job
+)
+from app.rewards import calculate_reward_value, load_card_data
+from benchmarks.fakes import InMemoryDatabase
+
+def _transactions(n, seed=0):
+    rng = np.random.default_rng(seed)
+    categories = list(Category)
+    return [
+        {
+            "_id": ObjectId(),
+            "user_id": ObjectId(),
+            "description": "purchase",
+            "category": categories[rng.integers(len(categories))].value,
+            "amount": float(round(rng.uniform(1, 400), 2)),
+            "is_foreign": bool(rng.random() < 0.2),
+        }
+        for _ in range(n)
+    ]
+
+def test_score_chunk_matches_calculate_reward_value():
+    cards = load_card_data()
+    amounts = np.array([5.0, 99.99, 100.0, 250.0])
+    for category, foreign in ALL_CELLS:
+        best, values = score_chunk(cards, category, foreign, amounts)
+        for amount, b, value in zip(amounts, best, values):
+            query = InputQuery(category=category, amount=amount, foreign_transaction=foreign)
+            expected = max(calculate_reward_value(card, query) for card in cards)
+            assert value == pytest.approx(expected)
+            assert calculate_reward_value(cards[b], query) == pytest.approx(expected)
+
+def test_diff_catalogs_finds_changed_cells():
+    cards = load_card_data()
+    assert diff_catalogs(None, cards) == set(ALL_CELLS)
+    assert diff_catalogs(cards, cards) == set()
+
+    changed = [c.model_copy(deep=True) for c in cards]
+    changed[0].rewards[Category.DINING] = 9.0
+    assert diff_catalogs(cards, changed) == {(Category.DINING, False), (Category.DINING, True)}
+
+    changed = [c.model_copy(deep=True) for c in cards]
+    changed[0].foreign_transaction_fee += 1
+    assert diff_catalogs(cards, changed) == {cell for cell in ALL_CELLS if cell[1]}
+
+    # Adding or removing a card touches every cell
+    assert diff_catalogs(cards, cards[1:]) == set(ALL_CELLS)
+
+@pytest.mark.asyncio
+async def test_recompute_only_touches_changed_cells():
+    db = InMemoryDatabase()
+    transactions = _transactions(300)
+    # Recommended from the user's wallet; recomputing must not rewrite it
+    transactions[0].update(card_id="citi-double-cash", reward_value=0.5)
+    await db.transactions.insert_many(transactions)
+
+    job = await recompute_missed_rewards(db, chunk_size=32)
+    assert job["status"] == "completed"
+    assert job["processed"] == 300
+    for doc in await db.transactions.find().to_list(length=None):
+        query = InputQuery(category=doc["category"], amount=doc["amount"], foreign_transaction=doc["is_foreign"])
+        expected = max(calculate_reward_value(card, query) for card in load_card_data())
+        assert doc["best_reward_value"] == pytest.approx(expected)
+    recorded = await db.transactions.find_one({"_id": transactions[0]["_id"]})
+    assert (recorded["card_id"], recorded["reward_value"]) == ("citi-double-cash", 0.5)
+
+    # Nothing changed, nothing to do
+    assert await recompute_missed_rewards(db) is None
+
+    # A new active groceries card only affects the groceries cells
+    await db.cards.insert_one({
+        "_id": ObjectId(), "name": "Grocer Max", "issuer": "Test Bank",
+        "rewards": {"groceries": 12.0, "other": 0.5}, "reward_type": "cashback",
+        "annual_fee": 0.0, "foreign_transaction_fee": 0.0, "is_active": True
+    })
+    job = await recompute_missed_rewards(db, chunk_size=32)
+    assert job["cells"] == [[cell[0].value, cell[1]] for cell in ALL_CELLS]  # new card: every cell
+    grocer = await db.cards.find_one({"name": "Grocer Max"})
+    groceries = await db.transactions.find({"category": "groceries"}).to_list(length=None)
+    assert groceries and all(doc["best_card_id"] == str(grocer["_id"]) for doc in groceries)
+
+    await db.cards.update_one({"_id": grocer["_id"]}, {"$set": {"rewards": {"groceries": 15.0, "other": 0.5}}})
+    job = await start_job(db)
+    assert job["cells"] == [["groceries", False], ["groceries", True]]
+
+@pytest.mark.asyncio
+async def test_transactions_inserted_after_a_job_get_a_best_card():
+    db = InMemoryDatabase()
+    await db.transactions.insert_many(_transactions(50))
+    assert (await recompute_missed_rewards(db, chunk_size=16))["status"] == "completed"
+    assert await recompute_missed_rewards(db) is None
+    assert await applied_generation(db) == 1
+
+    # Recorded by /optimize after the catalog was applied
+    late = _transactions(3, seed=2)
+    for doc in late:
+        doc.update(card_id="citi-double-cash", reward_value=1.0)
+    await db.transactions.insert_many(late)
+
+    job = await start_job(db)
+    assert job["cells"] == []
+    job = await recompute_missed_rewards(db, chunk_size=2)
+    assert job["processed"] == 3
+    for doc in await db.transactions.find({"_id": {"$in": [doc["_id"] for doc in late]}}).to_list(length=None):
+        query = InputQuery(category=doc["category"], amount=doc["amount"], foreign_transaction=doc["is_foreign"])
+        expected = max(calculate_reward_value(card, query) for card in load_card_data())
+        assert doc["best_card_id"] is not None
+        assert doc["best_reward_value"] == pytest.approx(expected)
+        assert doc["card_id"] == "citi-double-cash"
+    assert await recompute_missed_rewards(db) is None
+    # Same catalog, so cached wallet snapshots stay current
+    assert await applied_generation(db) == 1
+
+@pytest.mark.asyncio
+async def test_interrupted_job_resumes_from_checkpoint(monkeypatch):
+    db = InMemoryDatabase()
+    await db.transactions.insert_many(_transactions(200, seed=1))
+    bulk_write = db.transactions.bulk_write
+    calls = []
+
+    async def failing_bulk_write(requests, **kwargs):
+        calls.append(len(requests))
+        if len(calls) == 3:
+            raise RuntimeError("connection lost")
+        return await bulk_write(requests, **kwargs)
+
+    monkeypatch.setattr(db.transactions, "bulk_write", failing_bulk_write)
+    with pytest.raises(RuntimeError):
+        await recompute_missed_rewards(db, chunk_size=16)
+    interrupted = await db.recompute_jobs.find_one({"status": "running"})
+    assert interrupted["processed"] > 0
+
+    job = await recompute_missed_rewards(db, chunk_size=16)
+    assert job["_id"] == interrupted["_id"]
+    assert job["processed"] == 200
+    assert await db.transactions.count_documents({"best_reward_value": None}) == 0
@@ -0,0 +1,132 @@
+import asyncio
+import time
+import pytest
+from jose import jwt
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+from app.auth import create_access_token
+from app.db.database import Database
+from app.db.models import UserDB
+from app.events import version_hub
+from app.main import app, settings
+from app.sessions import OptimizeSession
+from app.wallets import wallet_cache
+from benchmarks.fakes import InMemoryDatabase
+
+EMAIL = "session-user@example.com"
+
+@pytest.fixture
+def client():
+    wallet_cache.init(None)
+    Database.db = InMemoryDatabase()
+    user = UserDB(email=EMAIL, hashed_password="unused")
+    asyncio.run(Database.db.users.insert_one(user.dict(by_alias=True)))
+    yield TestClient(app)
+    Database.db = None
+
+def _token():
+    return create_access_token({"sub": EMAIL})
+
+def _expiring_token(seconds):
+    claims = {"sub": EMAIL, "exp": int(time.time()) + seconds}
+    return jwt.encode(claims, settings.jwt_secret_key, algorithm=settings.jwt_algorithm)
+
+def test_rejects_invalid_token(client):
+    with client.websocket_connect("/ws/optimize?token=not-a-jwt") as ws:
+        with pytest.raises(WebSocketDisconnect) as exc:
+            ws.receive_json()
+    assert exc.value.code == 1008
+
+def test_pipelined_queries_answered_in_order(client):
+    with client.websocket_connect("/ws/optimize") as ws:
+        ws.send_json({"type": "auth", "token": _token()})
+        hello = ws.receive_json()
+        assert hello["type"] == "session"
+        assert hello["wallet_version"] is None
+
+        # Send a burst before reading any answer
+        ws.send_json({"id": 1, "category": "dining", "amount": 120.0})
+        ws.send_json({"id": 2, "category": "gas", "amount": 40.0, "description": "Shell station"})
+        ws.send_text("not json")
+        ws.send_json({"id": 3, "category": "dining", "amount": -5})
+
+        first, second, invalid, error = (ws.receive_json() for _ in range(4))
+        assert (first["type"], first["id"]) == ("recommendation", 1)
+        assert first["reward_value"] > 0
+        assert (second["type"], second["id"]) == ("recommendation", 2)
+        assert invalid["type"] == "error"
+        assert (error["type"], error["id"]) == ("error", 3)
+
+    # Described transactions are flushed when the session closes
+    stored = asyncio.run(Database.db.transactions.find().to_list(length=None))
+    assert [(t["description"], t["card_id"]) for t in stored] == [("Shell station", second["card"]["id"])]
+
+def test_malformed_frames_keep_the_session_open(client):
+    with client.websocket_connect(f"/ws/optimize?token={_token()}") as ws:
+        assert ws.receive_json()["type"] == "session"
+        ws.send_json({"id": 1, "category": "dining", "amount": 10, "description": 123})
+        ws.send_json({"id": 2, "amount": 10})
+        ws.send_json({"id": 3, "category": "dining", "amount": "lots"})
+        ws.send_json({"id": 4, "category": "dining", "amount": 10})
+        replies = [ws.receive_json() for _ in range(4)]
+    assert [(r["type"], r["id"]) for r in replies] == [("error", 1), ("error", 2), ("error", 3), ("recommendation", 4)]
+
+def test_binary_frames_get_an_error(client):
+    with client.websocket_connect(f"/ws/optimize?token={_token()}") as ws:
+        assert ws.receive_json()["type"] == "session"
+        ws.send_bytes(b'{"id": 1, "category": "dining", "amount": 10}')
+        ws.send_json({"id": 2, "category": "dining", "amount": 10})
+        error, answer = ws.receive_json(), ws.receive_json()
+    assert (error["type"], error["id"]) == ("error", None)
+    assert (answer["type"], answer["id"]) == ("recommendation", 2)
+
+def test_failed_wallet_load_does_not_leak_a_subscription(client, monkeypatch):
+    async def failing_load_wallet(self):
+        raise ConnectionError("wallet store unavailable")
+
+    monkeypatch.setattr(OptimizeSession, "load_wallet", failing_load_wallet)
+    subscribers = len(version_hub._subscribers)
+    with pytest.raises(ConnectionError):
+        with client.websocket_connect(f"/ws/optimize?token={_token()}") as ws:
+            ws.receive_json()
+    assert len(version_hub._subscribers) == subscribers
+
+def test_wallet_changes_are_pushed(client):
+    headers = {"Authorization": f"Bearer {_token()}"}
+    response = client.post("/wallet", json={"user_id": "ignored", "cards": []}, headers=headers)
+    assert response.status_code == 200
+
+    with client.websocket_connect(f"/ws/optimize?token={_token()}") as ws:
+        assert ws.receive_json()["wallet_version"] == 1
+
+        response = client.post("/wallet/cards", json={"cardId": "citi-double-cash"}, headers=headers)
+        assert response.status_code == 200
+        pushed = ws.receive_json()
+        assert (pushed["type"], pushed["version"]) == ("wallet", "2")
+
+        # Queries now score only the resident wallet
+        ws.send_json({"id": 1, "category": "dining", "amount": 50.0})
+        assert ws.receive_json()["card"]["id"] == "citi-double-cash"
+
+def test_session_closes_when_the_token_expires(client):
+    with client.websocket_connect(f"/ws/optimize?token={_expiring_token(1)}") as ws:
+        hello = ws.receive_json()
+        assert hello["expires_at"] <= time.time() + 1
+        with pytest.raises(WebSocketDisconnect) as exc:
+            ws.receive_json()
+    assert exc.value.code == 1008
+
+def test_reauth_extends_the_session(client):
+    with client.websocket_connect(f"/ws/optimize?token={_expiring_token(1)}") as ws:
+        ws.receive_json()
+        ws.send_json({"type": "auth", "token": _token()})
+        assert ws.receive_json()["type"] == "auth"
+        time.sleep(1.5)
+        ws.send_json({"id": 1, "category": "dining", "amount": 10})
+        assert ws.receive_json()["type"] == "recommendation"
+
+        # A token for someone else ends the session
+        ws.send_json({"type": "auth", "token": create_access_token({"sub": "someone-else@example.com"})})
+        with pytest.raises(WebSocketDisconnect) as exc:
+            ws.receive_json()
+    assert exc.value.code == 1008
@@ -0,0 +1,107 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from app.auth import create_access_token
+from app.db.database import Database
+from app.db.models import TransactionDB, UserDB
+from app.main import app
+from app.models import Category, InputQuery
+from app.rewards import calculate_reward_value, load_card_data
+from app.simulation import TransactionHistory, simulate
+from app.wallets import create_wallet, wallet_cache
+from benchmarks.fakes import InMemoryDatabase
+
+EMAIL = "simulation-user@example.com"
+
+def _cards(*ids):
+    catalog = {card.id: card for card in load_card_data()}
+    return [catalog[card_id] for card_id in ids]
+
+def _documents(n, seed=0):
+    rng = np.random.default_rng(seed)
+    categories = [c.value for c in Category]
+    return [
+        {"category": categories[rng.integers(len(categories))], "amount": float(rng.choice([rng.uniform(1, 99), rng.uniform(100, 400)])), "is_foreign": bool(rng.random() < 0.2)}
+        for _ in range(n)
+    ]
+
+def _best_total(docs, cards):
+    queries = [InputQuery(category=d["category"], amount=d["amount"], foreign_transaction=d["is_foreign"]) for d in docs]
+    return sum(max(calculate_reward_value(card, q) for card in cards) for q in queries)
+
+def test_matches_per_transaction_scoring():
+    docs = _documents(500)
+    wallet, candidates = _cards("citi-double-cash"), _cards("amex-gold", "chase-sapphire-reserve")
+    result = simulate(TransactionHistory.from_documents(docs), wallet, candidates)
+
+    assert result.transactions == 500
+    assert result.current_rewards == pytest.approx(_best_total(docs, wallet), abs=0.01)
+    assert result.proposed_rewards == pytest.approx(_best_total(docs, wallet + candidates), abs=0.01)
+    assert result.added_annual_fees == 800.0
+    assert result.net_delta == pytest.approx(result.reward_delta - 800.0, abs=0.01)
+    assert sum(result.category_deltas.values()) == pytest.approx(result.reward_delta, abs=0.05)
+    # Gold out-earns the reserve everywhere it competes, and double cash keeps the rest
+    assert result.transactions_won["chase-sapphire-reserve"] == 0
+    assert 0 < result.transactions_won["amex-gold"] < 500
+
+def test_cards_already_held_add_nothing():
+    docs = _documents(50)
+    result = simulate(TransactionHistory.from_documents(docs), _cards("amex-gold"), _cards("amex-gold"), months=6)
+    assert result.reward_delta == 0 and result.added_annual_fees == 0
+    assert result.transactions_won == {}
+
+def test_empty_wallet_and_prorated_fee():
+    docs = _documents(50)
+    result = simulate(TransactionHistory.from_documents(docs), [], _cards("chase-sapphire-reserve"), months=6)
+    assert result.current_rewards == 0
+    assert result.proposed_rewards == pytest.approx(_best_total(docs, _cards("chase-sapphire-reserve")), abs=0.01)
+    assert result.added_annual_fees == 275.0
+    assert result.transactions_won == {"chase-sapphire-reserve": 50}
+
+def test_ten_thousand_transactions_under_50ms():
+    docs = _documents(10_000)
+    wallet, candidates = _cards("citi-double-cash"), _cards("amex-gold", "chase-sapphire-reserve")
+    timings = []
+    for _ in range(5):
+        start = time.perf_counter()
+        simulate(TransactionHistory.from_documents(docs), wallet, candidates)
+        timings.append(time.perf_counter() - start)
+    assert min(timings) < 0.05
+
+@pytest.fixture
+def client():
+    wallet_cache.init(None)
+    Database.db = InMemoryDatabase()
+    user = UserDB(email=EMAIL, hashed_password="unused")
+    asyncio.run(Database.db.users.insert_one(user.dict(by_alias=True)))
+    asyncio.run(create_wallet(Database.db, user.id, ["citi-double-cash"]))
+    transactions = [
+        TransactionDB(user_id=user.id, description="dinner", category=Category.DINING, amount=150.0),
+        TransactionDB(user_id=user.id, description="groceries", category=Category.GROCERIES, amount=50.0),
+        # Outside the window
+        TransactionDB(user_id=user.id, description="old dinner", category=Category.DINING, amount=500.0,
+                      created_at=datetime.utcnow() - timedelta(days=400)),
+    ]
+    asyncio.run(Database.db.transactions.insert_many([t.dict(by_alias=True) for t in transactions]))
+    yield TestClient(app)
+    Database.db = None
+
+def test_simulate_endpoint(client):
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': EMAIL})}"}
+    response = client.post("/simulate", json={"cardIds": ["amex-gold"]}, headers=headers)
+    assert response.status_code == 200
+    result = response.json()
+    assert result["transactions"] == 2
+    # Double cash: 150 * 2% * 1.1 + 50 * 2%; gold: 150 * 4% * 1.1 + 50 * 4%
+    assert result["current_rewards"] == pytest.approx(4.3)
+    assert result["proposed_rewards"] == pytest.approx(8.6)
+    assert result["net_delta"] == pytest.approx(4.3 - 250.0)
+    assert result["transactions_won"] == {"amex-gold": 2}
+
+    response = client.post("/simulate", json={"cardIds": ["no-such-card"]}, headers=headers)
+    assert response.status_code == 404
+    response = client.post("/simulate", json={"cardIds": []}, headers=headers)
+    assert response.status_code == 422
@@ -0,0 +1,129 @@
+import pytest
+from bson import ObjectId
+from fakeredis import aioredis as fake_aioredis
+from app.events import version_hub
+from benchmarks.fakes import InMemoryDatabase
+from app.wallets import (
+    UnknownCardError,
+    WalletCache,
+    add_card,
+    build_snapshot,
+    create_wallet,
+    get_wallet_snapshot,
+    remove_card,
+    wallet_cache,
+    wallet_from_doc
+)
+
+pytestmark = pytest.mark.asyncio
+
+@pytest.fixture
+def db():
+    wallet_cache.init(fake_aioredis.FakeRedis(decode_responses=True))
+    yield InMemoryDatabase()
+    wallet_cache.init(None)
+
+async def test_create_wallet_resolves_cards_and_caches(db):
+    user_id = ObjectId()
+    snapshot = await create_wallet(db, user_id, ["amex-gold", "citi-double-cash"])
+    assert snapshot.version == 1
+    assert [c.name for c in snapshot.cards] == ["American Express Gold Card", "Citi Double Cash"]
+
+    # Served from the cache even once Mongo no longer has it
+    await db.wallets.delete_many({})
+    cached = await get_wallet_snapshot(db, str(user_id))
+    assert cached == snapshot
+
+async def test_wallet_updates_write_through(db):
+    user_id = ObjectId()
+    await create_wallet(db, user_id, ["amex-gold"])
+
+    added = await add_card(db, user_id, "citi-double-cash")
+    assert added.version == 2
+    assert (await wallet_cache.get(str(user_id))).version == 2
+    assert await add_card(db, user_id, "citi-double-cash") is None
+
+    removed = await remove_card(db, user_id, "amex-gold")
+    assert [c.id for c in removed.cards] == ["citi-double-cash"]
+    assert (await get_wallet_snapshot(db, str(user_id))).version == 3
+
+async def test_cache_miss_repopulates_from_db(db):
+    user_id = ObjectId()
+    await create_wallet(db, user_id, ["amex-gold"])
+    await wallet_cache.invalidate(str(user_id))
+    assert await wallet_cache.get(str(user_id)) is None
+
+    snapshot = await get_wallet_snapshot(db, str(user_id))
+    assert snapshot.cards[0].id == "amex-gold"
+    assert await wallet_cache.get(str(user_id)) == snapshot
+
+async def test_cache_never_goes_back_a_version(db):
+    user_id = ObjectId()
+    await create_wallet(db, user_id, ["amex-gold"])
+    newer = await add_card(db, user_id, "citi-double-cash")
+    stale = newer.model_copy(update={"version": 1, "cards": newer.cards[:1]})
+    await wallet_cache.put(stale)
+    assert (await wallet_cache.get(str(user_id))).version == 2
+
+async def test_wallets_without_a_version_field(db):
+    user_id = ObjectId()
+    await db.wallets.insert_one({"_id": ObjectId(), "user_id": user_id, "cards": ["citi-double-cash"], "is_active": True})
+    cached = await get_wallet_snapshot(db, str(user_id))
+    assert cached.version == 0
+
+    added = await add_card(db, user_id, "amex-gold")
+    assert added.version == 1
+    snapshot = await get_wallet_snapshot(db, str(user_id))
+    assert [c.id for c in snapshot.cards] == ["citi-double-cash", "amex-gold"]
+
+async def test_snapshots_are_rebuilt_for_a_new_catalog(db, monkeypatch):
+    monkeypatch.setitem(version_hub._versions, "catalog", "1")
+    card_id = ObjectId()
+    await db.cards.insert_one({
+        "_id": card_id, "name": "Grocer Max", "issuer": "Test Bank",
+        "rewards": {"groceries": 5.0}, "reward_type": "cashback", "is_active": True
+    })
+    user_id = ObjectId()
+    await create_wallet(db, user_id, [str(card_id)])
+
+    await db.cards.update_one({"_id": card_id}, {"$set": {"rewards": {"groceries": 8.0}}})
+    assert (await get_wallet_snapshot(db, str(user_id))).cards[0].rewards["groceries"] == 5.0
+
+    # Publishing the new catalog (as the recompute job does) retires cached snapshots
+    version_hub.publish("catalog", 2)
+    snapshot = await get_wallet_snapshot(db, str(user_id))
+    assert snapshot.cards[0].rewards["groceries"] == 8.0
+    assert snapshot.catalog_generation == 2
+    assert (await wallet_cache.get(str(user_id))).catalog_generation == 2
+
+async def test_nodes_behind_on_the_catalog_keep_newer_snapshots(db, monkeypatch):
+    user_id = ObjectId()
+    await db.wallets.insert_one({"_id": ObjectId(), "user_id": user_id, "cards": ["amex-gold"], "version": 1})
+
+    # The node that ran the recompute has seen generation 2
+    monkeypatch.setitem(version_hub._versions, "catalog", "2")
+    assert (await get_wallet_snapshot(db, str(user_id))).catalog_generation == 2
+
+    # A node still on generation 1 neither rebuilds nor overwrites it
+    monkeypatch.setitem(version_hub._versions, "catalog", "1")
+    find_one = db.wallets.find_one
+    reads = []
+
+    async def counting_find_one(*args, **kwargs):
+        reads.append(args)
+        return await find_one(*args, **kwargs)
+
+    monkeypatch.setattr(db.wallets, "find_one", counting_find_one)
+    assert (await get_wallet_snapshot(db, str(user_id))).catalog_generation == 2
+    assert reads == []
+    older = await build_snapshot(db, wallet_from_doc(await find_one({"user_id": user_id})))
+    await wallet_cache.put(older)
+    assert (await wallet_cache.get(str(user_id))).catalog_generation == 2
+
+async def test_unknown_cards_are_rejected(db):
+    with pytest.raises(UnknownCardError):
+        await create_wallet(db, ObjectId(), ["no-such-card"])
+
+async def test_cache_without_redis_is_a_no_op():
+    cache = WalletCache()
+    assert await cache.get("anyone") is None